@@ -1,15 +1,22 @@
 from __future__ import annotations # <<--- ADDED: Must be the first code line
 
+import json
+import time
+import uuid
 import logging
 from fastapi import (
-    APIRouter, Form, UploadFile, File, HTTPException, BackgroundTasks, Depends
+    APIRouter, Form, HTTPException, Request
 )
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict, List, Optional, Tuple
 
 # Use absolute imports from the 'app' package root
-from app.core import session_manager, tts_manager
-from app.services import file_service, chat_service, tts_service
+from app.core import executors, llm, metrics, prompt_builder, session_manager
+from app.core.config import settings
+from app.core.answer_cache import answer_cache
+from app.core.content_store import content_store
+from app.services import file_service, chat_service
+from app.utils import file_utils
 from app.models import chat as chat_models
 from app.models.error import ErrorResponse
 
@@ -20,80 +27,324 @@ logger = logging.getLogger(__name__)
 # The code for the endpoints remains the same as the previous version
 # where we used Form(...) instead of Depends(Model.as_form)
 
+# The multipart body is parsed by file_utils.receive_multipart rather than Form/File
+# parameters, so it streams to disk and is rejected as soon as it exceeds UPLOAD_MAX_MB
+_UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["mode", "file"],
+            "properties": {
+                "mode": {"type": "string", "description": "Expected: 'upload_pdf' or 'upload_image'"},
+                "file": {"type": "string", "format": "binary"},
+            },
+        }}},
+    }
+}
+
 @router.post(
     "/upload",
     response_model=chat_models.UploadResponse, # This will be evaluated later now
     responses={
         400: {"model": ErrorResponse, "description": "Invalid input or file processing error"},
-        500: {"model": ErrorResponse, "description": "Internal server error"}
-    }
+        413: {"model": ErrorResponse, "description": "Upload exceeds UPLOAD_MAX_MB"},
+        500: {"model": ErrorResponse, "description": "Internal server error"},
+        503: {"model": ErrorResponse, "description": "Server busy, retry after the Retry-After header"}
+    },
+    openapi_extra=_UPLOAD_FORM_SCHEMA
 )
-async def upload_file(
-    mode: str = Form(..., description="Expected: 'upload_pdf' or 'upload_image'"),
-    file: UploadFile = File(...)
-):
+async def upload_file(request: Request):
     """Handles PDF or Image uploads, creates a session context."""
-    session_context = {}
-    actual_mode = ""
+    form = await _receive_form(request)
+    try:
+        document, cached, upload_stats = await _process_upload(form.fields.get("mode", ""), form.files.get("file"))
+        session_id = await session_manager.create_session(mode=document["kind"], context_data={"documents": [document]})
+        content_store.acquire(document["content_hash"], session_id)
+        return chat_models.UploadResponse(
+            session_id=session_id,
+            document_id=document["document_id"],
+            filename=document["filename"],
+            mode=document["kind"],
+            cached=cached,
+            **upload_stats
+        )
+    finally:
+        await form.cleanup()
+
+
+async def _receive_form(request: Request) -> file_utils.StreamedForm:
+    try:
+        with metrics.stage("receive"):
+            return await file_utils.receive_multipart(
+                request.headers, request.stream(), settings.UPLOAD_MAX_MB * 1024 * 1024
+            )
+    except file_utils.UploadTooLargeError as e:
+        logger.warning(f"Upload rejected: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except file_utils.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _process_upload(mode: str, file: Optional[file_utils.StreamedUpload]) -> Tuple[Dict[str, Any], bool, Dict[str, Any]]:
+    """
+    Processes an uploaded PDF or image (or reuses the content store's result for the same bytes).
+    Returns (document, cache_hit, upload_stats); the document is what a session stores for it.
+    """
+    if file is None:
+        raise HTTPException(status_code=400, detail="No file uploaded.")
+    document = {"document_id": uuid.uuid4().hex[:12], "filename": file.filename or "uploaded_file"}
+    upload_stats = {}
+    started = time.perf_counter()
     try:
         if mode == "upload_pdf":
-            text_context = await file_service.process_uploaded_pdf(file)
-            session_context = {"text_context": text_context}
-            actual_mode = "pdf"
+            entry, cached = await file_service.process_uploaded_pdf(file)
+            # The session keeps metadata only; text, pages and index stay in the content store
+            document.update(kind="pdf", page_count=entry.data["page_count"])
+            upload_stats = {
+                "page_count": entry.data["page_count"],
+                "extraction_ms": entry.data["extraction_seconds"] * 1000
+            }
         elif mode == "upload_image":
-            image_path, image_url = await file_service.process_uploaded_image(file)
-            session_context = {"image_url": image_url, "file_path": image_path}
-            actual_mode = "image"
+            entry, cached = await file_service.process_uploaded_image(file)
+            # The prepared image (a data URL at model resolution) stays in the content store
+            document.update(kind="image")
         else:
             logger.warning(f"Invalid upload mode received: {mode}")
             raise HTTPException(status_code=400, detail="Invalid mode specified. Use 'upload_pdf' or 'upload_image'.")
-
-        session_id = session_manager.create_session(mode=actual_mode, context_data=session_context)
-        return chat_models.UploadResponse(
-            session_id=session_id,
-            filename=file.filename or "uploaded_file",
-            mode=actual_mode
-        )
+        document["content_hash"] = entry.digest
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - started, document["kind"], str(cached).lower())
+        return document, cached, upload_stats
     except file_service.FileProcessingError as e:
         logger.warning(f"File processing error for {file.filename} (mode: {mode}): {e}")
         raise HTTPException(status_code=400, detail=str(e))
+    except (HTTPException, executors.OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Unexpected error during upload {file.filename} (mode: {mode}): {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error processing {mode.split('_')[-1]}.")
 
 
+def _document_list(session_id: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "mode": session_manager.documents_mode(documents),
+        "documents": [
+            chat_models.DocumentInfo(
+                document_id=document["document_id"],
+                filename=document["filename"],
+                kind=document["kind"],
+                page_count=document.get("page_count")
+            )
+            for document in documents
+        ],
+    }
+
+
+@router.get(
+    "/session/{session_id}/documents",
+    response_model=chat_models.DocumentListResponse,
+    responses={404: {"model": ErrorResponse}}
+)
+async def list_documents(session_id: str):
+    """Lists the documents attached to a session."""
+    session_data = await session_manager.get_session(session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return chat_models.DocumentListResponse(**_document_list(session_id, session_data.get("documents", [])))
+
+
+@router.post(
+    "/session/{session_id}/documents",
+    response_model=chat_models.AttachResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Invalid input, file processing error or too many documents"},
+        404: {"model": ErrorResponse, "description": "Session not found"},
+        413: {"model": ErrorResponse, "description": "Upload exceeds UPLOAD_MAX_MB"},
+        500: {"model": ErrorResponse, "description": "Internal server error"},
+        503: {"model": ErrorResponse, "description": "Server busy, retry after the Retry-After header"}
+    },
+    openapi_extra=_UPLOAD_FORM_SCHEMA
+)
+async def attach_document(session_id: str, request: Request):
+    """Attaches another PDF or image to an existing session (including one started without a document).
+
+    Documents already attached are kept as processed; questions then draw context from all of them.
+    Attaching content the session already has returns the existing document.
+    """
+    session_data = await session_manager.get_session(session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    if len(session_data.get("documents", [])) >= settings.SESSION_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.SESSION_MAX_DOCUMENTS} documents per session."
+        )
+    form = await _receive_form(request)
+    try:
+        document, cached, upload_stats = await _process_upload(form.fields.get("mode", ""), form.files.get("file"))
+    finally:
+        await form.cleanup()
+
+    documents = ((await session_manager.get_session(session_id)) or {}).get("documents", [])
+    existing = next((d for d in documents if d["content_hash"] == document["content_hash"]), None)
+    if existing is not None:
+        logger.info(f"Content of {document['filename']} is already attached to session {session_id}")
+        return chat_models.AttachResponse(
+            document_id=existing["document_id"], cached=True, **_document_list(session_id, documents)
+        )
+    documents = await session_manager.add_document(session_id, document)
+    if documents is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    content_store.acquire(document["content_hash"], session_id)
+    return chat_models.AttachResponse(
+        document_id=document["document_id"],
+        extraction_ms=upload_stats.get("extraction_ms"),
+        cached=cached,
+        **_document_list(session_id, documents)
+    )
+
+
+@router.delete(
+    "/session/{session_id}/documents/{document_id}",
+    response_model=chat_models.DocumentListResponse,
+    responses={404: {"model": ErrorResponse}}
+)
+async def detach_document(session_id: str, document_id: str):
+    """Detaches a document from a session; the session and its other documents stay as they are."""
+    if await session_manager.get_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    removed = await session_manager.remove_document(session_id, document_id)
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Document not found in this session.")
+    content_store.release(removed["content_hash"], session_id)
+    prompt_builder.token_counts.discard_document(session_id, document_id)
+    documents = (await session_manager.get_session(session_id))["documents"]
+    return chat_models.DocumentListResponse(**_document_list(session_id, documents))
+
+
+@router.post(
+    "/session",
+    response_model=chat_models.SessionResponse
+)
+async def start_session():
+    """Starts a conversation without a document, so follow-up questions keep their history."""
+    session_id = await session_manager.create_session(mode="chat", context_data={})
+    return chat_models.SessionResponse(session_id=session_id)
+
+
 @router.post(
     "/ask",
     response_model=chat_models.AskResponse, # This will be evaluated later now
-    responses={500: {"model": ErrorResponse}}
+    responses={500: {"model": ErrorResponse}, 503: {"model": ErrorResponse}}
 )
 async def ask_question(
-    background_tasks: BackgroundTasks,
     question: str = Form(..., description="The question to ask the AI."),
     session_id: Optional[str] = Form(None, description="Optional session ID for context."),
-    tts: bool = Form(False, description="Whether to synthesize the answer to speech.")
+    tts: bool = Form(False, description="Whether to synthesize the answer to speech."),
+    no_cache: bool = Form(False, description="Always generate a fresh answer (bypass the answer cache).")
 ):
     """Receives a question, gets an answer from the LLM (with session context if provided),
-       and optionally starts a TTS background task."""
+       and optionally queues a TTS job."""
     try:
-        answer = await chat_service.get_answer(question, session_id)
+        answer = await chat_service.get_answer(question, session_id, use_cache=not no_cache)
+    except executors.OverloadedError:
+        raise
     except Exception as e:
          logger.error(f"Error getting answer in endpoint: {e}", exc_info=True)
          raise HTTPException(status_code=500, detail="Failed to get answer from AI model.")
 
     response_data = chat_models.AskResponse(answer=answer)
+    selection = chat_service.context_selection()
+    if selection is not None:
+        response_data.context_dropped_tokens = selection.dropped_tokens
+        response_data.context_dropped = selection.dropped
 
-    if tts and tts_service.tts_model:
-        task_id = tts_manager.create_tts_task()
-        background_tasks.add_task(tts_service.synthesize_text_background, answer, task_id)
-        response_data.tts_task_id = task_id
-        logger.info(f"TTS requested, added background task {task_id}")
-    elif tts and not tts_service.tts_model:
-         logger.warning("TTS requested but TTS model is not available.")
+    if tts:
+        with metrics.stage("tts_queue"):
+            response_data.tts_task_id, response_data.tts_error = chat_service.queue_tts(answer)
 
     return response_data
 
 
+@router.post(
+    "/ask_stream",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One JSON event per line"},
+        500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse}
+    }
+)
+async def ask_question_stream(
+    question: str = Form(..., description="The question to ask the AI."),
+    session_id: Optional[str] = Form(None, description="Optional session ID for context."),
+    tts: bool = Form(False, description="Whether to synthesize the answer to speech."),
+    stream_tts: bool = Form(False, description="Synthesize sentence by sentence while the answer is generated."),
+    no_cache: bool = Form(False, description="Always generate a fresh answer (bypass the answer cache).")
+):
+    """Streams the answer as newline-delimited JSON while it is decoded.
+
+    Emits `{"type": "token", "text": ...}` per delta, then a final
+    `{"type": "done", "answer": ..., "tts_task_id": ..., "context_dropped": ...}` or
+    `{"type": "error", "detail": ...}`.
+    With `stream_tts`, a `{"type": "tts_stream", "audio_url": ...}` event comes first; the audio
+    behind it starts playing once the first sentence is synthesized, while decoding continues.
+    """
+    # Reject before the response starts while the LLM is saturated; later rejections become error events
+    executors.llm.check()
+
+    return StreamingResponse(
+        chat_service.answer_events(question, session_id, tts=tts, stream_tts=stream_tts, no_cache=no_cache),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post(
+    "/ask_batch",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One JSON event per line"},
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        503: {"model": ErrorResponse}
+    }
+)
+async def ask_question_batch(request: chat_models.AskBatchRequest):
+    """Answers many independent questions about one session in a single call.
+
+    Streams newline-delimited JSON as answers finish, in completion order:
+    `{"type": "answer", "index": ..., "question": ..., "answer": ..., "cached": ...}` or
+    `{"type": "error", "index": ..., "question": ..., "detail": ...}` per question, then
+    `{"type": "done", "answered": ..., "failed": ...}`.
+    """
+    if len(request.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch."
+        )
+    if request.session_id and await session_manager.get_session(request.session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    executors.llm.check()
+
+    async def event_stream():
+        answered = failed = 0
+        started = time.perf_counter()
+        async for result in chat_service.answer_batch(request.questions, request.session_id, use_cache=not request.no_cache):
+            if result.error is None:
+                answered += 1
+                event = {"type": "answer", "index": result.index, "question": result.question,
+                         "answer": result.answer, "cached": result.cached}
+            else:
+                failed += 1
+                event = {"type": "error", "index": result.index, "question": result.question, "detail": result.error}
+                if result.retry_after is not None:
+                    event["retry_after"] = result.retry_after
+            yield json.dumps(event) + "\n"
+        yield json.dumps({
+            "type": "done", "answered": answered, "failed": failed,
+            "elapsed_ms": (time.perf_counter() - started) * 1000
+        }) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
 @router.post(
     "/forget",
     response_model=chat_models.ForgetResponse, # This will be evaluated later now
@@ -103,9 +354,27 @@ async def forget_session(
     session_id: str = Form(..., description="The session ID to clear.")
 ):
     """Clears the specified session context."""
-    cleared = session_manager.clear_session(session_id)
+    cleared = await session_manager.clear_session(session_id)
     if cleared:
         return chat_models.ForgetResponse(message="Session cleared successfully.")
     else:
         logger.warning(f"Forget request for non-existent session: {session_id}")
-        raise HTTPException(status_code=404, detail="Session not found.")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="Session not found.")
+
+
+@router.get(
+    "/scheduler_stats",
+    response_model=chat_models.SchedulerStatsResponse
+)
+async def get_scheduler_stats():
+    """Reports queue depth and batch sizes of the /ask request scheduler."""
+    return chat_models.SchedulerStatsResponse(**llm.batch_scheduler.stats())
+
+
+@router.get(
+    "/answer_cache_stats",
+    response_model=chat_models.AnswerCacheStatsResponse
+)
+async def get_answer_cache_stats():
+    """Reports size and hit rate of the answer cache."""
+    return chat_models.AnswerCacheStatsResponse(enabled=settings.ANSWER_CACHE_ENABLED, **answer_cache.stats())
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import logging
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.model_registry import registry
+from app.models import health as health_models
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/live", response_model=health_models.LivenessResponse)
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return health_models.LivenessResponse(status="alive")
+
+
+@router.get(
+    "/ready",
+    response_model=health_models.ReadinessResponse,
+    responses={503: {"model": health_models.ReadinessResponse, "description": "Models still loading or failed"}}
+)
+async def readiness():
+    """Readiness probe: all required models are loaded (or loadable, in lazy mode).
+       Reports the load state of every model."""
+    ready = registry.is_ready(allow_unloaded=settings.MODEL_LOADING == "lazy")
+    body = health_models.ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        models={name: health_models.ModelStatus(**state) for name, state in registry.status().items()}
+    )
+    if not ready:
+        return JSONResponse(status_code=503, content=body.model_dump())
+    return body
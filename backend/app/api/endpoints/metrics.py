@@ -0,0 +1,17 @@
+import logging
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# Use absolute imports from the 'app' package root
+from app.core import metrics
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint: latency histograms, queue waits, session and cache gauges."""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
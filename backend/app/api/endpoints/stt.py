@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import anyio
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+
+# Use absolute imports from the 'app' package root
+from app.core import executors, session_manager
+from app.core.config import settings
+from app.core.model_registry import ModelUnavailableError, registry
+from app.models.error import ErrorResponse
+from app.services import chat_service, stt_service
+from app.utils import audio_utils, file_utils
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# 16-bit PCM (raw or WAV) is decoded and transcribed while it arrives; any other format
+# (WebM/Opus from MediaRecorder, Ogg, MP3, ...) is buffered and decoded once the upload ends
+_PCM_MEDIA_TYPES = {"", "application/octet-stream", "audio/l16", "audio/pcm", "audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave"}
+
+# The body is read as a raw stream rather than a File parameter, so document it by hand
+_AUDIO_BODY_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            media_type: {"schema": {"type": "string", "format": "binary"}}
+            for media_type in ("audio/wav", "audio/L16", "audio/webm", "audio/ogg", "audio/mpeg")
+        },
+    }
+}
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that may keep reading the request body while it responds.
+
+    Starlette's version watches for disconnects by reading from `receive`, which would swallow
+    the audio chunks the event stream is still consuming. Here a disconnect surfaces as
+    ClientDisconnect from `request.stream()` instead (or as a failed send once the upload is done).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _parse_media_type(header: str) -> Tuple[str, Dict[str, str]]:
+    """Splits e.g. 'audio/L16; rate=16000; channels=1' into ('audio/l16', {'rate': '16000', 'channels': '1'})."""
+    media_type, *options = header.split(";")
+    params = {}
+    for option in options:
+        name, _, value = option.partition("=")
+        params[name.strip().lower()] = value.strip().strip('"')
+    return media_type.strip().lower(), params
+
+
+async def _streamed_pcm(request: Request, sample_rate: int, channels: int) -> AsyncIterator[np.ndarray]:
+    decoder = audio_utils.PCMStreamDecoder(stt_service.SAMPLE_RATE, sample_rate, channels)
+    async for data in request.stream():
+        audio = decoder.feed(data)
+        if len(audio):
+            yield audio
+    decoder.finish()
+
+
+async def _buffered_file(request: Request) -> AsyncIterator[np.ndarray]:
+    path = await file_utils.receive_body(request.stream(), settings.UPLOAD_MAX_MB * 1024 * 1024)
+    try:
+        yield await stt_service.decode_file(str(path))
+    finally:
+        await anyio.Path(path).unlink(missing_ok=True)
+
+
+@router.post(
+    "/transcribe",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One JSON event per line"},
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        503: {"model": ErrorResponse}
+    },
+    openapi_extra=_AUDIO_BODY_SCHEMA
+)
+async def transcribe(
+    request: Request,
+    sample_rate: int = Query(16000, ge=8000, le=192000, description="Sample rate of raw PCM (a WAV header or the audio/L16 'rate' parameter takes precedence)."),
+    channels: int = Query(1, ge=1, le=8, description="Channels of raw PCM (a WAV header or the audio/L16 'channels' parameter takes precedence)."),
+    language: Optional[str] = Query(None, description="Spoken language, e.g. 'en' (default: STT_LANGUAGE, or detected)."),
+    ask: bool = Query(False, description="Answer the transcript as a question in the same response."),
+    session_id: Optional[str] = Query(None, description="Session to ask about (with ask)."),
+    tts: bool = Query(False, description="Synthesize the answer to speech (with ask)."),
+    stream_tts: bool = Query(False, description="Synthesize the answer sentence by sentence while it is generated (with ask)."),
+    no_cache: bool = Query(False, description="Always generate a fresh answer (with ask).")
+):
+    """Transcribes speech while it is uploaded, streaming newline-delimited JSON.
+
+    Send the recording as the request body: 16-bit PCM (WAV, or raw as `audio/L16`) can be
+    streamed with chunked transfer encoding and is transcribed while it arrives; other formats
+    (e.g. WebM/Opus from a browser's MediaRecorder) are decoded once the upload completes.
+
+    Emits `{"type": "partial", "index": ..., "text": ..., "start": ..., "end": ...}` each time a
+    pause closes a speech segment, then `{"type": "transcript", "text": ...}` with the whole
+    transcript, or `{"type": "error", "detail": ...}`. With `ask`, the transcript is answered as a
+    question about `session_id` and the `/chat/ask_stream` events follow in the same response.
+    """
+    if not stt_service.is_available():
+        raise HTTPException(status_code=503, detail="Speech-to-text is not available.")
+    if ask and session_id and await session_manager.get_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    executors.stt.check()
+    if ask:
+        executors.llm.check()
+
+    media_type, params = _parse_media_type(request.headers.get("content-type", ""))
+    if media_type in _PCM_MEDIA_TYPES:
+        try:
+            sample_rate = int(params.get("rate", sample_rate))
+            channels = int(params.get("channels", channels))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid 'rate' or 'channels' in the Content-Type header.")
+        audio = _streamed_pcm(request, sample_rate, channels)
+    else:
+        audio = _buffered_file(request)
+
+    # Load the model (on the first request) before the response starts, so failures are a 503
+    try:
+        await registry.get("stt")
+    except ModelUnavailableError as e:
+        logger.error(f"STT model not available: {e}")
+        raise HTTPException(status_code=503, detail="Speech-to-text is not available.")
+
+    async def event_stream():
+        texts = []
+        try:
+            async for segment in stt_service.transcribe_stream(audio, language):
+                texts.append(segment.text)
+                yield json.dumps({"type": "partial", **segment._asdict()}) + "\n"
+        except (audio_utils.AudioFormatError, stt_service.AudioTooLongError, file_utils.UploadError) as e:
+            logger.warning(f"Rejected audio for transcription: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        except executors.OverloadedError as e:
+            logger.warning(f"Transcription rejected: {e}")
+            yield json.dumps({"type": "error", "detail": str(e), "retry_after": e.retry_after}) + "\n"
+            return
+        except ClientDisconnect:
+            logger.info("Client disconnected during transcription.")
+            return
+        except Exception as e:
+            logger.error(f"Error transcribing audio: {e}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": "Failed to transcribe audio."}) + "\n"
+            return
+
+        transcript = " ".join(texts)
+        yield json.dumps({"type": "transcript", "text": transcript}) + "\n"
+        if not ask:
+            return
+        if not transcript:
+            yield json.dumps({"type": "error", "detail": "No speech detected."}) + "\n"
+            return
+        async for event in chat_service.answer_events(transcript, session_id, tts=tts, stream_tts=stream_tts, no_cache=no_cache):
+            yield event
+
+    return _DuplexStreamingResponse(event_stream(), media_type="application/x-ndjson")
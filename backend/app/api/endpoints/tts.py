@@ -1,13 +1,26 @@
 from __future__ import annotations # Keep this for forward references
 
+import re
+import json
 import logging
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 # Use absolute imports from the 'app' package root
 from app.core import tts_manager
+from app.core.audio_cache import audio_cache
+from app.core.config import settings
+from app.core.model_registry import registry
 from app.models import tts as tts_models # Import the models module
 from app.models.error import ErrorResponse # Import the error model
+from app.services import tts_service, tts_stream
+from app.utils import audio_utils
+
+# How often an idle event stream sends a keep-alive comment
+SSE_KEEPALIVE_SECONDS = 15.0
+# Audio files are only ever written once under a unique name, so clients may cache them forever
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_AUDIO_NAME_RE = re.compile(r"^[A-Za-z0-9_]+\.(wav|mp3|ogg|opus)$")
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -30,4 +43,163 @@ async def get_audio_status(task_id: str):
         )
     else:
         logger.warning(f"TTS status request for unknown task_id: {task_id}")
-        raise HTTPException(status_code=404, detail="Task not found")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="Task not found")
+
+
+@router.get(
+    "/events/{task_id}",
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "A single `status` event once the task finishes"},
+        404: {"model": ErrorResponse, "description": "Task not found"}
+    }
+)
+async def audio_events(task_id: str):
+    """Server-sent events: pushes the task status the moment synthesis finishes (no polling)."""
+    if tts_manager.get_tts_task(task_id) is None:
+        logger.warning(f"TTS event stream requested for unknown task_id: {task_id}")
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        while True:
+            task_data = await tts_manager.wait_for_tts_task(task_id, timeout=SSE_KEEPALIVE_SECONDS)
+            if task_data is None:
+                payload = {"status": "failed", "audio_url": None, "error": "Task expired."}
+            elif task_data["status"] == "processing":
+                yield ": keep-alive\n\n"
+                continue
+            else:
+                payload = tts_models.TTSStatusResponse(
+                    status=task_data["status"],
+                    audio_url=task_data.get("audio_url"),
+                    error=task_data.get("error")
+                ).model_dump()
+            yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            return
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/audio/{filename}",
+    responses={
+        200: {"content": {"audio/*": {}}, "description": "The full audio file"},
+        206: {"description": "The requested byte range"},
+        304: {"description": "Not modified"},
+        404: {"model": ErrorResponse, "description": "Audio not found"},
+        416: {"description": "Range not satisfiable"}
+    }
+)
+async def get_audio(filename: str, request: Request):
+    """Serves synthesized audio with byte-range support (for seeking) and immutable caching headers."""
+    match = _AUDIO_NAME_RE.match(filename)
+    path = settings.audio_path / filename
+    if not match or not path.is_file():
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    stat = path.stat()
+    # Names are unique per content (cache key or task ID), so name and size identify the bytes
+    etag = f'"{path.stem}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": AUDIO_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    media_type = audio_utils.MEDIA_TYPES[match.group(1)]
+    range_header = request.headers.get("range")
+    if request.headers.get("if-range", etag) != etag:
+        range_header = None # The client's partial copy is stale; send everything
+    try:
+        byte_range = audio_utils.parse_range(range_header, stat.st_size)
+    except audio_utils.RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        audio_utils.read_file_range(path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+def _audio_stream_response(stream: tts_stream.StreamingTTSSession) -> StreamingResponse:
+    async def body():
+        try:
+            async for chunk in stream.audio_chunks():
+                yield chunk
+        finally:
+            stream.cancel() # Client went away or the stream ended; stop synthesizing
+
+    return StreamingResponse(
+        body(),
+        media_type="audio/wav",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/stream/{stream_id}",
+    responses={
+        200: {"content": {"audio/wav": {}}, "description": "WAV audio, one chunk per synthesized sentence"},
+        404: {"model": ErrorResponse, "description": "Stream not found or already consumed"}
+    }
+)
+async def stream_audio(stream_id: str):
+    """Streams the audio of a sentence-level TTS stream started by /chat/ask_stream."""
+    stream = tts_stream.take_stream(stream_id)
+    if stream is None:
+        logger.warning(f"Audio stream requested for unknown stream_id: {stream_id}")
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return _audio_stream_response(stream)
+
+
+@router.post(
+    "/stream",
+    responses={
+        200: {"content": {"audio/wav": {}}, "description": "WAV audio, one chunk per synthesized sentence"},
+        503: {"model": ErrorResponse, "description": "TTS unavailable or busy"}
+    }
+)
+async def synthesize_stream(text: str = Form(..., description="Text to speak.")):
+    """Synthesizes text sentence by sentence, streaming audio as soon as the first sentence is ready."""
+    if not tts_service.is_available():
+        raise HTTPException(status_code=503, detail="TTS model not available.")
+    # A full queue raises TTSQueueFullError, answered with 503 + Retry-After
+    stream = tts_stream.create_stream()
+    tts_stream.take_stream(stream.stream_id)
+    stream.add_text(text)
+    stream.finish()
+    return _audio_stream_response(stream)
+
+
+@router.get("/queue_stats", response_model=tts_models.TTSQueueStatsResponse)
+async def get_queue_stats():
+    """Reports TTS worker and queue utilisation."""
+    return tts_models.TTSQueueStatsResponse(**tts_service.job_queue.stats())
+
+
+@router.get("/engine_stats", response_model=tts_models.TTSEngineStatsResponse)
+async def get_engine_stats():
+    """Reports TTS replica utilisation and synthesis batch sizes (without loading the model)."""
+    engine = registry.peek("tts")
+    if engine is None:
+        return tts_models.TTSEngineStatsResponse(loaded=False)
+    return tts_models.TTSEngineStatsResponse(loaded=True, **engine.stats())
+
+
+@router.get("/cache_stats", response_model=tts_models.TTSCacheStatsResponse)
+async def get_cache_stats():
+    """Reports size and hit/miss counters of the synthesized-audio cache."""
+    return tts_models.TTSCacheStatsResponse(enabled=settings.TTS_CACHE_ENABLED, **audio_cache.stats())
@@ -1,9 +1,11 @@
 from fastapi import APIRouter
 
-from .endpoints import chat, tts
+from .endpoints import chat, health, stt, tts
 api_router = APIRouter()
 
 api_router.include_router(chat.router, prefix="/chat", tags=["Chat & Upload"])
 api_router.include_router(tts.router, prefix="/tts", tags=["Text-to-Speech"])
+api_router.include_router(stt.router, prefix="/stt", tags=["Speech-to-Text"])
+api_router.include_router(health.router, prefix="/health", tags=["Health"])
 
 # You can add more routers here as the application grows
\ No newline at end of file
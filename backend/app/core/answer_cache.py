@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+
+from .config import settings
+from . import executors, metrics
+from .model_registry import ModelUnavailableError, registry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Case-folded, whitespace-collapsed question without trailing punctuation."""
+    text = " ".join(unicodedata.normalize("NFKC", question).casefold().split())
+    return text.rstrip(" ?!.")
+
+
+def sampling_fingerprint() -> str:
+    """Identifies everything besides the prompt that shapes an answer."""
+    return f"{settings.MODEL_NAME}|max_tokens={settings.MAX_TOKENS}"
+
+
+class _CachedAnswer:
+    def __init__(self, answer: str, context_key: str, vector: Optional[np.ndarray], expires_at: float):
+        self.answer = answer
+        self.context_key = context_key
+        self.vector = vector
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    Cache of generated answers keyed by (normalized question, context fingerprint, sampling params).
+
+    With `semantic` enabled, a miss on the exact key falls back to the most similar cached
+    question for the same context, accepted if its cosine similarity reaches `threshold`.
+    Entries expire after `ttl_seconds` and the least recently used are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, semantic: bool, threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _CachedAnswer]" = OrderedDict()
+        self._by_context: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def _key(normalized: str, context_key: str) -> str:
+        material = f"{sampling_fingerprint()}\0{context_key}\0{normalized}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def _embed(self, normalized: str) -> Optional[np.ndarray]:
+        try:
+            embedder = await registry.get("embedder")
+        except ModelUnavailableError:
+            return None
+        return (await executors.cpu.run(embedder.embed, [normalized]))[0]
+
+    async def lookup(self, question: str, context_key: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        key = self._key(normalized, context_key)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.time():
+            self._remove(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.answer
+
+        if self.semantic and self._by_context.get(context_key):
+            match = await self._nearest(normalized, context_key)
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.hits += 1
+                self.semantic_hits += 1
+                return self._entries[match].answer
+
+        self.misses += 1
+        return None
+
+    async def _nearest(self, normalized: str, context_key: str) -> Optional[str]:
+        vector = await self._embed(normalized)
+        if vector is None:
+            return None
+        now = time.time()
+        candidates = [
+            key for key in self._by_context[context_key]
+            if self._entries[key].vector is not None and self._entries[key].expires_at >= now
+        ]
+        if not candidates:
+            return None
+        scores = np.stack([self._entries[key].vector for key in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.threshold else None
+
+    async def store(self, question: str, context_key: str, answer: str):
+        normalized = normalize_question(question)
+        key = self._key(normalized, context_key)
+        vector = await self._embed(normalized) if self.semantic else None
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _CachedAnswer(answer, context_key, vector, time.time() + self.ttl_seconds)
+        self._by_context.setdefault(context_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        keys = self._by_context.get(entry.context_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[entry.context_key]
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_context.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Create a single instance to be imported
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    semantic=settings.ANSWER_CACHE_SEMANTIC,
+    threshold=settings.ANSWER_CACHE_SIMILARITY
+)
+metrics.register_gauge("answer_cache_entries", "Answers in the answer cache.", lambda: {(): answer_cache.stats()["entries"]})
+metrics.register_gauge("answer_cache_hit_rate", "Share of answer cache lookups that hit.", lambda: {(): answer_cache.stats()["hit_rate"]})
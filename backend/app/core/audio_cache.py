@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+from . import metrics
+from ..utils.audio_utils import file_extension, resolve_audio_format
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_PREFIX = "tts_"
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of text to speak: Unicode-normalized, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class _AudioEntry:
+    def __init__(self, path: Path, nbytes: int, last_access: float):
+        self.path = path
+        self.nbytes = nbytes
+        self.last_access = last_access
+
+
+# A synthesize function writes the audio for a cache key to the given path
+SynthesizeFn = Callable[[Path], Awaitable[None]]
+
+
+class AudioCache:
+    """
+    On-disk cache of synthesized speech, keyed by normalized text and TTS model.
+
+    Files live in the audio directory as `tts_<key>.<ext>` and survive restarts (existing
+    files are indexed on startup). Once the cache exceeds `max_bytes`, least recently used
+    files are deleted, except those used within `min_age_seconds`, whose URLs may still be
+    handed out by unexpired TTS tasks.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, min_age_seconds: float, extension: str = "wav"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age_seconds = min_age_seconds
+        self.extension = extension
+        self._entries: "OrderedDict[str, _AudioEntry]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        material = f"{settings.TTS_MODEL}\0{self.extension}\0{normalize_text(text)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{CACHE_FILE_PREFIX}{key}.{self.extension}"
+
+    def load_existing(self):
+        """Indexes cache files left by a previous run, oldest first."""
+        files = sorted(self.directory.glob(f"{CACHE_FILE_PREFIX}*.{self.extension}"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            key = path.stem[len(CACHE_FILE_PREFIX):]
+            if key not in self._entries:
+                self._add(key, path, last_access=path.stat().st_mtime)
+        if files:
+            logger.info(f"Indexed {len(files)} cached TTS files ({self._bytes} bytes)")
+        self._evict()
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Returns the cached file for a key (counting a hit), or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.path.exists():
+            self._bytes -= entry.nbytes
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        entry.last_access = time.time()
+        self.hits += 1
+        return entry.path
+
+    async def get_or_synthesize(self, key: str, synthesize: SynthesizeFn) -> Tuple[Path, bool]:
+        """
+        Returns (path, cache_hit). Concurrent requests for the same key share one synthesis.
+        """
+        path = self.lookup(key)
+        if path is not None:
+            return path, True
+
+        pending = self._pending.get(key)
+        if pending:
+            self.hits += 1
+            return await asyncio.shield(pending), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        path = self.path_for(key)
+        # Write to a temporary name so a half-written file is never served or indexed
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            await synthesize(tmp_path)
+            os.replace(tmp_path, path)
+            self._add(key, path, last_access=time.time())
+            future.set_result(path)
+            self._evict()
+            return path, False
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # Nobody else may be waiting; mark the exception as retrieved
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    def _add(self, key: str, path: Path, last_access: float):
+        nbytes = path.stat().st_size
+        self._entries[key] = _AudioEntry(path, nbytes, last_access)
+        self._bytes += nbytes
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        cutoff = time.time() - self.min_age_seconds
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.last_access > cutoff:
+                continue
+            del self._entries[key]
+            self._bytes -= entry.nbytes
+            try:
+                if entry.path.exists():
+                    entry.path.unlink()
+            except OSError as e:
+                logger.error(f"Error removing cached TTS file {entry.path}: {e}")
+            logger.info(f"Evicted cached TTS audio {key[:12]} ({entry.nbytes} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Create a single instance to be imported
+audio_cache = AudioCache(
+    directory=settings.audio_path,
+    max_bytes=settings.TTS_CACHE_MAX_MB * 1024 * 1024,
+    min_age_seconds=settings.TTS_TASK_TTL_SECONDS,
+    extension=file_extension(resolve_audio_format(settings.TTS_AUDIO_FORMAT))
+)
+metrics.register_gauge("tts_audio_cache_bytes", "Size of cached TTS audio on disk.", lambda: {(): audio_cache.stats()["bytes"]})
+metrics.register_gauge("tts_audio_cache_entries", "Cached TTS audio files.", lambda: {(): audio_cache.stats()["entries"]})
@@ -1,6 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import List
 
 # Determine the base directory of the backend project
 # This assumes config.py is in backend/app/core
@@ -15,20 +16,126 @@ class Settings(BaseSettings):
     MAX_MODEL_LEN: int = 8192
     TOKENIZER_MODE: str = "mistral"
     MAX_TOKENS: int = 512
-    # TENSOR_PARALLEL_SIZE: int = 1 # Uncomment and set if using >1 GPU for vLLM
+    TENSOR_PARALLEL_SIZE: int = 1 # GPUs each engine shards the model across
+    GPU_MEMORY_UTILIZATION: float = 0.90 # Share of GPU memory an engine may claim (weights + KV cache)
+    MAX_NUM_SEQS: int = 256 # Sequences an engine decodes concurrently
+    QUANTIZATION: str = "" # e.g. 'awq', 'gptq', 'fp8' ('' = the checkpoint's own precision)
+    ENABLE_PREFIX_CACHING: bool = True # Reuse KV cache across questions about the same document
+    LLM_BACKEND: str = "vllm" # 'vllm', 'openai' (OpenAI-compatible servers in LLM_REPLICA_URLS) or 'fake' (canned answers, no GPU needed)
+    LLM_REPLICAS: int = 1 # In-process engines, 'fake' only; real replicas are separate servers (LLM_BACKEND=openai)
+    LLM_REPLICA_URLS: str = "" # Comma-separated base URLs for LLM_BACKEND=openai, e.g. 'http://gpu0:8001,http://gpu1:8001'
+    LLM_ROUTING: str = "least_loaded" # 'least_loaded' or 'session_affinity' (keeps a session's prefix cache warm)
+    LLM_REPLICA_TIMEOUT_SECONDS: float = 120.0
+    LLM_REPLICA_COOLDOWN_SECONDS: float = 10.0 # A failed replica is skipped this long
+    FAKE_LLM_FIRST_TOKEN_DELAY: float = 0.2 # Seconds before the fake engine emits its first token
+    FAKE_LLM_TOKEN_DELAY: float = 0.02 # Seconds between tokens from the fake engine
+    BATCH_MAX_SIZE: int = 16 # Max /ask requests submitted to the engine together
+    BATCH_WINDOW_MS: float = 10.0 # How long the scheduler waits to fill a batch
+    LLM_MAX_CONCURRENT: int = 64 # Generations in flight; more wait in line
+    LLM_QUEUE_MAX: int = 256 # Generations waiting beyond this are rejected with 503 + Retry-After
+    ASK_BATCH_MAX_QUESTIONS: int = 200 # Questions accepted by one /ask_batch call
+    ASK_BATCH_CONCURRENCY: int = 16 # Questions of one /ask_batch call generated at the same time
+
+    # CPU-bound upload work (hashing, image preparation, embeddings, small PDFs) on dedicated threads
+    CPU_WORKERS: int = 0 # 0 = one per CPU core
+    CPU_QUEUE_MAX: int = 64 # Jobs waiting beyond this are rejected with 503 + Retry-After
+
+    # Conversation History (fitted into MAX_MODEL_LEN - MAX_TOKENS next to context and question)
+    HISTORY_ENABLED: bool = True
+    HISTORY_MAX_TURNS: int = 50 # Older turns are never sent, even if they would fit
+    HISTORY_COMPACT_RATIO: float = 0.5 # On overflow, drop oldest turns until history uses this share of its budget
+
+    # Answer Cache (repeated questions about the same context skip generation)
+    ANSWER_CACHE_ENABLED: bool = True # With HISTORY_ENABLED, only a session's first question is cached (later answers depend on the conversation)
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+    ANSWER_CACHE_SEMANTIC: bool = False # Also match near-duplicate questions by embedding similarity
+    ANSWER_CACHE_SIMILARITY: float = 0.92 # Minimum cosine similarity for a near-duplicate match
+
+    # PDF Extraction Settings
+    PDF_PARALLEL_MIN_PAGES: int = 64 # Documents with at least this many pages use the process pool
+    PDF_PAGES_PER_TASK: int = 16 # Smallest page range handed to one worker
+    PDF_EXTRACT_WORKERS: int = 0 # Process pool size (0 = half the CPU cores)
+    PDF_QUEUE_MAX: int = 8 # Large documents waiting for the process pool beyond this are rejected
+
+    # Upload Settings (bodies are streamed to temporary files and rejected once over the limit)
+    UPLOAD_MAX_MB: int = 100
+    UPLOAD_TMP_DIR: str = "" # Where uploads are received ('' = the system temp directory)
+
+    # Image Settings (uploads are downscaled once to what the vision encoder actually uses)
+    IMAGE_MAX_SIDE: int = 1024 # Pixtral's default maximum image size
+    IMAGE_JPEG_QUALITY: int = 90
+    IMAGE_MAX_UPLOAD_PIXELS: int = 64_000_000 # Larger images are rejected from their header
+
+    # Session Settings
+    SESSION_BACKEND: str = "memory" # 'memory' or 'redis' (shared across workers; needs sticky session routing)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SESSION_TTL_SECONDS: int = 3600 # Idle sessions expire after this long (0 = never)
+    SESSION_MAX_COUNT: int = 1000 # In-memory store: least recently used sessions are evicted beyond this
+    SESSION_MAX_MB: int = 1024 # In-memory store: memory budget for session data
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 60
+    SESSION_MAX_DOCUMENTS: int = 20 # PDFs/images attached to one session
+
+    # Content Cache (processed uploads keyed by content hash)
+    CONTENT_CACHE_MAX_MB: int = 1024
+
+    # Retrieval Settings (large PDFs are chunked and only the most relevant chunks are sent)
+    RETRIEVAL_ENABLED: bool = True
+    RETRIEVAL_MIN_CHARS: int = 12000 # Smaller documents are sent whole
+    RETRIEVAL_CHUNK_CHARS: int = 1200
+    RETRIEVAL_CHUNK_OVERLAP: int = 200
+    RETRIEVAL_TOP_K: int = 6
+    CONTEXT_MAX_TOKENS: int = 4096 # Document context of a session (all its documents) is fitted into this
+    EMBEDDER: str = "hashing" # 'hashing' (offline) or 'sentence-transformers'
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_DIM: int = 512 # Dimension of the hashing embedder
+    EMBED_BATCH_SIZE: int = 64
 
     # TTS Settings
     TTS_MODEL: str = "tts_models/en/ljspeech/vits"
     ENABLE_GPU_TTS: bool = False
+    TTS_BACKEND: str = "coqui" # 'coqui' or 'fake' (writes silence, no TTS library needed)
+    FAKE_TTS_SECONDS_PER_CHAR: float = 0.001 # Simulated synthesis time of the fake TTS model
+    TTS_WORKERS: int = 4 # Synthesis jobs and streamed sentences in flight (spread over the TTS replicas)
+    TTS_REPLICAS: int = 1 # Model instances; more than one run in worker processes, sharing the CPU cores
+    TTS_THREADS_PER_REPLICA: int = 0 # Torch threads per replica process (0 = CPU cores / TTS_REPLICAS; one replica then runs in-process)
+    TTS_QUEUE_MAX: int = 32 # Pending jobs beyond this are rejected
+    TTS_JOB_TIMEOUT_SECONDS: float = 120.0
+    TTS_TASK_TTL_SECONDS: float = 600.0 # Finished tasks and their audio are removed after this long
+    TTS_AUDIO_FORMAT: str = "wav" # 'wav', 'mp3', 'ogg' (Vorbis) or 'opus'; compressed formats need soundfile
+    TTS_CACHE_ENABLED: bool = True # Reuse audio for repeated answers (keyed by normalized text + TTS_MODEL)
+    TTS_CACHE_MAX_MB: int = 512 # Disk budget for cached audio; least recently used files are deleted
 
-    # Whisper Settings (Uncomment if implementing backend STT)
-    # WHISPER_MODEL: str = "large-v3-turbo"
+    # Model Loading
+    MODEL_LOADING: str = "eager" # 'eager' (start loading at startup) or 'lazy' (load on first use, fast start)
+    MODEL_WARMUP: bool = True # Run a warm-up pass after eager loading
+
+    # Speech-to-Text (POST /api/v1/stt/transcribe; the model loads on first use)
+    STT_BACKEND: str = "faster-whisper" # 'faster-whisper' or 'fake' (fixed transcript per speech segment, no model needed)
+    WHISPER_MODEL: str = "small" # faster-whisper model size or path, e.g. 'base', 'small', 'large-v3-turbo'
+    WHISPER_DEVICE: str = "cpu" # 'cpu', 'cuda' or 'auto'
+    WHISPER_COMPUTE_TYPE: str = "int8" # CTranslate2 precision, e.g. 'int8' (CPU), 'float16' (GPU)
+    WHISPER_CPU_THREADS: int = 0 # 0 = CTranslate2's default
+    STT_BEAM_SIZE: int = 1 # 1 = greedy decoding (fastest)
+    STT_LANGUAGE: str = "" # '' = detect per segment
+    STT_PRELOAD: bool = False # Load the model with the others at startup (MODEL_LOADING=eager)
+    STT_WORKERS: int = 1 # Segments transcribed at the same time
+    STT_QUEUE_MAX: int = 16 # Segments waiting beyond this are rejected with 503 + Retry-After
+    STT_VAD_ENERGY_THRESHOLD: float = 0.01 # RMS level (full scale = 1.0) above which a 30 ms frame counts as speech
+    STT_VAD_MIN_SILENCE_MS: int = 500 # Silence that ends a speech segment (and sends it for transcription)
+    STT_MAX_SEGMENT_SECONDS: float = 20.0 # Longer speech is cut into segments of this length
+    STT_MAX_AUDIO_SECONDS: float = 300.0 # Longer recordings are rejected
+    FAKE_STT_TEXT: str = "What is this document about?" # Transcript of every segment from the fake model
 
     # Static File Paths
     STATIC_DIR: str = "static"
     UPLOAD_DIR: str = "static/uploads"
     AUDIO_DIR: str = "static/audio"
 
+    @property
+    def replica_urls(self) -> List[str]:
+        return [url.strip() for url in self.LLM_REPLICA_URLS.split(",") if url.strip()]
+
     # Derived paths
     @property
     def upload_path(self) -> Path:
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from . import metrics, session_manager
+
+logger = logging.getLogger(__name__)
+
+
+def new_hasher():
+    """Hash used to address uploaded content; update it chunk by chunk while reading."""
+    return hashlib.sha256()
+
+
+class ContentEntry:
+    """Derived data for one unique upload (extracted text, index, prepared image, ...)."""
+
+    def __init__(self, digest: str, kind: str, data: Dict[str, Any], nbytes: int, files: List[str]):
+        self.digest = digest
+        self.kind = kind
+        self.data = data
+        self.nbytes = nbytes
+        self.files = files # Files on disk owned by this entry, deleted on eviction
+        self.refcount = 0
+        self.last_access = time.monotonic()
+
+
+# A compute function returns (data, nbytes, owned_files) for a digest that is not cached yet
+ComputeFn = Callable[[], Awaitable[Tuple[Dict[str, Any], int, List[str]]]]
+
+
+class ContentStore:
+    """
+    Content-addressed cache of processed uploads.
+
+    Entries are keyed by the SHA-256 of the upload bytes, so a repeated document or image
+    costs one hash instead of a full extraction. Sessions hold references; entries without
+    references are evicted least-recently-used first once the store exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ContentEntry]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._session_refs: Dict[str, List[str]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[ContentEntry]:
+        entry = self._entries.get(digest)
+        if entry:
+            self._entries.move_to_end(digest)
+            entry.last_access = time.monotonic()
+        return entry
+
+    async def get_or_compute(self, digest: str, kind: str, compute: ComputeFn) -> Tuple[ContentEntry, bool]:
+        """
+        Returns (entry, cache_hit). Concurrent uploads of the same content share one computation.
+        """
+        while True:
+            entry = self.get(digest)
+            if entry:
+                self.hits += 1
+                logger.info(f"Content cache hit for {kind} {digest[:12]}")
+                return entry, True
+
+            pending = self._pending.get(digest)
+            if pending is None:
+                break
+            # Waits without inheriting the computing upload's cancellation: if that client went
+            # away, its computation is dropped and the first waiter to wake up starts another
+            await asyncio.wait([pending])
+            if not pending.cancelled():
+                self.hits += 1
+                return pending.result(), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[digest] = future
+        try:
+            data, nbytes, files = await compute()
+            entry = ContentEntry(digest, kind, data, nbytes, files)
+            self._entries[digest] = entry
+            self._bytes += nbytes
+            future.set_result(entry)
+            # The new entry has no session reference yet, so it must survive this pass
+            self._evict(protect=digest)
+            return entry, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(digest, None)
+
+    def resolve(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Joins session documents (metadata with a `content_hash`) with their processed content.
+        Returns (resolved documents, documents whose content is not in this worker's store).
+        """
+        resolved, missing = [], []
+        for document in documents:
+            entry = self.get(document["content_hash"])
+            if entry is None:
+                missing.append(document)
+            elif entry.kind == "image":
+                resolved.append({
+                    **document, "image_url": entry.data["image_url"],
+                    "image_size": (entry.data["width"], entry.data["height"])
+                })
+            else:
+                resolved.append({**document, **entry.data})
+        return resolved, missing
+
+    def acquire(self, digest: str, session_id: str):
+        """Records that a session uses an entry, protecting it from eviction."""
+        entry = self._entries.get(digest)
+        if entry:
+            entry.refcount += 1
+            self._session_refs.setdefault(session_id, []).append(digest)
+
+    def release(self, digest: str, session_id: str):
+        """Drops one reference a session holds on an entry (e.g. when a document is detached)."""
+        refs = self._session_refs.get(session_id, [])
+        if digest not in refs:
+            return
+        refs.remove(digest)
+        if not refs:
+            self._session_refs.pop(session_id, None)
+        entry = self._entries.get(digest)
+        if entry:
+            entry.refcount = max(0, entry.refcount - 1)
+        self._evict()
+
+    def release_session(self, session_id: str):
+        """Drops all references held by a session (registered as a session cleanup hook)."""
+        for digest in self._session_refs.pop(session_id, []):
+            entry = self._entries.get(digest)
+            if entry:
+                entry.refcount = max(0, entry.refcount - 1)
+        self._evict()
+
+    def _evict(self, protect: Optional[str] = None):
+        if self._bytes <= self.max_bytes:
+            return
+        for digest in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[digest]
+            if entry.refcount > 0 or digest == protect:
+                continue
+            self._remove(digest)
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest)
+        self._bytes -= entry.nbytes
+        for path in entry.files:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.error(f"Error removing cached file {path}: {e}")
+        logger.info(f"Evicted {entry.kind} {digest[:12]} from content cache ({entry.nbytes} bytes)")
+
+    def clear(self):
+        """Removes every entry and its files (e.g. on shutdown)."""
+        for digest in list(self._entries):
+            self._remove(digest)
+        self._session_refs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Create a single instance to be imported
+content_store = ContentStore(max_bytes=settings.CONTENT_CACHE_MAX_MB * 1024 * 1024)
+session_manager.register_cleanup_hook(content_store.release_session)
+metrics.register_gauge("content_cache_bytes", "Estimated size of processed uploads in the content cache.", lambda: {(): content_store.stats()["bytes"]})
+metrics.register_gauge("content_cache_entries", "Processed uploads in the content cache.", lambda: {(): content_store.stats()["entries"]})
@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from .config import settings
+from . import prompt_builder, session_manager
+
+logger = logging.getLogger(__name__)
+
+# Role markers and separators the chat template adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class Turn:
+    """One question/answer exchange, tokenized once when it is recorded."""
+
+    def __init__(self, question: str, answer: str, num_tokens: int):
+        self.question = question
+        self.answer = answer
+        self.num_tokens = num_tokens
+
+
+class ConversationHistory:
+    """
+    Append-only history of one session.
+
+    Messages are rendered once per turn and only appended to. The prompt uses the turns
+    from `window_start` on; when they no longer fit, the window jumps forward far enough
+    to leave room for several more turns, so consecutive prompts keep sharing their prefix.
+    """
+
+    def __init__(self):
+        self.turns: List[Turn] = []
+        self.messages: List[Dict[str, Any]] = []
+        self.window_start = 0
+        self.window_tokens = 0
+
+    def append(self, turn: Turn):
+        self.turns.append(turn)
+        self.messages.append({"role": "user", "content": [{"type": "text", "text": turn.question}]})
+        self.messages.append({"role": "assistant", "content": [{"type": "text", "text": turn.answer}]})
+        self.window_tokens += turn.num_tokens
+
+    def _advance_window(self):
+        self.window_tokens -= self.turns[self.window_start].num_tokens
+        self.window_start += 1
+
+    def fit(self, budget_tokens: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns (messages within the budget, number of turns left out)."""
+        if self.window_tokens > budget_tokens:
+            target = budget_tokens * settings.HISTORY_COMPACT_RATIO
+            while self.window_start < len(self.turns) and self.window_tokens > target:
+                self._advance_window()
+        while len(self.turns) - self.window_start > settings.HISTORY_MAX_TURNS:
+            self._advance_window()
+        return self.messages[2 * self.window_start:], self.window_start
+
+
+class ConversationStore:
+    """Per-session conversation histories (in-process, dropped with the session)."""
+
+    def __init__(self):
+        self._histories: Dict[str, ConversationHistory] = {}
+
+    async def append(self, session_id: str, question: str, answer: str):
+        num_tokens = sum(await prompt_builder.count_tokens([question, answer])) + 2 * MESSAGE_OVERHEAD_TOKENS
+        self._histories.setdefault(session_id, ConversationHistory()).append(Turn(question, answer, num_tokens))
+
+    def has_history(self, session_id: str) -> bool:
+        return session_id in self._histories
+
+    def fit(self, session_id: str, budget_tokens: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns the session's history messages that fit `budget_tokens` and how many turns were dropped."""
+        history = self._histories.get(session_id)
+        if history is None:
+            return [], 0
+        messages, dropped = history.fit(max(0, budget_tokens))
+        if dropped:
+            logger.debug(f"Session {session_id}: {dropped} oldest turns left out of the prompt")
+        return messages, dropped
+
+    def discard(self, session_id: str):
+        self._histories.pop(session_id, None)
+
+    def clear(self):
+        self._histories.clear()
+
+
+# Create a single instance to be imported
+conversations = ConversationStore()
+session_manager.register_cleanup_hook(conversations.discard)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .config import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Clients are never told to wait longer than this, however deep the backlog
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class OverloadedError(Exception):
+    """Raised when a workload is at capacity. Answered with 503 and a Retry-After header."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    A fixed number of slots for one kind of work, with a bounded wait list in front of them.
+
+    At most `workers` jobs run at once and at most `max_queued` wait for a slot; anything
+    beyond that is rejected at once with OverloadedError, so a burst turns into fast
+    rejections instead of a queue whose tail latency grows without limit. Workloads that
+    run blocking code get their own pool (threads or processes) sized to the slots, so
+    they never compete with each other or with the default executor.
+    """
+
+    def __init__(self, name: str, workers: int, max_queued: int,
+                 pool_factory: Optional[Callable[[int], Executor]] = None):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self._pool_factory = pool_factory
+        self._pool: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._avg_seconds = 0.0
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def pool(self) -> Executor:
+        """The dedicated worker pool, started on first use."""
+        if self._pool_factory is None:
+            raise RuntimeError(f"Executor '{self.name}' has no worker pool.")
+        if self._pool is None:
+            logger.info(f"Starting '{self.name}' executor ({self.workers} workers, max {self.max_queued} queued)")
+            self._pool = self._pool_factory(self.workers)
+        return self._pool
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, estimated from recent job durations."""
+        per_job = self._avg_seconds or 1.0
+        estimate = per_job * (self.waiting + 1) / self.workers
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(estimate))))
+
+    def check(self):
+        """Raises OverloadedError if a new job would be rejected right now."""
+        if self.active + self.waiting >= self.workers + self.max_queued:
+            self.rejected += 1
+            raise OverloadedError(f"The server is busy ({self.name}). Please try again shortly.", self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Holds one slot for the duration of the block, waiting in line if all are taken."""
+        self.check()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        self.waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        metrics.QUEUE_WAIT_SECONDS.observe(started - queued_at, self.name)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._slots.release()
+            elapsed = time.perf_counter() - started
+            self._avg_seconds = elapsed if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Runs a blocking function on this workload's pool, subject to admission."""
+        async with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(self.pool, partial(func, *args))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_seconds": self._avg_seconds,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info(f"Executor '{self.name}' stopped.")
+
+
+def _thread_pool(prefix: str) -> Callable[[int], Executor]:
+    return lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=prefix)
+
+
+# --- Workloads ---
+# LLM requests only need admission (the engine schedules them itself); CPU-bound upload work
+# (hashing, image preparation, embeddings, small PDFs) runs on its own threads and large PDFs
+# on worker processes. Speech-to-text segments run on their own threads (the model releases
+# the GIL). TTS synthesis has its own bounded job queue in tts_service.
+llm = BoundedExecutor("llm", settings.LLM_MAX_CONCURRENT, settings.LLM_QUEUE_MAX)
+cpu = BoundedExecutor(
+    "cpu", settings.CPU_WORKERS or (os.cpu_count() or 2), settings.CPU_QUEUE_MAX, _thread_pool("cpu")
+)
+pdf = BoundedExecutor(
+    "pdf", settings.PDF_EXTRACT_WORKERS or max(1, (os.cpu_count() or 2) // 2), settings.PDF_QUEUE_MAX,
+    lambda workers: ProcessPoolExecutor(max_workers=workers)
+)
+stt = BoundedExecutor("stt", settings.STT_WORKERS, settings.STT_QUEUE_MAX, _thread_pool("stt"))
+_executors: List[BoundedExecutor] = [llm, cpu, pdf, stt]
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    return {executor.name: executor.stats() for executor in _executors}
+
+def shutdown_all():
+    """Stops the worker pools (e.g. on shutdown)."""
+    for executor in _executors:
+        executor.shutdown()
+
+metrics.register_gauge(
+    "executor_active_jobs", "Jobs holding a slot, by workload.",
+    lambda: {(executor.name,): executor.active for executor in _executors}, labelnames=("executor",)
+)
+metrics.register_gauge(
+    "executor_waiting_jobs", "Admitted jobs waiting for a slot, by workload.",
+    lambda: {(executor.name,): executor.waiting for executor in _executors}, labelnames=("executor",)
+)
+metrics.register_gauge(
+    "executor_rejected_jobs", "Jobs rejected because the workload was at capacity.",
+    lambda: {(executor.name,): executor.rejected for executor in _executors}, labelnames=("executor",)
+)
+# --- ---
@@ -1,102 +1,308 @@
+import asyncio
 import logging
 import atexit
-import torch.distributed as dist
-from vllm import LLM
-from vllm.sampling_params import SamplingParams
+import time
+import uuid
+from typing import AsyncIterator, Any, Dict, List, Optional, Tuple
+
+# Use try-except for optional dependencies so the fake backend works without a GPU stack
+try:
+    import torch.distributed as dist
+except ImportError:
+    dist = None # type: ignore
+
+try:
+    from vllm import AsyncEngineArgs, AsyncLLMEngine
+    from vllm.sampling_params import SamplingParams
+    from vllm.inputs import TextPrompt, TokensPrompt
+    from vllm.entrypoints.chat_utils import (
+        apply_hf_chat_template, apply_mistral_chat_template, parse_chat_messages_futures
+    )
+    from vllm.transformers_utils.tokenizer import MistralTokenizer
+except ImportError:
+    AsyncLLMEngine = None # type: ignore
 
 from .config import settings
+from . import metrics
+from .model_registry import ModelUnavailableError, registry
+from .prompt_builder import build_messages
+from .replicas import OpenAICompatibleEngine, ReplicaRouter
+from .scheduler import BatchScheduler
 
 logger = logging.getLogger(__name__)
 
-# --- Global LLM Instance ---
-# We initialize it globally but could also use FastAPI lifespan events
-try:
-    logger.info(f"Initializing vLLM with model: {settings.MODEL_NAME}")
-    llm = LLM(
-        model=settings.MODEL_NAME,
-        tokenizer_mode=settings.TOKENIZER_MODE,
-        max_model_len=settings.MAX_MODEL_LEN,
-        # tensor_parallel_size=settings.TENSOR_PARALLEL_SIZE # Uncomment if using TP
+class VLLMEngine:
+    """Wraps vLLM's AsyncLLMEngine and yields text deltas as tokens are decoded."""
+
+    def __init__(self):
+        engine_args = AsyncEngineArgs(
+            model=settings.MODEL_NAME,
+            tokenizer_mode=settings.TOKENIZER_MODE,
+            max_model_len=settings.MAX_MODEL_LEN,
+            # Reuse KV blocks of shared prompt prefixes (system prompt + document context)
+            enable_prefix_caching=settings.ENABLE_PREFIX_CACHING,
+            tensor_parallel_size=settings.TENSOR_PARALLEL_SIZE,
+            gpu_memory_utilization=settings.GPU_MEMORY_UTILIZATION,
+            max_num_seqs=settings.MAX_NUM_SEQS,
+            quantization=settings.QUANTIZATION or None
+        )
+        self.engine = AsyncLLMEngine.from_engine_args(engine_args)
+        self.sampling_params = SamplingParams(max_tokens=settings.MAX_TOKENS)
+
+    async def _render_prompt(self, messages: List[Dict[str, Any]]):
+        """Applies the chat template the same way `LLM.chat` does, but without blocking."""
+        model_config = await self.engine.get_model_config()
+        tokenizer = await self.engine.get_tokenizer()
+        conversation, mm_data_future = parse_chat_messages_futures(messages, model_config, tokenizer)
+
+        if isinstance(tokenizer, MistralTokenizer):
+            prompt_data = apply_mistral_chat_template(
+                tokenizer, messages=messages, chat_template=None, add_generation_prompt=True
+            )
+        else:
+            prompt_data = apply_hf_chat_template(
+                tokenizer, conversation=conversation, chat_template=None, add_generation_prompt=True
+            )
+
+        if isinstance(prompt_data, list):
+            prompt = TokensPrompt(prompt_token_ids=prompt_data)
+        else:
+            prompt = TextPrompt(prompt=prompt_data)
+
+        mm_data = await mm_data_future
+        if mm_data is not None:
+            prompt["multi_modal_data"] = mm_data
+        return prompt
+
+    async def encode(self, text: str) -> List[int]:
+        tokenizer = await self.engine.get_tokenizer()
+        return tokenizer.encode(text)
+
+    async def stream(self, messages: List[Dict[str, Any]], request_id: str, route_key: Optional[str] = None) -> AsyncIterator[str]:
+        prompt = await self._render_prompt(messages)
+        emitted = 0
+        finished = False
+        started = time.perf_counter()
+        first_token_at = None
+        output = None
+        try:
+            async for output in self.engine.generate(prompt, self.sampling_params, request_id):
+                if first_token_at is None and output.outputs[0].token_ids:
+                    first_token_at = time.perf_counter()
+                text = output.outputs[0].text
+                if len(text) > emitted:
+                    yield text[emitted:]
+                    emitted = len(text)
+                finished = output.finished
+        finally:
+            if not finished:
+                # Client went away or generation failed: free the sequence slot immediately
+                await self.engine.abort(request_id)
+            elif output is not None:
+                metrics.observe_generation(
+                    prompt_tokens=len(output.prompt_token_ids or []),
+                    first_token_seconds=first_token_at - started if first_token_at else None,
+                    output_tokens=len(output.outputs[0].token_ids),
+                    decode_seconds=time.perf_counter() - first_token_at if first_token_at else 0.0
+                )
+
+    async def _generate(self, messages: List[Dict[str, Any]]) -> str:
+        return "".join([delta async for delta in self.stream(messages, uuid.uuid4().hex)])
+
+    async def generate_batch(self, messages_list: List[List[Dict[str, Any]]], route_keys: Optional[List[Optional[str]]] = None) -> List[Any]:
+        """
+        Submits all conversations before yielding to the engine loop, so they are
+        scheduled into the same engine step and decoded as one batch.
+        """
+        return await asyncio.gather(
+            *(self._generate(messages) for messages in messages_list), return_exceptions=True
+        )
+
+    def shutdown(self):
+        self.engine.shutdown_background_loop()
+
+
+class FakeLLMEngine:
+    """
+    Stand-in engine that emits a canned answer word by word on a timer.
+    Used for tests and local development without a GPU (LLM_BACKEND=fake).
+    """
+
+    def __init__(self, first_token_delay: float = 0.0, token_delay: float = 0.0, reply: Optional[str] = None):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply = reply
+
+    def _reply_for(self, messages: List[Dict[str, Any]]) -> str:
+        if self.reply is not None:
+            return self.reply
+        question = ""
+        for part in messages[-1]["content"]:
+            if part.get("type") == "text":
+                question = part["text"]
+        return f"This is a fake answer to: {question}"
+
+    async def encode(self, text: str) -> List[int]:
+        # Whitespace "tokens" are enough for token accounting in tests
+        return [hash(word) & 0xFFFF for word in text.split()]
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+        return sum(
+            len(part.get("text", "").split()) for message in messages for part in message["content"]
+        )
+
+    async def stream(self, messages: List[Dict[str, Any]], request_id: str, route_key: Optional[str] = None) -> AsyncIterator[str]:
+        words = self._reply_for(messages).split(" ")
+        started = time.perf_counter()
+        await asyncio.sleep(self.first_token_delay)
+        first_token_at = time.perf_counter()
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+        metrics.observe_generation(
+            self._prompt_tokens(messages), first_token_at - started, len(words), time.perf_counter() - first_token_at
+        )
+
+    async def generate_batch(self, messages_list: List[List[Dict[str, Any]]], route_keys: Optional[List[Optional[str]]] = None) -> List[Any]:
+        # One shared decode loop: a batch costs as many steps as its longest answer
+        replies = [self._reply_for(messages) for messages in messages_list]
+        steps = max(len(reply.split(" ")) for reply in replies)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * (steps - 1))
+        for messages, reply in zip(messages_list, replies):
+            words = len(reply.split(" "))
+            metrics.observe_generation(
+                self._prompt_tokens(messages), self.first_token_delay, words, self.token_delay * (words - 1)
+            )
+        return replies
+
+    def shutdown(self):
+        pass
+
+
+# --- Engine Registration ---
+# The engine is built by the model registry (eagerly in the app lifespan or lazily on first use),
+# never as an import side effect.
+def _build_local_engine():
+    if settings.LLM_BACKEND == "fake":
+        logger.info("Initializing fake LLM engine.")
+        return FakeLLMEngine(
+            first_token_delay=settings.FAKE_LLM_FIRST_TOKEN_DELAY,
+            token_delay=settings.FAKE_LLM_TOKEN_DELAY
+        )
+    if AsyncLLMEngine is None:
+        raise ModelUnavailableError("vLLM is not installed.")
+    logger.info(
+        f"Initializing async vLLM engine with model: {settings.MODEL_NAME} "
+        f"(tp={settings.TENSOR_PARALLEL_SIZE}, gpu_memory_utilization={settings.GPU_MEMORY_UTILIZATION}, "
+        f"max_num_seqs={settings.MAX_NUM_SEQS}, quantization={settings.QUANTIZATION or 'none'})"
     )
-    sampling_params = SamplingParams(max_tokens=settings.MAX_TOKENS)
-    logger.info("vLLM initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize vLLM: {e}", exc_info=True)
-    llm = None
-    sampling_params = None
+    return VLLMEngine()
+
+def _load_engine():
+    if settings.LLM_BACKEND == "openai":
+        if not settings.replica_urls:
+            raise ModelUnavailableError("LLM_BACKEND=openai needs at least one URL in LLM_REPLICA_URLS.")
+        logger.info(f"Using OpenAI-compatible LLM servers: {', '.join(settings.replica_urls)}")
+        replicas = [
+            OpenAICompatibleEngine(url, settings.MODEL_NAME, settings.MAX_TOKENS, settings.LLM_REPLICA_TIMEOUT_SECONDS)
+            for url in settings.replica_urls
+        ]
+    else:
+        if settings.LLM_REPLICAS > 1 and settings.LLM_BACKEND != "fake":
+            # Every in-process engine would claim GPU_MEMORY_UTILIZATION of the same device
+            raise ModelUnavailableError(
+                "LLM_REPLICAS > 1 is only supported with LLM_BACKEND=fake; run one vLLM server per GPU "
+                "and use LLM_BACKEND=openai with LLM_REPLICA_URLS instead."
+            )
+        replicas = [_build_local_engine() for _ in range(max(1, settings.LLM_REPLICAS))]
+    if len(replicas) == 1:
+        return replicas[0]
+    logger.info(f"Routing LLM requests over {len(replicas)} replicas ({settings.LLM_ROUTING}).")
+    return ReplicaRouter(replicas, settings.LLM_ROUTING, settings.LLM_REPLICA_COOLDOWN_SECONDS)
+
+async def _warmup_engine(engine):
+    # A short generation triggers CUDA graph capture / kernel compilation before real traffic
+    for replica in getattr(engine, "replicas", [engine]):
+        async for _ in replica.stream(build_messages("Hello"), request_id=f"warmup-{uuid.uuid4().hex}"):
+            pass
+
+async def _unload_engine(engine):
+    result = engine.shutdown()
+    if asyncio.iscoroutine(result):
+        await result
+    cleanup_llm()
+
+registry.register("llm", _load_engine, warmup=_warmup_engine, unload=_unload_engine)
 # --- ---
 
-def generate_answer(question: str, text_context: str = "", image_url: str = None) -> str:
+async def _dispatch_batch(payloads: List[Tuple[List[Dict[str, Any]], Optional[str]]]) -> List[Any]:
+    engine = await registry.get("llm")
+    return await engine.generate_batch(
+        [messages for messages, _ in payloads], [route_key for _, route_key in payloads]
+    )
+
+# Requests arriving within the batch window share one generate call
+batch_scheduler = BatchScheduler(
+    _dispatch_batch,
+    name="llm_batch",
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_WINDOW_MS
+)
+metrics.register_gauge("llm_batch_queue_depth", "Requests waiting for the next LLM batch.", lambda: {(): batch_scheduler.stats()["queue_depth"]})
+
+def replica_stats() -> List[Dict[str, Any]]:
+    """Load per replica when requests are routed over several, else an empty list."""
+    engine = registry.peek("llm")
+    return engine.stats() if isinstance(engine, ReplicaRouter) else []
+
+metrics.register_gauge(
+    "llm_replica_inflight", "LLM requests in flight per replica.",
+    lambda: {(stats["replica"],): stats["inflight"] for stats in replica_stats()}, labelnames=("replica",)
+)
+
+async def stream_answer(messages: List[Dict[str, Any]], route_key: Optional[str] = None) -> AsyncIterator[str]:
     """
-    Generates an answer using the initialized Pixtral/vLLM model.
+    Streams an answer from the async engine, yielding text deltas as they are decoded.
+    `route_key` (the session ID) keeps a session on one replica under session affinity.
+
+    Raises:
+        ModelUnavailableError: If the engine could not be loaded.
+    """
+    engine = await registry.get("llm")
+    logger.debug(f"Sending messages to LLM: {messages}")
+    async for delta in engine.stream(messages, request_id=uuid.uuid4().hex, route_key=route_key):
+        yield delta
+
+async def generate_answer(messages: List[Dict[str, Any]], route_key: Optional[str] = None) -> str:
+    """
+    Generates a complete answer, batched with other concurrent requests by the scheduler.
 
     Args:
-        question: The user's question.
-        text_context: Optional text context (e.g., from PDF).
-        image_url: Optional URL to an image file (must be accessible by the server).
+        messages: Chat messages built by `prompt_builder.build_messages`.
+        route_key: Session ID used for replica affinity, if any.
 
     Returns:
         The generated answer string.
     """
-    if not llm or not sampling_params:
-        logger.error("LLM not initialized. Cannot generate answer.")
-        return "Error: The AI model is not available."
-
-    system_message = {
-        "role": "system",
-        "content": [{
-            "type": "text",
-            "text": (
-                "You are Sarah, a helpful AI assistant at the T-Systems Innovationcenter in Munich. "
-                "Answer concisely in one or two brief paragraphs. Keep your responses short, clear, and to the point."
-            )
-        }]
-    }
-
-    prompt = question
-    if text_context:
-        # Add context clearly separated
-        prompt += f"\n\n--- Context ---\n{text_context}\n--- End Context ---"
-
-    user_message_content = [{"type": "text", "text": prompt}]
-
-    if image_url:
-        # Ensure the image_url is accessible by the vLLM server instance
-        # If running locally, file:// might work, but http:// is safer if serving files
-        logger.info(f"Adding image to prompt: {image_url}")
-        user_message_content.append({
-            "type": "image_url",
-            "image_url": {"url": image_url}
-        })
-
-    user_message = {
-        "role": "user",
-        "content": user_message_content
-    }
-
-    messages = [system_message, user_message]
-    logger.debug(f"Sending messages to LLM: {messages}")
-
+    logger.debug(f"Queueing messages for LLM: {messages}")
     try:
-        outputs = llm.chat(messages, sampling_params=sampling_params)
-        result = outputs[0].outputs[0].text
+        result = await batch_scheduler.submit((messages, route_key))
         logger.info("LLM generation successful.")
-
-        # Optional: Truncate long responses (consider if needed)
-        # max_length = 500
-        # if len(result) > max_length:
-        #     result = result[:max_length].rstrip() + "..."
         return result
-
+    except ModelUnavailableError as e:
+        logger.error(f"LLM not available. Cannot generate answer: {e}")
+        return "Error: The AI model is not available."
     except Exception as e:
         logger.error(f"Error during LLM generation: {e}", exc_info=True)
         return "Error: Failed to generate response from AI model."
 
 def cleanup_llm():
     """Cleans up distributed processes if initialized by vLLM."""
-    if dist.is_initialized():
+    if dist is not None and dist.is_initialized():
         logger.info("Destroying torch distributed process group.")
         dist.destroy_process_group()
 
 # Register cleanup function to be called on exit
-atexit.register(cleanup_llm)
\ No newline at end of file
+atexit.register(cleanup_llm)
@@ -0,0 +1,241 @@
+import bisect
+import contextvars
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Metric Types ---
+# A small Prometheus text-format (0.0.4) implementation, so exposing metrics needs no extra
+# dependency. Observations are cheap (a bisect and two additions under a lock) and may come
+# from worker threads.
+
+LabelValues = Tuple[str, ...]
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[LabelValues, _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(labelvalues)
+            if child is None:
+                child = self._children[labelvalues] = _HistogramChild(self.buckets)
+            child.counts[index] += 1
+            child.sum += value
+            child.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = [(values, list(child.counts), child.sum, child.count) for values, child in self._children.items()]
+        for values, counts, total, count in children:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """A gauge read from a callback at scrape time, returning {label values: value}."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.error(f"Collecting gauge {self.name} failed: {e}", exc_info=True)
+            return lines
+        for labelvalues, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+_metrics: List = []
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+def register_gauge(name: str, documentation: str, collect: Callable[[], Dict[LabelValues, float]], labelnames: Sequence[str] = ()):
+    """Registers a gauge whose value(s) are computed by `collect` on every scrape."""
+    return _register(Gauge(name, documentation, labelnames, collect))
+
+def render() -> str:
+    """The current value of every metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+# --- ---
+
+
+# --- Request Path Metrics ---
+UPLOAD_SECONDS = _register(Histogram(
+    "upload_processing_seconds", "Time to process an upload, by mode and content cache result.", ("mode", "cached")
+))
+PDF_EXTRACTION_SECONDS = _register(Histogram(
+    "pdf_extraction_seconds", "Time to extract the text of a PDF."
+))
+PROMPT_TOKENS = _register(Histogram(
+    "llm_prompt_tokens", "Prompt length in tokens.",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+))
+TIME_TO_FIRST_TOKEN = _register(Histogram(
+    "llm_time_to_first_token_seconds", "Time from submitting a prompt to its first output token."
+))
+DECODE_TOKENS_PER_SECOND = _register(Histogram(
+    "llm_decode_tokens_per_second", "Output tokens per second after the first token.",
+    buckets=(1, 5, 10, 20, 40, 80, 160, 320, 640)
+))
+GENERATED_TOKENS = _register(Counter(
+    "llm_generated_tokens_total", "Output tokens generated."
+))
+TTS_REAL_TIME_FACTOR = _register(Histogram(
+    "tts_real_time_factor", "Synthesis time divided by the duration of the produced audio.",
+    ("mode",), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+))
+STT_REAL_TIME_FACTOR = _register(Histogram(
+    "stt_real_time_factor", "Transcription time divided by the duration of the transcribed audio.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+))
+CONTEXT_DROPPED_TOKENS = _register(Counter(
+    "context_dropped_tokens_total", "Document tokens left out of prompts to fit the context budget."
+))
+QUEUE_WAIT_SECONDS = _register(Histogram(
+    "executor_queue_wait_seconds", "Time work spends queued before an executor picks it up.", ("executor",)
+))
+REQUEST_STAGE_SECONDS = _register(Histogram(
+    "request_stage_seconds", "Time spent in each stage of request handling.", ("stage",)
+))
+
+
+def observe_generation(prompt_tokens: int, first_token_seconds: Optional[float], output_tokens: int, decode_seconds: float):
+    """Records one finished generation."""
+    PROMPT_TOKENS.observe(prompt_tokens)
+    GENERATED_TOKENS.inc(output_tokens)
+    if first_token_seconds is not None:
+        TIME_TO_FIRST_TOKEN.observe(first_token_seconds)
+    if output_tokens > 1 and decode_seconds > 0:
+        DECODE_TOKENS_PER_SECOND.observe((output_tokens - 1) / decode_seconds)
+# --- ---
+
+
+# --- Per-request Stage Timing ---
+# Stages recorded while handling a request are reported back in a `Server-Timing` header.
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_stages", default=None
+)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times a block as one stage of the current request (and in request_stage_seconds)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def record_stage(name: str, seconds: float):
+    REQUEST_STAGE_SECONDS.observe(seconds, name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that collects the stages timed during a request and adds them, plus the
+    total, as a `Server-Timing` header. Streaming responses report the stages completed
+    before their first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+                entries.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+# --- ---
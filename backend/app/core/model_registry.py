@@ -0,0 +1,176 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+Model_State = Literal["unloaded", "loading", "ready", "failed"]
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a model is requested but could not be loaded."""
+    pass
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], Any]],
+                 unload: Optional[Callable[[Any], Any]], required: bool, eager: bool):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.unload = unload
+        self.required = required
+        self.eager = eager
+        self.state: Model_State = "unloaded"
+        self.instance: Any = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmed_up = False
+        self.lock = asyncio.Lock()
+
+
+async def _call(func: Callable, *args) -> Any:
+    """Awaits coroutine functions and runs blocking ones in a worker thread."""
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+class ModelRegistry:
+    """
+    Owns the heavyweight models (LLM engine, TTS) so that importing a module never loads one.
+
+    Modules register a loader at import time; the FastAPI lifespan decides whether
+    everything is loaded eagerly at startup or lazily on first use.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _ModelEntry] = {}
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Optional[Callable[[Any], Any]] = None,
+        unload: Optional[Callable[[Any], Any]] = None,
+        required: bool = True,
+        eager: bool = True
+    ):
+        """
+        Registers a model loader. `required` models gate the readiness probe; models that
+        are not `eager` are left out of eager loading and always load on first use.
+        """
+        self._entries[name] = _ModelEntry(name, loader, warmup, unload, required, eager)
+
+    def set_instance(self, name: str, instance: Any):
+        """
+        Installs an already constructed model (e.g. a stub backend in tests). With None,
+        the model goes back to unloaded and is loaded again on next use.
+        """
+        entry = self._entries[name]
+        entry.instance = instance
+        entry.state = "ready" if instance is not None else "unloaded"
+        entry.error = None
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Returns the model if it is loaded, without triggering a load."""
+        entry = self._entries.get(name)
+        return entry.instance if entry and entry.state == "ready" else None
+
+    def is_available(self, name: str) -> bool:
+        """True if the model is loaded or could still be loaded on demand."""
+        entry = self._entries.get(name)
+        return bool(entry) and entry.state != "failed"
+
+    async def get(self, name: str) -> Any:
+        """Returns the model, loading it first if needed."""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ModelUnavailableError(f"Unknown model '{name}'.")
+        if entry.state != "ready":
+            await self.load(name)
+        if entry.state != "ready":
+            raise ModelUnavailableError(f"Model '{name}' is not available: {entry.error}")
+        return entry.instance
+
+    async def load(self, name: str):
+        """Loads a model once; concurrent callers wait for the same load."""
+        entry = self._entries[name]
+        async with entry.lock:
+            if entry.state in ("ready", "failed"):
+                return
+            entry.state = "loading"
+            started = time.perf_counter()
+            logger.info(f"Loading model '{name}'...")
+            try:
+                instance = await _call(entry.loader)
+                if instance is None:
+                    raise ModelUnavailableError("Loader returned no model.")
+                entry.instance = instance
+                entry.state = "ready"
+                entry.load_seconds = time.perf_counter() - started
+                logger.info(f"Model '{name}' loaded in {entry.load_seconds:.1f}s.")
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+                logger.error(f"Failed to load model '{name}': {e}", exc_info=True)
+
+    async def warmup(self, name: str):
+        """Runs the model's warm-up pass (first-request compilation, caches, etc.)."""
+        entry = self._entries[name]
+        if entry.state != "ready" or entry.warmed_up or entry.warmup is None:
+            return
+        started = time.perf_counter()
+        try:
+            await _call(entry.warmup, entry.instance)
+            entry.warmed_up = True
+            logger.info(f"Model '{name}' warmed up in {time.perf_counter() - started:.1f}s.")
+        except Exception as e:
+            # A failed warm-up is not fatal; the first real request simply pays the cost
+            logger.warning(f"Warm-up of model '{name}' failed: {e}", exc_info=True)
+
+    async def load_all(self, warmup: bool = True):
+        """Loads (and optionally warms up) every eagerly loaded model concurrently."""
+        names = [name for name, entry in self._entries.items() if entry.eager]
+        await asyncio.gather(*(self.load(name) for name in names))
+        if warmup:
+            await asyncio.gather(*(self.warmup(name) for name in names))
+
+    async def unload_all(self):
+        """Releases all loaded models."""
+        for entry in self._entries.values():
+            if entry.state == "ready" and entry.unload:
+                try:
+                    await _call(entry.unload, entry.instance)
+                except Exception as e:
+                    logger.error(f"Error unloading model '{entry.name}': {e}", exc_info=True)
+            entry.instance = None
+            entry.state = "unloaded"
+            entry.warmed_up = False
+
+    def is_ready(self, allow_unloaded: bool = False) -> bool:
+        """
+        True once every required model is loaded. With `allow_unloaded` (lazy loading),
+        models that will load on first use also count, as long as none has failed.
+        """
+        accepted = ("ready", "unloaded", "loading") if allow_unloaded else ("ready",)
+        return all(entry.state in accepted for entry in self._entries.values() if entry.required)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the load state of every registered model."""
+        return {
+            name: {
+                "state": entry.state,
+                "required": entry.required,
+                "warmed_up": entry.warmed_up,
+                "load_seconds": entry.load_seconds,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+# Create a single instance to be imported
+registry = ModelRegistry()
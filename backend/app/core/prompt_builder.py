@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import math
+from typing import Any, Dict, List, Optional
+
+# Use try-except for optional dependency
+try:
+    from vllm.transformers_utils.tokenizer import get_tokenizer
+except ImportError:
+    get_tokenizer = None # type: ignore
+
+from .config import settings
+from . import executors, retrieval, session_manager
+from .model_registry import ModelUnavailableError, registry
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are Sarah, a helpful AI assistant at the T-Systems Innovationcenter in Munich. "
+    "Answer concisely in one or two brief paragraphs. Keep your responses short, clear, and to the point."
+)
+
+
+# The block is rebuilt for every question rather than cached per session: the context fitter
+# has already counted its tokens (markers included), and the formatting is deterministic, so
+# the same selection always yields the same bytes and keeps the prefix cacheable in vLLM.
+def format_context_block(text_context: str) -> str:
+    """Formats document text the same way for every question, so the prefix is byte-identical."""
+    return f"--- Context ---\n{text_context}\n--- End Context ---"
+
+
+# Pixtral splits images into 16x16 patches, plus one break token per row of patches
+IMAGE_PATCH_SIZE = 16
+
+_system_prompt_tokens: Optional[int] = None
+
+async def system_prompt_tokens() -> int:
+    """Token count of SYSTEM_PROMPT, computed once."""
+    global _system_prompt_tokens
+    if _system_prompt_tokens is None:
+        engine = await registry.get("llm")
+        _system_prompt_tokens = len(await engine.encode(SYSTEM_PROMPT))
+    return _system_prompt_tokens
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    rows = math.ceil(height / IMAGE_PATCH_SIZE)
+    cols = math.ceil(width / IMAGE_PATCH_SIZE)
+    return rows * (cols + 1)
+
+
+# --- Token Counting ---
+class LocalTokenizer:
+    """The model's tokenizer loaded in this process, so counting tokens never waits on the engine."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def count(self, texts: List[str]) -> List[int]:
+        return [len(self.tokenizer.encode(text)) for text in texts]
+
+
+def _load_tokenizer():
+    logger.info(f"Loading tokenizer for {settings.MODEL_NAME} (mode: {settings.TOKENIZER_MODE})")
+    return LocalTokenizer(get_tokenizer(settings.MODEL_NAME, tokenizer_mode=settings.TOKENIZER_MODE))
+
+# Without vLLM (or with the fake backend) tokens are counted by the engine itself
+if get_tokenizer is not None and settings.LLM_BACKEND != "fake":
+    registry.register("tokenizer", _load_tokenizer, required=False)
+
+
+async def count_tokens(texts: List[str]) -> List[int]:
+    """Token counts of several texts, with the local tokenizer if there is one."""
+    if not texts:
+        return []
+    if registry.is_available("tokenizer"):
+        try:
+            tokenizer = await registry.get("tokenizer")
+            return await executors.cpu.run(tokenizer.count, texts)
+        except ModelUnavailableError:
+            pass
+    engine = await registry.get("llm")
+    return [len(token_ids) for token_ids in await asyncio.gather(*(engine.encode(text) for text in texts))]
+
+
+class DocumentTokenCounts:
+    """Token counts of one attached document's pages and index chunks."""
+
+    def __init__(self):
+        self.pages: Optional[List[int]] = None
+        self.chunks: Dict[int, int] = {}
+
+
+class TokenCountCache:
+    """
+    Per-session memo of token counts for attached documents.
+
+    A document's pages are counted the first time it is fitted into a prompt and its
+    chunks the first time retrieval picks them, so follow-up questions only pay for
+    tokenizing the question.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, DocumentTokenCounts]] = {}
+
+    def get(self, session_id: str, document_id: str) -> DocumentTokenCounts:
+        return self._entries.setdefault(session_id, {}).setdefault(document_id, DocumentTokenCounts())
+
+    def discard_document(self, session_id: str, document_id: str):
+        self._entries.get(session_id, {}).pop(document_id, None)
+
+    def discard(self, session_id: str):
+        self._entries.pop(session_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Create a single instance to be imported
+token_counts = TokenCountCache()
+session_manager.register_cleanup_hook(token_counts.discard)
+# --- ---
+
+
+# --- Multi-Document Context ---
+CHUNK_SEPARATOR = "\n\n[...]\n\n"
+# Upper bound for the tokens of a heading, separator or the context block's own markers
+FORMAT_OVERHEAD_TOKENS = 16
+
+
+def format_document_section(filename: str, text: str) -> str:
+    return f"=== Document: {filename} ===\n{text}"
+
+
+def _page_range(first: int, last: int, total: int) -> str:
+    return f"page {first} of {total}" if first == last else f"pages {first}-{last} of {total}"
+
+
+class ContextSelection:
+    """The document text picked for one question, and what was left out to fit the budget."""
+
+    def __init__(self, budget_tokens: int):
+        self.budget_tokens = budget_tokens
+        self.text = ""
+        self.num_tokens = 0
+        self.dropped_tokens = 0
+        self.dropped: List[str] = []
+
+    def drop(self, description: str, num_tokens: int):
+        self.dropped.append(description)
+        self.dropped_tokens += num_tokens
+
+
+def _fair_shares(demands: Dict[int, int], available: int) -> Dict[int, int]:
+    """
+    Splits `available` tokens between documents: none gets more than it asks for, and
+    the ones asking for more share what is left equally (max-min fairness).
+    """
+    shares = {}
+    pending = sorted(demands, key=demands.get)
+    while pending:
+        share = max(0, available) // len(pending)
+        if demands[pending[0]] > share:
+            shares.update((position, share) for position in pending)
+            break
+        position = pending.pop(0)
+        shares[position] = demands[position]
+        available -= demands[position]
+    return shares
+
+
+async def select_document_context(
+    session_id: str, documents: List[Dict[str, Any]], question: str, budget_tokens: int
+) -> ContextSelection:
+    """
+    Picks the text context for a question from a session's PDFs, within `budget_tokens`
+    as counted by the model's tokenizer.
+
+    Documents small enough to be sent whole ask for all their pages; indexed documents
+    ask for their share of the chunks most relevant to the question (the top
+    RETRIEVAL_TOP_K, ranked across all of them). If that is more than the budget, it is
+    split fairly between the documents: a whole document is cut after its last page that
+    fits its share, an indexed one keeps its best chunks that do. Everything left out is
+    recorded in the returned selection. With more than one document, each one's text is
+    headed by its filename.
+    """
+    selection = ContextSelection(budget_tokens)
+    pdfs = [document for document in documents if document["kind"] == "pdf" and document.get("text")]
+    heading_tokens = FORMAT_OVERHEAD_TOKENS if len(pdfs) > 1 else 0
+    memo = {position: token_counts.get(session_id, document["document_id"]) for position, document in enumerate(pdfs)}
+    demands: Dict[int, int] = {}
+
+    for position, document in enumerate(pdfs):
+        if document.get("index") is None:
+            if memo[position].pages is None:
+                memo[position].pages = await count_tokens(document["pages"])
+            demands[position] = sum(memo[position].pages) + heading_tokens
+
+    top: Dict[int, List[int]] = {}
+    indexed = [position for position, document in enumerate(pdfs) if document.get("index") is not None]
+    if indexed:
+        query_vector = await retrieval.embed_query(question)
+        candidates = []
+        for position in indexed:
+            scores = pdfs[position]["index"].scores(query_vector)
+            candidates.extend((float(score), position, chunk) for chunk, score in enumerate(scores))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        for _, position, chunk in candidates[:settings.RETRIEVAL_TOP_K]:
+            top.setdefault(position, []).append(chunk)
+        uncounted = [(position, chunk) for position, chunks in top.items() for chunk in chunks if chunk not in memo[position].chunks]
+        counted = await count_tokens([pdfs[position]["index"].chunks[chunk] for position, chunk in uncounted])
+        for (position, chunk), num_tokens in zip(uncounted, counted):
+            memo[position].chunks[chunk] = num_tokens
+        for position, chunks in top.items():
+            # The first chunk carries the document's heading, every further one a separator
+            demands[position] = (
+                sum(memo[position].chunks[chunk] for chunk in chunks)
+                + heading_tokens + FORMAT_OVERHEAD_TOKENS * (len(chunks) - 1)
+            )
+
+    shares = _fair_shares(demands, budget_tokens - FORMAT_OVERHEAD_TOKENS)
+    sections: Dict[int, str] = {}
+    used = FORMAT_OVERHEAD_TOKENS
+    for position, share in shares.items():
+        document = pdfs[position]
+        available = share - heading_tokens
+        if position in top:
+            kept_chunks = []
+            left_out = []
+            for chunk in top[position]: # Best first
+                cost = memo[position].chunks[chunk] + (FORMAT_OVERHEAD_TOKENS if kept_chunks else 0)
+                if cost <= available:
+                    kept_chunks.append(chunk)
+                    available -= cost
+                else:
+                    left_out.append(memo[position].chunks[chunk])
+            if left_out:
+                selection.drop(f"{document['filename']}: {len(left_out)} relevant chunks", sum(left_out))
+            if kept_chunks:
+                sections[position] = CHUNK_SEPARATOR.join(document["index"].chunks[i] for i in sorted(kept_chunks))
+        else:
+            pages = memo[position].pages
+            kept = 0
+            while kept < len(pages) and pages[kept] <= available:
+                available -= pages[kept]
+                kept += 1
+            if kept < len(pages):
+                selection.drop(f"{document['filename']}: {_page_range(kept + 1, len(pages), len(pages))}", sum(pages[kept:]))
+            if kept:
+                sections[position] = document["text"] if kept == len(pages) else "".join(document["pages"][:kept])
+        if position in sections:
+            used += share - available
+
+    if len(pdfs) == 1:
+        selection.text = sections.get(0, "")
+    else:
+        selection.text = "\n\n".join(
+            format_document_section(pdfs[position]["filename"], sections[position]) for position in sorted(sections)
+        )
+    selection.num_tokens = used if selection.text else 0
+    if indexed:
+        logger.info(f"Selected chunks from {len(indexed)} indexed documents: {sum(len(c) for c in top.values())} candidates")
+    if selection.dropped:
+        logger.warning(
+            f"Context for session {session_id} left out {selection.dropped_tokens} tokens to fit "
+            f"{budget_tokens}: {'; '.join(selection.dropped)}"
+        )
+    return selection
+# --- ---
+
+
+def build_messages(
+    question: str,
+    context_block: str = "",
+    image_urls: Optional[List[str]] = None,
+    history: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Builds the chat messages sent to the model.
+
+    The system prompt and the document text stay the same across a session and come
+    first, so consecutive questions share that token prefix and hit vLLM's prefix cache.
+    Earlier turns of the conversation (`history`, already fitted to the token budget)
+    follow, then one user message with the images and the question. The images are not
+    part of the shared prefix: history keeps only text, and chat templates need user and
+    assistant turns to alternate, so they travel with each question and are prefilled again.
+    """
+    system_text = SYSTEM_PROMPT
+    if context_block:
+        system_text += f"\n\n{context_block}"
+
+    system_message = {
+        "role": "system",
+        "content": [{"type": "text", "text": system_text}]
+    }
+
+    user_message_content = []
+    for image_url in image_urls or []:
+        # Uploaded images arrive as data URLs, decoded in-process by the engine (no HTTP fetch)
+        logger.info(f"Adding image to prompt ({len(image_url)} chars)")
+        user_message_content.append({
+            "type": "image_url",
+            "image_url": {"url": image_url}
+        })
+    user_message_content.append({"type": "text", "text": question})
+
+    user_message = {
+        "role": "user",
+        "content": user_message_content
+    }
+    return [system_message, *(history or []), user_message]
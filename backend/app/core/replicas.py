@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from . import metrics
+from .model_registry import ModelUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaUnavailableError(ModelUnavailableError):
+    """Raised when a replica cannot be reached or reports that it is overloaded."""
+    pass
+
+
+class OpenAICompatibleEngine:
+    """
+    An engine replica behind an OpenAI-compatible HTTP server (e.g. `vllm serve`),
+    with the same interface as the in-process engines.
+    """
+
+    def __init__(self, base_url: str, model: str, max_tokens: int, timeout_seconds: float):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_tokens = max_tokens
+        # Imported here so the in-process backends do not need httpx
+        import httpx
+        self._transport_error = httpx.TransportError
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url, timeout=httpx.Timeout(timeout_seconds, connect=5.0)
+        )
+
+    def __repr__(self) -> str:
+        return f"OpenAICompatibleEngine({self.base_url})"
+
+    async def encode(self, text: str) -> List[int]:
+        try:
+            response = await self.client.post("/tokenize", json={"model": self.model, "prompt": text})
+        except self._transport_error as e:
+            raise ReplicaUnavailableError(f"Replica {self.base_url} is unreachable: {e}") from e
+        response.raise_for_status()
+        return response.json()["tokens"]
+
+    async def stream(self, messages: List[Dict[str, Any]], request_id: str, route_key: Optional[str] = None) -> AsyncIterator[str]:
+        body = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        started = time.perf_counter()
+        first_token_at = None
+        usage = None
+        try:
+            async with self.client.stream(
+                "POST", "/v1/chat/completions", json=body, headers={"X-Request-Id": request_id}
+            ) as response:
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise ReplicaUnavailableError(f"Replica {self.base_url} answered {response.status_code}")
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage
+                    for choice in chunk.get("choices", []):
+                        text = (choice.get("delta") or {}).get("content")
+                        if text:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            yield text
+        except self._transport_error as e:
+            raise ReplicaUnavailableError(f"Replica {self.base_url} is unreachable: {e}") from e
+        if usage:
+            metrics.observe_generation(
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                first_token_seconds=first_token_at - started if first_token_at else None,
+                output_tokens=usage.get("completion_tokens", 0),
+                decode_seconds=time.perf_counter() - first_token_at if first_token_at else 0.0
+            )
+
+    async def _generate(self, messages: List[Dict[str, Any]]) -> str:
+        return "".join([delta async for delta in self.stream(messages, uuid.uuid4().hex)])
+
+    async def generate_batch(self, messages_list: List[List[Dict[str, Any]]], route_keys: Optional[Sequence[Optional[str]]] = None) -> List[Any]:
+        # The server batches concurrent requests itself
+        return await asyncio.gather(*(self._generate(messages) for messages in messages_list), return_exceptions=True)
+
+    async def shutdown(self):
+        await self.client.aclose()
+
+
+def _affinity_score(route_key: str, index: int) -> int:
+    digest = hashlib.blake2b(f"{route_key}\0{index}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ReplicaRouter:
+    """
+    Spreads requests over several engine replicas, presenting them as one engine.
+
+    `least_loaded` sends each request to the replica with the fewest requests in flight.
+    `session_affinity` sends every request of a session to the same replica (rendezvous
+    hashing on the session ID), so the session's prompt prefix stays in that replica's
+    KV cache; requests without a session fall back to least loaded. A replica that fails
+    is skipped for `cooldown_seconds`, and a request that failed before producing any
+    output is retried on another replica.
+    """
+
+    def __init__(self, replicas: List[Any], policy: str = "least_loaded", cooldown_seconds: float = 10.0):
+        if policy not in ("least_loaded", "session_affinity"):
+            raise ValueError(f"Unknown routing policy: {policy}")
+        self.replicas = replicas
+        self.policy = policy
+        self.cooldown_seconds = cooldown_seconds
+        self.inflight = [0] * len(replicas)
+        self.routed = [0] * len(replicas)
+        self.failures = [0] * len(replicas)
+        self._unavailable_until = [0.0] * len(replicas)
+        self._turn = 0
+
+    def _candidates(self, exclude: Sequence[int] = ()) -> List[int]:
+        now = time.monotonic()
+        healthy = [i for i in range(len(self.replicas)) if self._unavailable_until[i] <= now and i not in exclude]
+        # With every replica in cooldown, trying one beats failing outright
+        return healthy or [i for i in range(len(self.replicas)) if i not in exclude] or list(range(len(self.replicas)))
+
+    def pick(self, route_key: Optional[str] = None, exclude: Sequence[int] = ()) -> int:
+        candidates = self._candidates(exclude)
+        if self.policy == "session_affinity" and route_key:
+            return max(candidates, key=lambda i: _affinity_score(route_key, i))
+        fewest = min(self.inflight[i] for i in candidates)
+        tied = [i for i in candidates if self.inflight[i] == fewest]
+        self._turn += 1
+        return tied[self._turn % len(tied)]
+
+    def _mark_failed(self, index: int, error: Exception):
+        self.failures[index] += 1
+        self._unavailable_until[index] = time.monotonic() + self.cooldown_seconds
+        logger.warning(f"LLM replica {index} failed, skipping it for {self.cooldown_seconds:.0f}s: {error}")
+
+    async def encode(self, text: str) -> List[int]:
+        # Every replica serves the same model, so any tokenizer will do
+        tried: List[int] = []
+        while True:
+            index = self._candidates(tried)[0]
+            try:
+                return await self.replicas[index].encode(text)
+            except ReplicaUnavailableError as e:
+                self._mark_failed(index, e)
+                tried.append(index)
+                if len(tried) >= len(self.replicas):
+                    raise
+
+    async def stream(self, messages: List[Dict[str, Any]], request_id: str, route_key: Optional[str] = None) -> AsyncIterator[str]:
+        tried: List[int] = []
+        while True:
+            index = self.pick(route_key, exclude=tried)
+            self.inflight[index] += 1
+            self.routed[index] += 1
+            emitted = False
+            try:
+                async for delta in self.replicas[index].stream(messages, request_id):
+                    emitted = True
+                    yield delta
+                return
+            except ReplicaUnavailableError as e:
+                self._mark_failed(index, e)
+                tried.append(index)
+                if emitted or len(tried) >= len(self.replicas):
+                    raise
+            finally:
+                self.inflight[index] -= 1
+
+    async def _generate(self, messages: List[Dict[str, Any]], route_key: Optional[str]) -> str:
+        return "".join([delta async for delta in self.stream(messages, uuid.uuid4().hex, route_key)])
+
+    async def _dispatch_group(self, index: int, messages_list: List[List[Dict[str, Any]]]) -> List[Any]:
+        self.inflight[index] += len(messages_list)
+        self.routed[index] += len(messages_list)
+        try:
+            return await self.replicas[index].generate_batch(messages_list)
+        except Exception as e:
+            return [e] * len(messages_list)
+        finally:
+            self.inflight[index] -= len(messages_list)
+
+    async def generate_batch(self, messages_list: List[List[Dict[str, Any]]], route_keys: Optional[Sequence[Optional[str]]] = None) -> List[Any]:
+        """Splits a batch by replica; each replica receives its share as one batch."""
+        route_keys = route_keys or [None] * len(messages_list)
+        groups: Dict[int, List[int]] = {}
+        for position, route_key in enumerate(route_keys):
+            index = self.pick(route_key)
+            groups.setdefault(index, []).append(position)
+            # Count the assignment at once so least-loaded spreads the batch
+            self.inflight[index] += 1
+        for index, positions in groups.items():
+            self.inflight[index] -= len(positions)
+        indices = list(groups)
+        outcomes = await asyncio.gather(
+            *(self._dispatch_group(index, [messages_list[p] for p in groups[index]]) for index in indices)
+        )
+        results: List[Any] = [None] * len(messages_list)
+        retries = []
+        for index, outcome in zip(indices, outcomes):
+            for position, result in zip(groups[index], outcome):
+                results[position] = result
+                if isinstance(result, ReplicaUnavailableError):
+                    retries.append(position)
+            if any(isinstance(result, ReplicaUnavailableError) for result in outcome):
+                self._mark_failed(index, next(r for r in outcome if isinstance(r, ReplicaUnavailableError)))
+        if retries:
+            retried = await asyncio.gather(
+                *(self._generate(messages_list[p], route_keys[p]) for p in retries), return_exceptions=True
+            )
+            for position, result in zip(retries, retried):
+                results[position] = result
+        return results
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "replica": str(getattr(replica, "base_url", index)),
+                "inflight": self.inflight[index],
+                "routed": self.routed[index],
+                "failures": self.failures[index],
+                "available": self._unavailable_until[index] <= now,
+            }
+            for index, replica in enumerate(self.replicas)
+        ]
+
+    async def shutdown(self):
+        for replica in self.replicas:
+            result = replica.shutdown()
+            if asyncio.iscoroutine(result):
+                await result
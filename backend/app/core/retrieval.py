@@ -0,0 +1,149 @@
+import logging
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+# Use try-except for optional dependency
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None # type: ignore
+
+from .config import settings
+from . import executors
+from .model_registry import ModelUnavailableError, registry
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: hashes words and word bigrams into a fixed number of signed buckets.
+    Needs no model download and is deterministic across processes.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _embed_one(self, text: str, out: np.ndarray):
+        words = _WORD_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not features:
+            return
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        buckets = hashes % self.dim
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(out, buckets, signs)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._embed_one(text, vectors[i])
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a sentence-transformers model (optional dependency)."""
+
+    def __init__(self, model_name: str):
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=settings.EMBED_BATCH_SIZE, convert_to_numpy=True)
+        return _normalize(vectors.astype(np.float32, copy=False))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# --- Embedder Registration ---
+def _load_embedder():
+    if settings.EMBEDDER == "sentence-transformers":
+        if SentenceTransformer is None:
+            raise ModelUnavailableError("sentence-transformers is not installed.")
+        logger.info(f"Initializing sentence-transformers embedder: {settings.EMBEDDING_MODEL}")
+        return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+    logger.info(f"Initializing hashing embedder (dim={settings.EMBEDDING_DIM}).")
+    return HashingEmbedder(dim=settings.EMBEDDING_DIM)
+
+registry.register("embedder", _load_embedder, required=False)
+# --- ---
+
+
+def chunk_text(text: str, chunk_chars: int, overlap: int) -> List[str]:
+    """
+    Splits text into overlapping windows of about `chunk_chars` characters,
+    preferring to break at paragraph, line or sentence boundaries.
+    """
+    text = text.strip()
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            # Only accept a boundary in the second half of the window to keep chunks reasonably sized
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + chunk_chars // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class VectorIndex:
+    """Chunks of one document and their embeddings as a (num_chunks, dim) float32 matrix."""
+
+    def __init__(self, chunks: List[str], vectors: np.ndarray):
+        self.chunks = chunks
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + sum(len(chunk) for chunk in self.chunks)
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every chunk to the (normalized) query vector."""
+        return self.vectors @ query_vector
+
+
+def _embed_batched(embedder, texts: List[str]) -> np.ndarray:
+    batch_size = max(1, settings.EMBED_BATCH_SIZE)
+    parts = [embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    return np.vstack(parts) if parts else np.zeros((0, embedder.dim), dtype=np.float32)
+
+
+async def build_index(text: str) -> Optional[VectorIndex]:
+    """
+    Chunks and embeds a document. Returns None if retrieval is disabled or the document
+    is small enough to be sent whole (which keeps its prompt prefix cacheable).
+    """
+    if not settings.RETRIEVAL_ENABLED or len(text) < settings.RETRIEVAL_MIN_CHARS:
+        return None
+    embedder = await registry.get("embedder")
+    chunks = chunk_text(text, settings.RETRIEVAL_CHUNK_CHARS, settings.RETRIEVAL_CHUNK_OVERLAP)
+    vectors = await executors.cpu.run(_embed_batched, embedder, chunks)
+    logger.info(f"Built retrieval index with {len(chunks)} chunks ({vectors.nbytes / 1024:.0f} KiB)")
+    return VectorIndex(chunks, vectors)
+
+
+async def embed_query(question: str) -> np.ndarray:
+    """Embeds a question once, to score it against the chunks of any number of indexes."""
+    embedder = await registry.get("embedder")
+    return (await executors.cpu.run(embedder.embed, [question]))[0]
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# A batch dispatcher receives the queued payloads and returns one result (or exception) per payload
+BatchDispatcher = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class BatchScheduler:
+    """
+    Collects concurrent requests over a short window and submits them as one batch.
+
+    The first request to arrive opens a window of `max_wait_ms`; everything queued before
+    the window closes (up to `max_batch_size`) is dispatched together and each caller's
+    future receives its own result. Dispatching does not wait for the previous batch,
+    so the engine always sees the newest work as soon as the window closes.
+    """
+
+    def __init__(self, dispatcher: BatchDispatcher, max_batch_size: int = 16, max_wait_ms: float = 10.0, name: str = "batch"):
+        self._dispatcher = dispatcher
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight_batches: set = set()
+
+        # Statistics
+        self._batches_total = 0
+        self._requests_total = 0
+        self._last_batch_size = 0
+        self._max_batch_size_seen = 0
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            if self._worker is not None:
+                # The collector died: whatever it left queued would otherwise wait forever
+                error = None if self._worker.cancelled() else self._worker.exception()
+                logger.error(f"Batch scheduler worker stopped ({error!r}); restarting.")
+                self._fail_queued(RuntimeError("Batch scheduler stopped before dispatching the request."))
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(), name="batch-scheduler")
+            logger.info(f"Batch scheduler started (max_batch_size={self.max_batch_size}, "
+                        f"max_wait_ms={self.max_wait * 1000:.0f})")
+
+    async def submit(self, payload: Any) -> Any:
+        """Queues a payload and waits for its individual result."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Window closed, but still take anything that is already waiting
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                continue
+        return batch
+
+    async def _run(self):
+        while True:
+            collected = await self._collect_batch()
+            # Callers that gave up while waiting do not need a slot in the batch
+            collected = [item for item in collected if not item[1].done()]
+            if not collected:
+                continue
+            dispatched_at = time.perf_counter()
+            for _, _, queued_at in collected:
+                metrics.QUEUE_WAIT_SECONDS.observe(dispatched_at - queued_at, self.name)
+            batch = [(payload, future) for payload, future, _ in collected]
+
+            self._batches_total += 1
+            self._requests_total += len(batch)
+            self._last_batch_size = len(batch)
+            self._max_batch_size_seen = max(self._max_batch_size_seen, len(batch))
+            logger.debug(f"Dispatching batch of {len(batch)} (queue depth: {self._queue.qsize()})")
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight_batches.add(task)
+            task.add_done_callback(self._inflight_batches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self._dispatcher([payload for payload, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch dispatch failed: {e}", exc_info=True)
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth and batch size statistics."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "inflight_batches": len(self._inflight_batches),
+            "batches_total": self._batches_total,
+            "requests_total": self._requests_total,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size_seen": self._max_batch_size_seen,
+            "avg_batch_size": (self._requests_total / self._batches_total) if self._batches_total else 0.0,
+        }
+
+    def _fail_queued(self, error: Exception):
+        """Fails every request still waiting in the queue."""
+        if self._queue is None:
+            return
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                try:
+                    future.set_exception(error)
+                except RuntimeError:
+                    pass # Its event loop is already closed
+
+    async def shutdown(self):
+        """Stops the collector and fails any requests still waiting in the queue."""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._fail_queued(RuntimeError("Scheduler shut down."))
+        for task in list(self._inflight_batches):
+            task.cancel()
+        logger.info("Batch scheduler stopped.")
@@ -1,57 +1,176 @@
 import uuid
-import os
+import asyncio
 import logging
-from typing import Dict, Any, Optional # <<--- ADDED IMPORT
+from typing import Dict, Any, Optional, Callable, List # <<--- ADDED IMPORT
+
+# Use try-except for optional dependency
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None # type: ignore
 
 # Use absolute import from 'app' package root
+from app.core import metrics
 from app.core.config import settings
+from app.core.session_store import (
+    Evicted, InMemorySessionStore, RedisSessionStore, SessionStore
+)
 
 logger = logging.getLogger(__name__)
 
-# In-memory session storage (replace with DB/Redis for production)
-_session_data: Dict[str, Dict[str, Any]] = {}
+def _create_store() -> SessionStore:
+    if settings.SESSION_BACKEND == "redis":
+        if aioredis is None:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package.")
+        logger.info(f"Using Redis session store at {settings.REDIS_URL}")
+        # The asyncio client connects lazily, on the first command
+        return RedisSessionStore(aioredis.Redis.from_url(settings.REDIS_URL), ttl_seconds=settings.SESSION_TTL_SECONDS)
+    return InMemorySessionStore(
+        ttl_seconds=settings.SESSION_TTL_SECONDS,
+        max_sessions=settings.SESSION_MAX_COUNT,
+        max_bytes=settings.SESSION_MAX_MB * 1024 * 1024
+    )
+
+# Session storage: in-process with TTL/LRU limits, or Redis for multi-worker deployments
+_store: SessionStore = _create_store()
+
+# Callbacks invoked with the session ID when a session is cleared (e.g. to drop derived caches)
+_cleanup_hooks: List[Callable[[str], None]] = []
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+def register_cleanup_hook(hook: Callable[[str], None]):
+    """Registers a callback that runs whenever a session is cleared."""
+    _cleanup_hooks.append(hook)
 
-def create_session(mode: str, context_data: Dict[str, Any]) -> str:
+def set_store(store: SessionStore):
+    """Replaces the session store (e.g. with a Redis store on a fake client in tests)."""
+    global _store
+    _store = store
+
+def _cleanup_session_data(session_id: str):
+    """Runs the cleanup hooks; uploaded files belong to the content store, which releases them."""
+    for hook in _cleanup_hooks:
+        try:
+            hook(session_id)
+        except Exception as e:
+            logger.error(f"Session cleanup hook failed for {session_id}: {e}", exc_info=True)
+
+def _cleanup_evicted(evicted: Evicted, reason: str):
+    for session_id, _ in evicted:
+        logger.info(f"Session {session_id} evicted ({reason}).")
+        _cleanup_session_data(session_id)
+
+async def create_session(mode: str, context_data: Dict[str, Any]) -> str:
     """Creates a new session and returns the session ID."""
     session_id = uuid.uuid4().hex
-    _session_data[session_id] = {
+    evicted = await _store.set(session_id, {
         "mode": mode,
         **context_data
-    }
+    })
     logger.info(f"Created session {session_id} for mode {mode}")
+    _cleanup_evicted(evicted, "capacity")
     return session_id
 
-def get_session(session_id: str) -> Optional[Dict[str, Any]]: # Used Optional here
-    """Retrieves session data."""
-    return _session_data.get(session_id)
+async def get_session(session_id: str) -> Optional[Dict[str, Any]]: # Used Optional here
+    """Retrieves session data (and refreshes its TTL)."""
+    return await _store.get(session_id)
 
-def clear_session(session_id: str) -> bool:
-    """Clears a session and cleans up associated files."""
-    if session_id in _session_data:
-        data = _session_data.pop(session_id)
-        logger.info(f"Session {session_id} data cleared.")
+async def update_session(session_id: str, changes: Dict[str, Any]) -> bool:
+    """Merges changes into a session. Returns False if the session does not exist."""
+    data = await _store.get(session_id)
+    if data is None:
+        return False
+    data.update(changes)
+    _cleanup_evicted(await _store.set(session_id, data), "capacity")
+    return True
 
-        # Clean up uploaded files associated with the session
-        # Ensure 'mode' exists before accessing
-        if data.get("mode") == "image":
-            file_path = data.get("file_path")
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.info(f"Removed uploaded image file: {file_path}")
-                except OSError as e:
-                    logger.error(f"Error removing file {file_path}: {e}")
-        # Add cleanup for other file types if needed (e.g., temp audio, temp pdf)
+def documents_mode(documents: List[Dict[str, Any]]) -> str:
+    """Session mode for a set of documents: their kind if they all share one, 'mixed' or 'chat' otherwise."""
+    kinds = {document["kind"] for document in documents}
+    if not kinds:
+        return "chat"
+    return kinds.pop() if len(kinds) == 1 else "mixed"
 
+async def add_document(session_id: str, document: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Appends a document to a session. Earlier documents are kept as they are, so nothing
+    is extracted again. Returns the session's documents, or None if it does not exist.
+    """
+    data = await _store.get(session_id)
+    if data is None:
+        return None
+    documents = [*data.get("documents", []), document]
+    data.update(documents=documents, mode=documents_mode(documents))
+    _cleanup_evicted(await _store.set(session_id, data), "capacity")
+    logger.info(f"Attached {document['kind']} {document['document_id']} to session {session_id} ({len(documents)} documents)")
+    return documents
+
+async def remove_document(session_id: str, document_id: str) -> Optional[Dict[str, Any]]:
+    """Removes a document from a session. Returns the removed document, or None if there was none."""
+    data = await _store.get(session_id)
+    if data is None:
+        return None
+    documents = data.get("documents", [])
+    removed = next((document for document in documents if document["document_id"] == document_id), None)
+    if removed is None:
+        return None
+    documents = [document for document in documents if document is not removed]
+    data.update(documents=documents, mode=documents_mode(documents))
+    _cleanup_evicted(await _store.set(session_id, data), "capacity")
+    logger.info(f"Detached {removed['kind']} {document_id} from session {session_id} ({len(documents)} documents left)")
+    return removed
+
+async def clear_session(session_id: str) -> bool:
+    """Clears a session and releases what it holds (content references, caches)."""
+    data = await _store.delete(session_id)
+    if data is not None:
+        logger.info(f"Session {session_id} data cleared.")
+        _cleanup_session_data(session_id)
         return True
     else:
         logger.warning(f"Attempted to clear non-existent session: {session_id}")
         return False
 
-def cleanup_all_sessions():
-    """Clears all active sessions and their files (e.g., on shutdown)."""
-    logger.info("Cleaning up all active sessions...")
-    session_ids = list(_session_data.keys()) # Avoid modifying dict while iterating
-    for session_id in session_ids:
-        clear_session(session_id) # Reuse the single session cleanup logic
-    logger.info("Session cleanup complete.")
\ No newline at end of file
+async def sweep_expired_sessions() -> int:
+    """Removes sessions whose TTL has passed and cleans up their files. Returns the count."""
+    evicted = await _store.sweep()
+    _cleanup_evicted(evicted, "expired")
+    return len(evicted)
+
+async def _sweep_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_expired_sessions()
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}", exc_info=True)
+
+def start_sweeper():
+    """Starts the background task that expires idle sessions."""
+    global _sweeper_task
+    if _sweeper_task is None and settings.SESSION_SWEEP_INTERVAL_SECONDS > 0:
+        _sweeper_task = asyncio.create_task(_sweep_periodically(settings.SESSION_SWEEP_INTERVAL_SECONDS))
+
+def stop_sweeper():
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        _sweeper_task = None
+
+def session_stats() -> Dict[str, Any]:
+    return _store.stats()
+
+metrics.register_gauge("active_sessions", "Sessions currently stored.", lambda: {(): session_stats()["sessions"]})
+
+async def cleanup_all_sessions():
+    """Clears all active sessions and their files (e.g., on shutdown) and closes the store."""
+    if _store.shared:
+        logger.info("Session store is shared with other workers; leaving sessions in place.")
+    else:
+        logger.info("Cleaning up all active sessions...")
+        session_ids = await _store.session_ids() # Avoid modifying the store while iterating
+        for session_id in session_ids:
+            await clear_session(session_id) # Reuse the single session cleanup logic
+        logger.info("Session cleanup complete.")
+    await _store.close()
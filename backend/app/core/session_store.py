@@ -0,0 +1,217 @@
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SessionData = Dict[str, Any]
+# Stores return the sessions they dropped so the caller can clean up their files
+Evicted = List[Tuple[str, SessionData]]
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Rough memory footprint of session data (strings, lists, NumPy-backed objects)."""
+    if _depth > 4:
+        return sys.getsizeof(value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(estimate_size(v, _depth + 1) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v, _depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+class SessionStore:
+    """Interface for session storage backends (async, so network stores never block the event loop)."""
+
+    # Shared stores outlive a single worker, so its shutdown must not clear them
+    shared = False
+
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        raise NotImplementedError
+
+    async def set(self, session_id: str, data: SessionData) -> Evicted:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> Optional[SessionData]:
+        raise NotImplementedError
+
+    async def session_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    async def sweep(self) -> Evicted:
+        """Removes expired sessions and returns them."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Cheap, non-blocking counters (read by the metrics gauges)."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store with a sliding TTL and an LRU cap on session count and estimated memory.
+    """
+
+    def __init__(self, ttl_seconds: float, max_sessions: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # session_id -> (data, size, last_access); ordered from least to most recently used
+        self._sessions: "OrderedDict[str, Tuple[SessionData, int, float]]" = OrderedDict()
+        self._bytes = 0
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - last_access > self.ttl_seconds
+
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        item = self._sessions.get(session_id)
+        if item is None:
+            return None
+        data, size, last_access = item
+        now = time.monotonic()
+        if self._expired(last_access, now):
+            return None # Left for the sweeper, which also cleans up files
+        self._sessions[session_id] = (data, size, now)
+        self._sessions.move_to_end(session_id)
+        return data
+
+    async def set(self, session_id: str, data: SessionData) -> Evicted:
+        previous = self._sessions.pop(session_id, None)
+        if previous:
+            self._bytes -= previous[1]
+        size = estimate_size(data)
+        self._sessions[session_id] = (data, size, time.monotonic())
+        self._bytes += size
+
+        evicted = []
+        # Evict least recently used sessions, but never the one just written
+        while len(self._sessions) > 1 and (
+            (self.max_sessions > 0 and len(self._sessions) > self.max_sessions)
+            or (self.max_bytes > 0 and self._bytes > self.max_bytes)
+        ):
+            oldest_id = next(iter(self._sessions))
+            evicted.append((oldest_id, self._remove(oldest_id)))
+        return evicted
+
+    async def delete(self, session_id: str) -> Optional[SessionData]:
+        return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> Optional[SessionData]:
+        item = self._sessions.pop(session_id, None)
+        if item is None:
+            return None
+        self._bytes -= item[1]
+        return item[0]
+
+    async def session_ids(self) -> List[str]:
+        return list(self._sessions)
+
+    async def sweep(self) -> Evicted:
+        now = time.monotonic()
+        expired = [sid for sid, (_, _, last_access) in self._sessions.items() if self._expired(last_access, now)]
+        return [(sid, self._remove(sid)) for sid in expired]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "bytes": self._bytes}
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Out-of-process store for multi-worker deployments, on an asyncio Redis client
+    (`redis.asyncio`, or anything with its `get`, `set(ex=)`, `smembers` and `pipeline`).
+
+    Values are stored as JSON (sessions hold document metadata only; the processed content
+    lives in the content store) and expire through Redis TTLs (refreshed on access). Every
+    operation is a single round trip, pipelined where it touches several keys. Derived state
+    (processed documents, conversation history, token counts) stays in the worker that built
+    it, so route each session to one worker (sticky sessions). Every worker remembers the
+    sessions it has touched; its `sweep` reports those whose key is gone, whichever worker
+    deleted them or Redis expired them, so it can release its own references.
+    """
+
+    shared = True
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "session:"):
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds) if ttl_seconds > 0 else None
+        self.prefix = prefix
+        self._index_key = f"{prefix}index"
+        # Sessions this worker may hold in-process state for
+        self._local: Set[str] = set()
+        self._count = 0 # Sessions in the index as of the last sweep
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    async def get(self, session_id: str) -> Optional[SessionData]:
+        if self.ttl_seconds:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(self._key(session_id))
+            pipe.expire(self._key(session_id), self.ttl_seconds)
+            raw, _ = await pipe.execute()
+        else:
+            raw = await self.client.get(self._key(session_id))
+        if raw is None:
+            return None
+        self._local.add(session_id)
+        return json.loads(raw)
+
+    async def set(self, session_id: str, data: SessionData) -> Evicted:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self._key(session_id), json.dumps(data), ex=self.ttl_seconds)
+        pipe.sadd(self._index_key, session_id)
+        await pipe.execute()
+        self._local.add(session_id)
+        return []
+
+    async def delete(self, session_id: str) -> Optional[SessionData]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self._key(session_id))
+        pipe.delete(self._key(session_id))
+        pipe.srem(self._index_key, session_id)
+        raw, _, _ = await pipe.execute()
+        self._local.discard(session_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def session_ids(self) -> List[str]:
+        return [_as_str(sid) for sid in await self.client.smembers(self._index_key)]
+
+    async def sweep(self) -> Evicted:
+        indexed = await self.session_ids()
+        local = list(self._local)
+        # One pipelined round trip checks every indexed and locally held session
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in indexed + local:
+            pipe.exists(self._key(session_id))
+        alive = await pipe.execute()
+        gone = [session_id for session_id, exists in zip(indexed, alive) if not exists]
+        if gone:
+            await self.client.srem(self._index_key, *gone)
+        self._count = len(indexed) - len(gone)
+        # Deleted or expired sessions this worker still holds state for, wherever they were removed
+        evicted = []
+        for session_id, exists in zip(local, alive[len(indexed):]):
+            if not exists:
+                self._local.discard(session_id)
+                evicted.append((session_id, {}))
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": self._count}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _as_str(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
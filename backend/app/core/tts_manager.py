@@ -1,4 +1,7 @@
+import os
+import time
 import uuid
+import asyncio
 import logging
 from typing import Dict, Optional, Any, Literal # <<--- ADDED IMPORTS
 
@@ -6,13 +9,20 @@ logger = logging.getLogger(__name__)
 
 # In-memory store for TTS tasks
 _tts_tasks: Dict[str, Dict[str, Any]] = {} # More specific type hint
+# Completion events, so clients can be notified instead of polling
+_tts_events: Dict[str, asyncio.Event] = {}
 
 TTS_Task_Status = Literal["processing", "done", "failed"]
 
 def create_tts_task() -> str:
     """Creates a placeholder for a new TTS task and returns the task ID."""
     task_id = uuid.uuid4().hex
-    _tts_tasks[task_id] = {"status": "processing", "audio_url": None, "error": None}
+    now = time.time()
+    _tts_tasks[task_id] = {
+        "status": "processing", "audio_url": None, "error": None,
+        "created_at": now, "updated_at": now, "audio_path": None
+    }
+    _tts_events[task_id] = asyncio.Event()
     logger.info(f"Created TTS task {task_id}")
     return task_id
 
@@ -20,14 +30,19 @@ def update_tts_task_status(
     task_id: str,
     status: TTS_Task_Status, # Use Literal type hint
     audio_url: Optional[str] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    audio_path: Optional[str] = None
 ):
-    """Updates the status and result of a TTS task."""
+    """Updates the status and result of a TTS task and wakes up anyone waiting for it."""
     if task_id in _tts_tasks:
         _tts_tasks[task_id]["status"] = status
         _tts_tasks[task_id]["audio_url"] = audio_url
         _tts_tasks[task_id]["error"] = error
+        _tts_tasks[task_id]["audio_path"] = audio_path
+        _tts_tasks[task_id]["updated_at"] = time.time()
         logger.info(f"Updated TTS task {task_id} status to {status}")
+        if status != "processing" and task_id in _tts_events:
+            _tts_events[task_id].set()
     else:
         logger.warning(f"Attempted to update non-existent TTS task: {task_id}")
 
@@ -35,16 +50,50 @@ def get_tts_task(task_id: str) -> Optional[Dict[str, Any]]: # Use Optional and s
     """Retrieves the status and result of a TTS task."""
     return _tts_tasks.get(task_id)
 
+async def wait_for_tts_task(task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Waits until the task is done or failed (or the timeout passes) and returns its data.
+    Returns None if the task does not exist.
+    """
+    event = _tts_events.get(task_id)
+    if event is None:
+        return _tts_tasks.get(task_id)
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    return _tts_tasks.get(task_id)
+
+def pending_tts_task_count() -> int:
+    return sum(1 for task in _tts_tasks.values() if task["status"] == "processing")
+
+def _remove_tts_task(task_id: str):
+    task = _tts_tasks.pop(task_id, None)
+    event = _tts_events.pop(task_id, None)
+    if event:
+        event.set() # Release anyone still waiting
+    audio_path = task.get("audio_path") if task else None
+    if audio_path and os.path.exists(audio_path):
+        try:
+            os.remove(audio_path)
+        except OSError as e:
+            logger.error(f"Error removing TTS audio {audio_path}: {e}")
+
+def expire_tts_tasks(max_age_seconds: float) -> int:
+    """Removes finished tasks (and their audio files) older than max_age_seconds. Returns the count."""
+    cutoff = time.time() - max_age_seconds
+    tasks_to_remove = [
+        tid for tid, task in _tts_tasks.items()
+        if task["status"] != "processing" and task["updated_at"] < cutoff
+    ]
+    for tid in tasks_to_remove:
+        _remove_tts_task(tid)
+        logger.info(f"Cleaned up old TTS task {tid}")
+    return len(tasks_to_remove)
+
 def cleanup_tts_tasks():
-    """Optional: Clean up old/stuck tasks if needed."""
-    # Example: Remove tasks older than 1 hour
-    # import time
-    # cutoff = time.time() - 3600
-    # tasks_to_remove = [tid for tid, task in _tts_tasks.items() if task.get('timestamp', 0) < cutoff]
-    # for tid in tasks_to_remove:
-    #     _tts_tasks.pop(tid, None)
-    #     logger.info(f"Cleaned up old TTS task {tid}")
-    # Clear all on shutdown for this example
+    """Clears all TTS tasks (e.g. on shutdown)."""
     logger.info("Cleaning up TTS tasks...")
-    _tts_tasks.clear()
-    logger.info("TTS task cleanup complete.")
\ No newline at end of file
+    for tid in list(_tts_tasks):
+        _remove_tts_task(tid)
+    logger.info("TTS task cleanup complete.")
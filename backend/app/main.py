@@ -1,14 +1,22 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pathlib import Path
 
 # Correct relative imports from 'main.py' level (already correct)
 from .api.router import api_router
+from .api.endpoints import metrics as metrics_endpoint
 from .core.config import settings
-from .core import llm, session_manager, tts_manager
+from .core import executors, llm, metrics, session_manager, tts_manager
+from .core.answer_cache import answer_cache
+from .core.audio_cache import audio_cache
+from .core.content_store import content_store
+from .core.model_registry import registry
+from .services import tts_service, tts_stream
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -18,19 +26,40 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Application startup...")
-    # Models should be loaded in their respective modules now
     logger.info(f"Model Name: {settings.MODEL_NAME}")
     logger.info(f"TTS Model: {settings.TTS_MODEL}")
     logger.info(f"Host: {settings.HOST_IP}:{settings.PORT}")
     # Ensure static directories exist (config does this now)
     logger.info(f"Upload dir: {settings.upload_path}")
     logger.info(f"Audio dir: {settings.audio_path}")
+    # Models are loaded by the registry; eager loading runs in the background so the
+    # liveness probe answers immediately and readiness flips once loading is done.
+    load_task = None
+    if settings.MODEL_LOADING == "eager":
+        logger.info("Loading models eagerly in the background...")
+        load_task = asyncio.create_task(registry.load_all(warmup=settings.MODEL_WARMUP))
+    else:
+        logger.info("Lazy model loading enabled; models load on first use.")
+    if settings.TTS_CACHE_ENABLED:
+        audio_cache.load_existing() # Cached audio survives restarts
+    session_manager.start_sweeper()
+    tts_service.job_queue.start()
     logger.info("Application startup complete.")
     yield
     # Shutdown
     logger.info("Application shutdown...")
-    session_manager.cleanup_all_sessions()
+    if load_task and not load_task.done():
+        load_task.cancel()
+    await llm.batch_scheduler.shutdown()
+    session_manager.stop_sweeper()
+    tts_stream.cleanup_streams()
+    await tts_service.job_queue.shutdown()
+    await session_manager.cleanup_all_sessions()
+    content_store.clear()
+    answer_cache.clear()
     tts_manager.cleanup_tts_tasks()
+    await registry.unload_all()
+    executors.shutdown_all()
     llm.cleanup_llm()
     logger.info("Application shutdown complete.")
 
@@ -50,10 +79,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+# Per-stage timings of each request are returned in a Server-Timing header
+app.add_middleware(metrics.ServerTimingMiddleware)
+
+# A saturated workload answers at once instead of queueing without bound
+@app.exception_handler(executors.OverloadedError)
+async def overloaded_handler(request: Request, exc: executors.OverloadedError):
+    logger.warning(f"Rejected {request.method} {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # API Router
 app.include_router(api_router, prefix="/api/v1") # Using prefix
+# Prometheus scrapes /metrics at the root by convention
+app.include_router(metrics_endpoint.router)
 
 # Static Files
 # Define the path relative to this main.py file's location (inside 'app')
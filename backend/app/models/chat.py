@@ -1,10 +1,34 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 class UploadResponse(BaseModel):
     session_id: str
+    document_id: str # For detaching the document later
     filename: str
     mode: str # 'pdf' or 'image'
+    page_count: Optional[int] = None # PDFs only
+    extraction_ms: Optional[float] = None # PDFs only
+    cached: bool = False # True if identical content was already processed
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+class DocumentInfo(BaseModel):
+    document_id: str
+    filename: str
+    kind: str # 'pdf' or 'image'
+    page_count: Optional[int] = None # PDFs only
+
+class DocumentListResponse(BaseModel):
+    """The documents attached to a session, in the order they were attached."""
+    session_id: str
+    mode: str # 'pdf', 'image', 'mixed' or 'chat' (no documents)
+    documents: List[DocumentInfo]
+
+class AttachResponse(DocumentListResponse):
+    document_id: str
+    extraction_ms: Optional[float] = None # PDFs only
+    cached: bool = False # True if identical content was already processed or attached
 
 class AskRequest(BaseModel):
     # This model is no longer used directly for form input via Depends,
@@ -13,13 +37,42 @@ class AskRequest(BaseModel):
     session_id: Optional[str] = Field(None, description="Optional session ID for context.")
     tts: bool = Field(False, description="Whether to synthesize the answer to speech.")
 
+class AskBatchRequest(BaseModel):
+    """Many independent questions about one session's document or image."""
+    questions: List[str] = Field(..., min_length=1, description="Questions to answer; each is answered on its own.")
+    session_id: Optional[str] = Field(None, description="Optional session ID for context.")
+    no_cache: bool = Field(False, description="Always generate fresh answers (bypass the answer cache).")
+
 class AskResponse(BaseModel):
     answer: str
     tts_task_id: Optional[str] = None
+    tts_error: Optional[str] = None # Set when TTS was requested but could not be queued
+    context_dropped_tokens: int = 0 # Document tokens left out to fit the model's context
+    context_dropped: List[str] = [] # What was left out, e.g. "report.pdf: pages 41-60 of 60"
 
 class ForgetRequest(BaseModel):
      # This model is no longer used directly for form input via Depends
     session_id: str = Field(..., description="The session ID to clear.")
 
 class ForgetResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class SchedulerStatsResponse(BaseModel):
+    queue_depth: int
+    inflight_batches: int
+    batches_total: int
+    requests_total: int
+    last_batch_size: int
+    max_batch_size_seen: int
+    avg_batch_size: float
+
+class AnswerCacheStatsResponse(BaseModel):
+    """Answer cache size and hit rate."""
+    enabled: bool
+    entries: int
+    max_entries: int
+    hits: int
+    semantic_hits: int
+    misses: int
+    bypassed: int
+    hit_rate: float
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Dict, Optional, Literal
+
+Model_State = Literal["unloaded", "loading", "ready", "failed"]
+
+class LivenessResponse(BaseModel):
+    status: Literal["alive"]
+
+class ModelStatus(BaseModel):
+    state: Model_State
+    required: bool
+    warmed_up: bool
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+class ReadinessResponse(BaseModel):
+    status: Literal["ready", "not_ready"]
+    models: Dict[str, ModelStatus]
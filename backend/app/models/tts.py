@@ -10,3 +10,31 @@ class TTSStatusResponse(BaseModel):
     status: TTS_Task_Status
     audio_url: Optional[str] = None
     error: Optional[str] = None
+
+class TTSQueueStatsResponse(BaseModel):
+    """TTS worker pool and queue statistics."""
+    workers: int
+    busy_workers: int
+    queue_depth: int
+    max_pending: int
+    completed: int
+    rejected: int
+
+class TTSEngineStatsResponse(BaseModel):
+    """TTS model replica statistics."""
+    loaded: bool
+    replicas: int = 0
+    in_process: bool = True
+    threads_per_replica: int = 0
+    busy_replicas: int = 0
+    queued_texts: int = 0
+    texts_total: int = 0
+
+class TTSCacheStatsResponse(BaseModel):
+    """Synthesized-audio cache statistics."""
+    enabled: bool
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
@@ -1,41 +1,338 @@
-import logging
 import asyncio
+import contextvars
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 # Corrected: Use absolute imports from the 'app' package root
-from app.core import llm, session_manager
+from app.core import executors, llm, metrics, prompt_builder, session_manager
+from app.core.answer_cache import answer_cache
+from app.core.config import settings
+from app.core.content_store import content_store
+from app.core.conversation import MESSAGE_OVERHEAD_TOKENS, conversations
+from app.core.model_registry import ModelUnavailableError
+from app.services import tts_service, tts_stream
 
 logger = logging.getLogger(__name__)
 
-async def get_answer(question: str, session_id: str = None) -> str:
+async def _load_session(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not session_id:
+        return None
+    session_data = await session_manager.get_session(session_id)
+    if session_data is None:
+        logger.warning(f"Session ID {session_id} provided but not found.")
+    return session_data
+
+# How the current request's document context was fitted, for the endpoint to report
+_context_selection: contextvars.ContextVar[Optional[prompt_builder.ContextSelection]] = contextvars.ContextVar(
+    "context_selection", default=None
+)
+
+def context_selection() -> Optional[prompt_builder.ContextSelection]:
+    """The context fitting of the last prompt built for the current request, if it had documents."""
+    return _context_selection.get()
+
+async def _resolve_context(
+    question: str, session_id: Optional[str], session_data: Optional[Dict[str, Any]]
+) -> Tuple[Optional[prompt_builder.ContextSelection], List[str], int]:
+    """
+    Returns (text selection, image_urls, image_tokens) for the session's documents, or
+    empty context if there are none. Everything is fitted into what the model's context
+    leaves after the system prompt, the question and the answer (at most CONTEXT_MAX_TOKENS):
+    images first, in the order they were attached, then the text of the session's PDFs.
+    """
+    documents = session_data.get("documents", []) if session_data else []
+    if not documents:
+        return None, [], 0
+    logger.info(f"Using context from session {session_id} ({len(documents)} documents, mode: {session_data.get('mode')})")
+    documents, missing = content_store.resolve(documents)
+    for document in missing:
+        logger.warning(f"Content of {document['filename']} ({document['content_hash'][:12]}) is not loaded in this worker")
+
+    available = (
+        settings.MAX_MODEL_LEN - settings.MAX_TOKENS
+        - await prompt_builder.system_prompt_tokens()
+        - (await prompt_builder.count_tokens([question]))[0]
+        - 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    image_urls = []
+    image_tokens = 0
+    dropped_images = []
+    for document in documents:
+        if document["kind"] != "image":
+            continue
+        tokens = prompt_builder.estimate_image_tokens(*document["image_size"]) if document.get("image_size") else 0
+        if image_tokens + tokens > available:
+            dropped_images.append((document, tokens))
+            continue
+        image_urls.append(document["image_url"])
+        image_tokens += tokens
+
+    budget = max(0, min(settings.CONTEXT_MAX_TOKENS, available - image_tokens))
+    selection = await prompt_builder.select_document_context(session_id, documents, question, budget)
+    for document, tokens in dropped_images:
+        selection.drop(f"{document['filename']}: image", tokens)
+    for document in missing:
+        selection.drop(f"{document['filename']}: not available", 0)
+    if selection.dropped_tokens:
+        metrics.CONTEXT_DROPPED_TOKENS.inc(selection.dropped_tokens)
+    return selection, image_urls, image_tokens
+
+async def _fit_history(session_id: str, question: str, fixed_tokens: int) -> List[Dict[str, Any]]:
+    """Returns as much of the session's conversation as fits next to the rest of the prompt."""
+    used = (
+        fixed_tokens
+        + await prompt_builder.system_prompt_tokens()
+        + (await prompt_builder.count_tokens([question]))[0]
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    # The answer must fit into the model's context as well
+    budget = settings.MAX_MODEL_LEN - settings.MAX_TOKENS - used
+    history, _ = conversations.fit(session_id, budget)
+    return history
+
+async def _build_messages(
+    question: str, session_id: Optional[str], session_data: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Builds the prompt with the session's document context in front of the conversation
+    so far and the question.
+    """
+    with metrics.stage("context"):
+        selection, image_urls, image_tokens = await _resolve_context(question, session_id, session_data)
+        context_block = ""
+        fixed_tokens = image_tokens
+        _context_selection.set(selection)
+        if selection is not None and selection.text:
+            # The selection was counted while fitting it, markers included; no need to tokenize it again
+            context_block = prompt_builder.format_context_block(selection.text)
+            fixed_tokens += selection.num_tokens
+    history = None
+    if session_data and settings.HISTORY_ENABLED and conversations.has_history(session_id):
+        with metrics.stage("history"):
+            history = await _fit_history(session_id, question, fixed_tokens)
+    return prompt_builder.build_messages(question, context_block, image_urls, history)
+
+def _context_key(session_id: Optional[str], session_data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Fingerprint of everything in the prompt besides the question (the attached documents,
+    in order), or None if the answer also depends on this session's conversation and is
+    not cacheable.
+    """
+    if not session_data:
+        return ""
+    if settings.HISTORY_ENABLED and conversations.has_history(session_id):
+        return None
+    return "+".join(document["content_hash"] for document in session_data.get("documents", []))
+
+async def _record_turn(session_id: Optional[str], session_data: Optional[Dict[str, Any]], question: str, answer: str):
+    """Appends a completed exchange to the session's history."""
+    if not session_data or not settings.HISTORY_ENABLED:
+        return
+    try:
+        await conversations.append(session_id, question, answer)
+    except Exception as e:
+        logger.error(f"Failed to record conversation turn for session {session_id}: {e}", exc_info=True)
+
+def _cacheable(context_key: Optional[str]) -> bool:
+    return settings.ANSWER_CACHE_ENABLED and context_key is not None
+
+async def _cached_answer(question: str, context_key: Optional[str], use_cache: bool) -> Optional[str]:
+    if not _cacheable(context_key):
+        return None
+    if not use_cache:
+        answer_cache.record_bypass()
+        return None
+    with metrics.stage("answer_cache"):
+        answer = await answer_cache.lookup(question, context_key)
+    if answer is not None:
+        logger.info("Answer cache hit.")
+    return answer
+
+async def get_answer(question: str, session_id: str = None, use_cache: bool = True) -> str:
     """
     Gets an answer, potentially using context from the session.
-    Runs the LLM generation in an executor to avoid blocking the event loop.
-    """
-    text_context = ""
-    image_url = None
-
-    if session_id:
-        session_data = session_manager.get_session(session_id)
-        if session_data:
-            logger.info(f"Using context from session {session_id} (mode: {session_data.get('mode')})")
-            if session_data["mode"] == "pdf":
-                text_context = session_data.get("text_context", "")
-            elif session_data["mode"] == "image":
-                image_url = session_data.get("image_url", "")
-        else:
-            logger.warning(f"Session ID {session_id} provided but not found.")
-
-    # Run the potentially blocking LLM call in a separate thread
+    The async engine runs generation in the background, so nothing blocks the event loop.
+    Repeated questions about the same context are answered from the answer cache
+    unless `use_cache` is False.
+
+    Raises:
+        OverloadedError: If the LLM (or retrieval) is at capacity.
+    """
     try:
-        loop = asyncio.get_event_loop()
-        answer = await loop.run_in_executor(
-            None, # Use default executor
-            llm.generate_answer, # Call function from core.llm
-            question,
-            text_context,
-            image_url
-        )
+        session_data = await _load_session(session_id)
+        context_key = _context_key(session_id, session_data)
+        answer = await _cached_answer(question, context_key, use_cache)
+        if answer is None:
+            messages = await _build_messages(question, session_id, session_data)
+            async with executors.llm.slot():
+                with metrics.stage("generate"):
+                    answer = await llm.generate_answer(messages, route_key=session_id)
+            if answer.startswith("Error:"):
+                return answer
+            if _cacheable(context_key):
+                await answer_cache.store(question, context_key, answer)
+        await _record_turn(session_id, session_data, question, answer)
         return answer
+    except executors.OverloadedError:
+        raise
+    except ModelUnavailableError as e:
+        logger.error(f"LLM not available. Cannot generate answer: {e}")
+        return "Error: The AI model is not available."
     except Exception as e:
         logger.error(f"Error getting answer from LLM service: {e}", exc_info=True)
-        return "Sorry, an error occurred while processing your request."
\ No newline at end of file
+        return "Sorry, an error occurred while processing your request."
+
+async def stream_answer(question: str, session_id: str = None, use_cache: bool = True) -> AsyncIterator[str]:
+    """Streams the answer as text deltas, using context from the session if provided."""
+    session_data = await _load_session(session_id)
+    context_key = _context_key(session_id, session_data)
+    answer = await _cached_answer(question, context_key, use_cache)
+    if answer is not None:
+        yield answer
+    else:
+        messages = await _build_messages(question, session_id, session_data)
+        parts = []
+        async with executors.llm.slot():
+            async for delta in llm.stream_answer(messages, route_key=session_id):
+                parts.append(delta)
+                yield delta
+        answer = "".join(parts)
+        if _cacheable(context_key):
+            await answer_cache.store(question, context_key, answer)
+    await _record_turn(session_id, session_data, question, answer)
+
+class BatchItemResult:
+    """Outcome of one question of a batch: an answer or an error."""
+
+    def __init__(self, index: int, question: str, answer: Optional[str] = None, cached: bool = False,
+                 error: Optional[str] = None, retry_after: Optional[int] = None):
+        self.index = index
+        self.question = question
+        self.answer = answer
+        self.cached = cached
+        self.error = error
+        self.retry_after = retry_after
+
+async def answer_batch(questions: List[str], session_id: str = None, use_cache: bool = True) -> AsyncIterator[BatchItemResult]:
+    """
+    Answers independent questions about one session, yielding each result as it finishes.
+
+    The first question that needs the model is submitted alone until its first token,
+    which means its prompt prefix (system prompt + document context) has been prefilled
+    and cached; the rest then run concurrently (up to ASK_BATCH_CONCURRENCY) and only
+    prefill their question. Batch questions are answered against the session's history
+    as it was, and are not added to it.
+    """
+    session_data = await _load_session(session_id)
+    context_key = _context_key(session_id, session_data)
+    concurrency = asyncio.Semaphore(max(1, settings.ASK_BATCH_CONCURRENCY))
+    prefix_ready = asyncio.Event()
+    leader_claimed = False
+
+    async def generate(messages: List[Dict[str, Any]]) -> str:
+        nonlocal leader_claimed
+        if leader_claimed:
+            await prefix_ready.wait()
+        leader_claimed = True
+        parts = []
+        try:
+            async for delta in llm.stream_answer(messages, route_key=session_id):
+                prefix_ready.set()
+                parts.append(delta)
+        finally:
+            prefix_ready.set()
+        return "".join(parts)
+
+    async def answer_one(index: int, question: str) -> BatchItemResult:
+        try:
+            answer = await _cached_answer(question, context_key, use_cache)
+            if answer is not None:
+                return BatchItemResult(index, question, answer, cached=True)
+            async with concurrency:
+                messages = await _build_messages(question, session_id, session_data)
+                async with executors.llm.slot():
+                    with metrics.stage("generate"):
+                        answer = await generate(messages)
+            if _cacheable(context_key):
+                await answer_cache.store(question, context_key, answer)
+            return BatchItemResult(index, question, answer)
+        except executors.OverloadedError as e:
+            return BatchItemResult(index, question, error=str(e), retry_after=e.retry_after)
+        except ModelUnavailableError as e:
+            logger.error(f"LLM not available. Cannot answer batch question {index}: {e}")
+            return BatchItemResult(index, question, error="The AI model is not available.")
+        except Exception as e:
+            logger.error(f"Error answering batch question {index}: {e}", exc_info=True)
+            return BatchItemResult(index, question, error="Failed to get answer from AI model.")
+
+    tasks = [asyncio.create_task(answer_one(index, question)) for index, question in enumerate(questions)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away: stop generating answers nobody will read
+        for task in tasks:
+            task.cancel()
+
+def queue_tts(answer: str) -> Tuple[Optional[str], Optional[str]]:
+    """Queues speech synthesis for an answer. Returns (tts_task_id, tts_error)."""
+    if not tts_service.is_available():
+        logger.warning("TTS requested but TTS model is not available.")
+        return None, None
+    try:
+        task_id = tts_service.job_queue.submit(answer)
+        logger.info(f"TTS requested, queued task {task_id}")
+        return task_id, None
+    except tts_service.TTSQueueFullError:
+        logger.warning("TTS requested but the TTS queue is full.")
+        return None, "Speech synthesis is busy. Please try again shortly."
+
+def _start_tts_stream() -> Tuple[Optional[tts_stream.StreamingTTSSession], Optional[str]]:
+    """Starts sentence-level speech synthesis for a streamed answer. Returns (stream, tts_error)."""
+    if not tts_service.is_available():
+        logger.warning("TTS streaming requested but TTS model is not available.")
+        return None, None
+    try:
+        return tts_stream.create_stream(), None
+    except tts_service.TTSQueueFullError:
+        logger.warning("TTS streaming requested but too many streams are pending.")
+        return None, "Speech synthesis is busy. Please try again shortly."
+
+async def answer_events(
+    question: str, session_id: Optional[str], tts: bool = False, stream_tts: bool = False, no_cache: bool = False
+) -> AsyncIterator[str]:
+    """The newline-delimited JSON events of a streamed answer (see /ask_stream)."""
+    parts = []
+    stream, tts_error = _start_tts_stream() if stream_tts else (None, None)
+    if stream:
+        audio_url = f"http://{settings.HOST_IP}:{settings.PORT}/api/v1/tts/stream/{stream.stream_id}"
+        yield json.dumps({"type": "tts_stream", "stream_id": stream.stream_id, "audio_url": audio_url}) + "\n"
+    try:
+        async for delta in stream_answer(question, session_id, use_cache=not no_cache):
+            parts.append(delta)
+            if stream:
+                stream.add_text(delta)
+            yield json.dumps({"type": "token", "text": delta}) + "\n"
+    except executors.OverloadedError as e:
+        logger.warning(f"Streamed answer rejected: {e}")
+        yield json.dumps({"type": "error", "detail": str(e), "retry_after": e.retry_after}) + "\n"
+        return
+    except Exception as e:
+        logger.error(f"Error streaming answer in endpoint: {e}", exc_info=True)
+        yield json.dumps({"type": "error", "detail": "Failed to get answer from AI model."}) + "\n"
+        return
+    finally:
+        if stream:
+            stream.finish()
+
+    answer = "".join(parts)
+    tts_task_id = None
+    if tts and not stream_tts:
+        tts_task_id, tts_error = queue_tts(answer)
+    selection = context_selection()
+    yield json.dumps({
+        "type": "done", "answer": answer, "tts_task_id": tts_task_id, "tts_error": tts_error,
+        "context_dropped_tokens": selection.dropped_tokens if selection else 0,
+        "context_dropped": selection.dropped if selection else []
+    }) + "\n"
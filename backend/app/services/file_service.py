@@ -1,11 +1,11 @@
 import logging
-import os
-import uuid
-from pathlib import Path
-from fastapi import UploadFile
+import mmap
+from typing import Tuple
 
 # Corrected: Use absolute imports from the 'app' package root
+from app.core import executors, metrics, retrieval
 from app.core.config import settings
+from app.core.content_store import ContentEntry, content_store
 from app.utils import file_utils
 
 logger = logging.getLogger(__name__)
@@ -14,71 +14,80 @@ class FileProcessingError(Exception):
     """Custom exception for file processing errors."""
     pass
 
-async def process_uploaded_pdf(file: UploadFile) -> str:
-    """Saves PDF temporarily, extracts text, and cleans up."""
-    temp_pdf_path = None
-    try:
-        # Use helper from file_utils
-        temp_pdf_path_str = f"temp_{uuid.uuid4().hex}.pdf" # Generate name first
-        temp_pdf_path = await file_utils.save_uploaded_file(
-            await file.read(),
-            settings.upload_path,
-            temp_pdf_path_str
-        )
-
-        # Extract text using helper
-        text_context = file_utils.extract_text_from_pdf(str(temp_pdf_path))
-        if not text_context:
-             logger.warning(f"No text extracted from PDF: {file.filename}")
+async def process_uploaded_pdf(upload: file_utils.StreamedUpload) -> Tuple[ContentEntry, bool]:
+    """
+    Extracts per-page text from the received upload, mapped into memory rather than read,
+    and builds the retrieval index. The upload was hashed while it was received, so
+    repeated uploads of the same bytes hit the content store without opening the file.
+    Returns (entry, cache_hit).
+    """
+    async def extract():
+        with open(upload.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if upload.size else None
+        source = memoryview(mapped) if mapped is not None else b""
+        try:
+            with metrics.stage("extract"):
+                extraction = await file_utils.extract_pdf(source)
+        finally:
+            if isinstance(source, memoryview):
+                source.release()
+            if mapped is not None:
+                mapped.close()
+        metrics.PDF_EXTRACTION_SECONDS.observe(extraction.total_seconds)
+        if not extraction.text:
+             logger.warning(f"No text extracted from PDF: {upload.filename}")
              # Consider raising FileProcessingError("Could not extract text from the PDF.")
+        # Large documents get a retrieval index so each question only sends relevant chunks
+        with metrics.stage("index"):
+            index = await retrieval.build_index(extraction.text)
+        data = {
+            "text": extraction.text,
+            "pages": extraction.pages,
+            "index": index,
+            "page_count": extraction.page_count,
+            "extraction_seconds": extraction.total_seconds,
+        }
+        # Joined text and per-page text are both kept
+        nbytes = 2 * len(extraction.text) + (index.nbytes if index is not None else 0)
+        return data, nbytes, []
 
-        return text_context
+    try:
+        return await content_store.get_or_compute(upload.digest, "pdf", extract)
+    except executors.OverloadedError:
+        raise
     except Exception as e:
-        logger.error(f"Failed to process PDF {file.filename}: {e}", exc_info=True)
+        logger.error(f"Failed to process PDF {upload.filename}: {e}", exc_info=True)
         raise FileProcessingError(f"Failed to process PDF: {e}")
-    finally:
-        # Clean up temporary file
-        if temp_pdf_path and temp_pdf_path.exists():
-            try:
-                os.remove(temp_pdf_path)
-                logger.info(f"Cleaned up temporary PDF: {temp_pdf_path}")
-            except OSError as e:
-                logger.error(f"Error removing temporary PDF {temp_pdf_path}: {e}")
 
 
-async def process_uploaded_image(file: UploadFile) -> tuple[str, str]:
-    """Saves image permanently (until session ends) and validates it."""
-    image_path = None
-    try:
-        # Save using helper
-        image_path = await file_utils.save_uploaded_file(
-            await file.read(),
-            settings.upload_path, # Destination directory from config
-            file.filename or f"{uuid.uuid4().hex}.png" # Use original name or generate one
-        )
+async def process_uploaded_image(upload: file_utils.StreamedUpload) -> Tuple[ContentEntry, bool]:
+    """
+    Validates the image from its header, then downscales and re-encodes it once to the
+    model's working resolution, reading it from the received file. The prepared image is
+    kept in memory and sent to the engine inline, so nothing is fetched back over HTTP.
+    Repeated uploads of the same bytes reuse the prepared image. Returns (entry, cache_hit).
+    """
+    async def prepare():
+        try:
+            with metrics.stage("prepare_image"):
+                prepared = await executors.cpu.run(
+                    file_utils.prepare_image, upload.path, settings.IMAGE_MAX_SIDE, settings.IMAGE_JPEG_QUALITY
+                )
+        except executors.OverloadedError:
+            raise
+        except file_utils.ImageValidationError as e:
+            logger.error(f"Uploaded file '{upload.filename}' is not a valid image: {e}")
+            raise FileProcessingError(str(e))
+        except Exception as e:
+            logger.error(f"Failed to process image {upload.filename}: {e}", exc_info=True)
+            raise FileProcessingError("An internal error occurred while processing the image.")
 
-        # Validate using helper
-        if file_utils.validate_and_load_image(str(image_path)) is None:
-            if image_path.exists():
-                os.remove(image_path)
-            logger.error(f"Uploaded file '{file.filename}' is not a valid image.")
-            raise FileProcessingError("Uploaded file is not a valid image.")
-
-        # Construct URL
-        image_url = f"http://{settings.HOST_IP}:{settings.PORT}/{settings.STATIC_DIR}/uploads/{image_path.name}"
-        logger.info(f"Image processed. URL: {image_url}, Path: {image_path}")
-
-        return str(image_path), image_url
-
-    except Exception as e:
-        if image_path and image_path.exists():
-             try:
-                 os.remove(image_path)
-             except OSError:
-                 pass
-        logger.error(f"Failed to process image {file.filename}: {e}", exc_info=True)
-        if isinstance(e, FileProcessingError):
-             raise
-        else:
-             raise FileProcessingError("An internal error occurred while processing the image.")
+        image_url = prepared.data_url
+        logger.info(
+            f"Image prepared: {prepared.source_size[0]}x{prepared.source_size[1]} -> "
+            f"{prepared.width}x{prepared.height} ({upload.size} -> {len(prepared.data)} bytes)"
+        )
+        data = {"image_url": image_url, "width": prepared.width, "height": prepared.height}
+        return data, len(image_url), []
 
+    return await content_store.get_or_compute(upload.digest, "image", prepare)
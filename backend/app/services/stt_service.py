@@ -0,0 +1,234 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Use try-except for optional dependency
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None # type: ignore
+    decode_audio = None # type: ignore
+
+from ..core.config import settings
+from ..core import executors, metrics
+from ..core.model_registry import ModelUnavailableError, registry
+from ..utils.audio_utils import AudioFormatError
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000 # Whisper models take 16 kHz mono audio
+FRAME_MS = 30 # VAD decision granularity
+PADDING_MS = 200 # Audio kept around each speech segment so word edges are not clipped
+
+
+class AudioTooLongError(ValueError):
+    """Raised when a recording exceeds STT_MAX_AUDIO_SECONDS."""
+    pass
+
+
+class _FakeSegment(NamedTuple):
+    text: str
+
+
+class FakeSTTModel:
+    """
+    Stand-in for a faster-whisper model that transcribes every speech segment as a fixed text.
+    Used for tests and local development without the model (STT_BACKEND=fake).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def transcribe(self, audio: np.ndarray, **kwargs):
+        return iter([_FakeSegment(self.text)]), None
+
+
+def build_stt_model():
+    """Constructs the configured speech-to-text model (blocking)."""
+    if settings.STT_BACKEND == "fake":
+        logger.info("Initializing fake STT model.")
+        return FakeSTTModel(settings.FAKE_STT_TEXT)
+    if WhisperModel is None:
+        raise ModelUnavailableError("faster-whisper not installed. Speech-to-text disabled.")
+    logger.info(
+        f"Initializing Whisper model: {settings.WHISPER_MODEL} "
+        f"({settings.WHISPER_DEVICE}, {settings.WHISPER_COMPUTE_TYPE})"
+    )
+    return WhisperModel(
+        settings.WHISPER_MODEL,
+        device=settings.WHISPER_DEVICE,
+        compute_type=settings.WHISPER_COMPUTE_TYPE,
+        cpu_threads=settings.WHISPER_CPU_THREADS
+    )
+
+
+def transcribe_segment(model, audio: np.ndarray, language: Optional[str] = None, prompt: Optional[str] = None) -> str:
+    """
+    Blocking: transcribes one speech segment of 16 kHz mono float32 audio.
+    `prompt` (the transcript so far) keeps spelling and context consistent across segments.
+    """
+    segments, _ = model.transcribe(
+        audio,
+        language=language or None,
+        beam_size=settings.STT_BEAM_SIZE,
+        vad_filter=True, # Whisper's own VAD drops any non-speech left inside the segment
+        condition_on_previous_text=False,
+        initial_prompt=prompt or None
+    )
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+def _warmup_stt_model(model):
+    transcribe_segment(model, np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+
+# --- STT Model Registration ---
+# Optional and loaded on the first transcription, unless STT_PRELOAD puts it in eager loading
+registry.register(
+    "stt", build_stt_model, warmup=_warmup_stt_model, required=False, eager=settings.STT_PRELOAD
+)
+# --- ---
+
+def is_available() -> bool:
+    """True if the STT model is loaded or can still be loaded on demand."""
+    if settings.STT_BACKEND != "fake" and WhisperModel is None:
+        return False
+    return registry.is_available("stt")
+
+
+async def decode_file(path: str) -> np.ndarray:
+    """Decodes a compressed recording (WebM/Opus, Ogg, MP3, ...) to 16 kHz mono float32 samples."""
+    if decode_audio is None:
+        raise AudioFormatError("Compressed audio needs faster-whisper; send 16-bit PCM or WAV instead.")
+    try:
+        return await executors.cpu.run(decode_audio, path, SAMPLE_RATE)
+    except executors.OverloadedError:
+        raise
+    except Exception as e:
+        raise AudioFormatError(f"Could not decode audio: {e}") from e
+
+
+class SpeechSegmenter:
+    """
+    Energy-based voice activity detection that cuts a stream of 16 kHz audio into utterances.
+
+    Audio is judged in 30 ms frames. A segment opens at the first loud frame (with a little
+    audio before it) and closes once `min_silence_ms` of quiet follows, so each segment can be
+    transcribed while the speaker is still talking. Speech longer than `max_segment_seconds`
+    is cut to stay within Whisper's 30 s window.
+    """
+
+    def __init__(self, threshold: float, min_silence_ms: int, max_segment_seconds: float):
+        self.threshold = threshold
+        self.frame_samples = SAMPLE_RATE * FRAME_MS // 1000
+        self.silence_frames = max(1, min_silence_ms // FRAME_MS)
+        self.padding_frames = PADDING_MS // FRAME_MS
+        self.max_frames = max(1, int(max_segment_seconds * 1000 / FRAME_MS))
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._preroll: Deque[np.ndarray] = deque(maxlen=self.padding_frames)
+        self._frames: List[np.ndarray] = []
+        self._quiet = 0 # Consecutive quiet frames at the end of the open segment
+        self._frame_index = 0 # Frames seen so far
+        self._start_frame = 0
+
+    def _close(self, keep_quiet: int) -> Tuple[float, np.ndarray]:
+        frames = self._frames[:len(self._frames) - self._quiet + keep_quiet]
+        segment = (self._start_frame * FRAME_MS / 1000, np.concatenate(frames))
+        self._frames = []
+        self._quiet = 0
+        return segment
+
+    def feed(self, audio: np.ndarray) -> List[Tuple[float, np.ndarray]]:
+        """Adds audio; returns the segments it completes as (start seconds, samples)."""
+        if len(self._remainder):
+            audio = np.concatenate([self._remainder, audio])
+        usable = len(audio) - len(audio) % self.frame_samples
+        self._remainder = audio[usable:]
+        if not usable:
+            return []
+        frames = audio[:usable].reshape(-1, self.frame_samples)
+        loud = np.sqrt(np.mean(np.square(frames), axis=1)) >= self.threshold
+        segments = []
+        for frame, is_loud in zip(frames, loud):
+            if self._frames:
+                self._frames.append(frame)
+                self._quiet = 0 if is_loud else self._quiet + 1
+                if self._quiet >= self.silence_frames:
+                    segments.append(self._close(keep_quiet=self.padding_frames))
+                elif len(self._frames) >= self.max_frames:
+                    segments.append(self._close(keep_quiet=self._quiet))
+            elif is_loud:
+                self._start_frame = self._frame_index - len(self._preroll)
+                self._frames = [*self._preroll, frame]
+                self._preroll.clear()
+            else:
+                self._preroll.append(frame)
+            self._frame_index += 1
+        return segments
+
+    def flush(self) -> Optional[Tuple[float, np.ndarray]]:
+        """Closes the open segment at the end of the stream, if speech is still going on."""
+        if not self._frames:
+            return None
+        if len(self._remainder):
+            self._frames.append(self._remainder)
+            self._quiet = 0
+        return self._close(keep_quiet=self.padding_frames)
+
+
+class TranscriptSegment(NamedTuple):
+    index: int
+    text: str
+    start: float # Seconds from the start of the recording
+    end: float
+
+
+async def transcribe_stream(chunks: AsyncIterator[np.ndarray], language: Optional[str] = None) -> AsyncIterator[TranscriptSegment]:
+    """
+    Transcribes 16 kHz mono audio while it arrives, yielding each speech segment's text as
+    soon as voice activity detection closes it. Receiving continues while a segment is being
+    transcribed; segments of one stream are transcribed in order, each prompted with the
+    transcript so far.
+    """
+    model = await registry.get("stt")
+    language = language or settings.STT_LANGUAGE or None
+    segmenter = SpeechSegmenter(
+        settings.STT_VAD_ENERGY_THRESHOLD, settings.STT_VAD_MIN_SILENCE_MS, settings.STT_MAX_SEGMENT_SECONDS
+    )
+    max_samples = int(settings.STT_MAX_AUDIO_SECONDS * SAMPLE_RATE)
+    segments: asyncio.Queue = asyncio.Queue()
+
+    async def receive():
+        received = 0
+        try:
+            async for audio in chunks:
+                received += len(audio)
+                if received > max_samples:
+                    raise AudioTooLongError(f"Audio is longer than {settings.STT_MAX_AUDIO_SECONDS:g} seconds.")
+                for segment in segmenter.feed(audio):
+                    segments.put_nowait(segment)
+            segment = segmenter.flush()
+            if segment:
+                segments.put_nowait(segment)
+        finally:
+            segments.put_nowait(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        texts: List[str] = []
+        while (segment := await segments.get()) is not None:
+            start, audio = segment
+            started = time.perf_counter()
+            text = await executors.stt.run(transcribe_segment, model, audio, language, " ".join(texts))
+            seconds = len(audio) / SAMPLE_RATE
+            metrics.STT_REAL_TIME_FACTOR.observe((time.perf_counter() - started) / seconds)
+            if text:
+                texts.append(text)
+                yield TranscriptSegment(len(texts) - 1, text, round(start, 2), round(start + seconds, 2))
+        await receiver # Surfaces errors from reading or decoding the audio
+    finally:
+        receiver.cancel()
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Use try-except for optional dependencies
+try:
+    from TTS.api import TTS
+except ImportError:
+    TTS = None # type: ignore
+
+try:
+    import torch
+except ImportError:
+    torch = None # type: ignore
+
+from ..core.config import settings
+from ..core import metrics
+from ..core.model_registry import ModelUnavailableError
+from ..utils.audio_utils import to_int16
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "Hello."
+
+
+class FakeTTSModel:
+    """
+    Stand-in for a Coqui TTS model that produces silence after a configurable delay.
+    Used for tests and local development without the TTS library (TTS_BACKEND=fake).
+    """
+
+    sample_rate = 22050
+
+    def __init__(self, seconds_per_char: float = 0.0):
+        self.seconds_per_char = seconds_per_char
+
+    def tts(self, text: str) -> np.ndarray:
+        time.sleep(self.seconds_per_char * len(text))
+        # Roughly 15 characters of speech per second
+        return np.zeros(int(self.sample_rate * max(len(text), 1) / 15), dtype=np.float32)
+
+
+def build_tts_model():
+    """Constructs the configured TTS model (blocking)."""
+    if settings.TTS_BACKEND == "fake":
+        logger.info("Initializing fake TTS model.")
+        return FakeTTSModel(seconds_per_char=settings.FAKE_TTS_SECONDS_PER_CHAR)
+    if not TTS:
+        raise ModelUnavailableError("TTS library not installed. TTS functionality disabled.")
+    logger.info(f"Initializing TTS model: {settings.TTS_MODEL} (GPU: {settings.ENABLE_GPU_TTS})")
+    # Note: GPU usage might fail if CUDA is not available or VRAM is insufficient
+    return TTS(
+        model_name=settings.TTS_MODEL,
+        progress_bar=False,
+        gpu=settings.ENABLE_GPU_TTS
+    )
+
+
+def model_sample_rate(tts_model) -> int:
+    synthesizer = getattr(tts_model, "synthesizer", None)
+    if synthesizer is not None:
+        return synthesizer.output_sample_rate
+    return getattr(tts_model, "sample_rate", 22050)
+
+
+def synthesize_text(tts_model, text: str) -> Tuple[int, np.ndarray, float]:
+    """Blocking: synthesizes one text. Returns (sample_rate, int16 samples, seconds spent)."""
+    started = time.perf_counter()
+    samples = to_int16(tts_model.tts(text))
+    return model_sample_rate(tts_model), samples, time.perf_counter() - started
+
+
+# --- Replica Processes ---
+# Each worker process of a multi-replica engine builds its own model once, when it starts
+_replica_model = None
+
+def _init_replica(threads: int):
+    global _replica_model
+    if torch is not None and threads > 0:
+        # Replicas share the machine's cores instead of each claiming all of them
+        torch.set_num_threads(threads)
+    _replica_model = build_tts_model()
+    _replica_model.tts(WARMUP_TEXT)
+    logger.info(f"TTS replica ready in process {os.getpid()} ({threads or 'default'} threads)")
+
+def _replica_synthesize(text: str) -> Tuple[int, np.ndarray, float]:
+    return synthesize_text(_replica_model, text)
+# --- ---
+
+
+class TTSEngine:
+    """
+    One or more TTS model replicas, each working through its own queue of texts.
+
+    Texts submitted concurrently (whole answers from the job queue, sentences from streaming
+    sessions) go to the replica with the fewest texts queued, and each one completes as soon
+    as it is synthesized. Given a `model`, the single replica runs in-process on its own
+    thread; otherwise each replica is a worker process with its own model, warmed up when
+    the process starts and limited to a share of the CPU cores, so aggregate throughput
+    scales with cores instead of every job waiting for one model. Synthesis returns int16
+    NumPy buffers; encoding to a file is left to the caller.
+    """
+
+    def __init__(self, replicas: int = 1, threads_per_replica: int = 0, model=None):
+        self.replicas = max(1, replicas)
+        self.in_process = model is not None
+        self._model = model
+        if self.in_process:
+            if self.replicas > 1:
+                raise ValueError("An in-process TTS engine has a single replica.")
+            self._executors: List[Executor] = [ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-replica")]
+            self.sample_rate: Optional[int] = model_sample_rate(model)
+            self.threads_per_replica = 0
+        else:
+            self.threads_per_replica = threads_per_replica or max(1, (os.cpu_count() or 2) // self.replicas)
+            # Spawned, not forked: the parent already runs an event loop and possibly CUDA (vLLM)
+            context = multiprocessing.get_context("spawn")
+            self._executors = [
+                ProcessPoolExecutor(
+                    max_workers=1, mp_context=context, initializer=_init_replica, initargs=(self.threads_per_replica,)
+                )
+                for _ in range(self.replicas)
+            ]
+            self.sample_rate = None
+        self.queued = [0] * self.replicas
+        self.texts_total = 0
+
+    def __repr__(self) -> str:
+        return f"TTSEngine(replicas={self.replicas}, in_process={self.in_process})"
+
+    async def _run_on(self, index: int, text: str) -> Tuple[int, np.ndarray, float]:
+        loop = asyncio.get_running_loop()
+        self.queued[index] += 1
+        try:
+            if self.in_process:
+                return await loop.run_in_executor(self._executors[index], partial(synthesize_text, self._model, text))
+            return await loop.run_in_executor(self._executors[index], _replica_synthesize, text)
+        finally:
+            self.queued[index] -= 1
+
+    async def synthesize(self, text: str, mode: str = "file") -> np.ndarray:
+        """Synthesizes one text on the least busy replica, as int16 samples."""
+        index = min(range(self.replicas), key=self.queued.__getitem__)
+        sample_rate, samples, seconds = await self._run_on(index, text)
+        self.sample_rate = sample_rate
+        self.texts_total += 1
+        if len(samples):
+            metrics.TTS_REAL_TIME_FACTOR.observe(seconds * sample_rate / len(samples), mode)
+        return samples
+
+    async def get_sample_rate(self) -> int:
+        """The output sample rate, warming the engine up first if no replica has reported it yet."""
+        if self.sample_rate is None:
+            await self.warmup()
+        return self.sample_rate
+
+    async def warmup(self):
+        """Synthesizes a short text on every replica (starting the replica processes)."""
+        outcomes = await asyncio.gather(*(self._run_on(index, WARMUP_TEXT) for index in range(self.replicas)))
+        self.sample_rate = outcomes[0][0]
+
+    @property
+    def busy(self) -> int:
+        return sum(1 for queued in self.queued if queued)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": self.replicas,
+            "in_process": self.in_process,
+            "threads_per_replica": self.threads_per_replica,
+            "busy_replicas": self.busy,
+            "queued_texts": sum(self.queued),
+            "texts_total": self.texts_total,
+        }
+
+    async def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("TTS engine stopped.")
+
+
+def create_engine() -> TTSEngine:
+    """
+    Builds the engine for the configured number of replicas (blocking; replica processes load lazily).
+    A thread limit is only applied inside replica processes, so with one replica and
+    TTS_THREADS_PER_REPLICA set the model also runs in a worker process, leaving the torch
+    threads of the API process (embedder, Whisper) alone.
+    """
+    if settings.TTS_REPLICAS <= 1 and settings.TTS_THREADS_PER_REPLICA <= 0:
+        return TTSEngine(model=build_tts_model())
+    if settings.TTS_BACKEND != "fake" and not TTS:
+        raise ModelUnavailableError("TTS library not installed. TTS functionality disabled.")
+    replicas = max(1, settings.TTS_REPLICAS)
+    logger.info(f"Starting TTS engine with {replicas} replica processes")
+    return TTSEngine(replicas=replicas, threads_per_replica=settings.TTS_THREADS_PER_REPLICA)
@@ -1,64 +1,226 @@
 import os
+import math
+import time
 import uuid
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-
-# Use try-except for optional dependency
-try:
-    from TTS.api import TTS
-except ImportError:
-    TTS = None # type: ignore
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from ..core.config import settings
-from ..core import tts_manager
+from ..core import metrics, tts_manager
+from ..core.audio_cache import audio_cache
+from ..core.executors import MAX_RETRY_AFTER_SECONDS, OverloadedError
+from ..core.model_registry import ModelUnavailableError, registry
+from ..utils.audio_utils import encode_audio, file_extension, resolve_audio_format
+from . import tts_engine
 
 logger = logging.getLogger(__name__)
 
-# --- Global TTS Model Instance ---
-# Initialize based on config
-tts_model = None
-if TTS:
-    try:
-        logger.info(f"Initializing TTS model: {settings.TTS_MODEL} (GPU: {settings.ENABLE_GPU_TTS})")
-        # Note: GPU usage might fail if CUDA is not available or VRAM is insufficient
-        tts_model = TTS(
-            model_name=settings.TTS_MODEL,
-            progress_bar=False,
-            gpu=settings.ENABLE_GPU_TTS
-        )
-        logger.info("TTS model initialized successfully.")
-    except Exception as e:
-        logger.error(f"Failed to initialize TTS model: {e}", exc_info=True)
-        # Continue without TTS functionality
-        tts_model = None
-else:
-    logger.warning("TTS library not installed. TTS functionality disabled.")
+
+# --- TTS Engine Registration ---
+# The engine (and its model replicas) is built by the model registry, so importing this module stays cheap
+async def _warmup_tts_engine(engine: tts_engine.TTSEngine):
+    await engine.warmup()
+
+async def _unload_tts_engine(engine: tts_engine.TTSEngine):
+    await engine.shutdown()
+
+# TTS is optional: a missing model must not make the service unready
+registry.register(
+    "tts", tts_engine.create_engine, warmup=_warmup_tts_engine, unload=_unload_tts_engine, required=False
+)
 # --- ---
 
-def synthesize_text_background(text: str, task_id: str):
+# Encoding of synthesized files (WAV unless a compressed format is configured and supported)
+AUDIO_FORMAT = resolve_audio_format(settings.TTS_AUDIO_FORMAT)
+
+def is_available() -> bool:
+    """True if the TTS model is loaded or can still be loaded on demand."""
+    if settings.TTS_BACKEND != "fake" and not tts_engine.TTS:
+        return False
+    return registry.is_available("tts")
+
+def _audio_url(audio_path: Path) -> str:
+    # Construct the absolute URL for the client to fetch (served with Range/ETag support by /tts/audio)
+    return f"http://{settings.HOST_IP}:{settings.PORT}/api/v1/tts/audio/{audio_path.name}"
+
+async def synthesize_text(text: str, task_id: str, executor: Optional[Executor] = None):
     """
-    Background task to synthesize speech, save it, and update task status.
+    Synthesizes speech for a task, saves it, and updates the task status.
+    The engine synthesizes the text on its least busy replica and returns raw samples;
+    only encoding the file runs on `executor` (the TTS worker threads).
+    With TTS_CACHE_ENABLED, identical text is synthesized once and the file is shared.
     """
-    if not tts_model:
-        logger.error("TTS model not available. Cannot synthesize.")
+    try:
+        engine = await registry.get("tts")
+    except ModelUnavailableError as e:
+        logger.error(f"TTS model not available. Cannot synthesize: {e}")
         tts_manager.update_tts_task_status(task_id, status="failed", error="TTS model not available.")
         return
 
-    try:
-        audio_filename = f"audio_{task_id}.wav" # Use task_id for uniqueness
-        audio_save_path = settings.audio_path / audio_filename
+    async def synthesize(audio_save_path: Path):
+        samples = await engine.synthesize(text, mode="file")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            executor, partial(encode_audio, samples, engine.sample_rate, str(audio_save_path), AUDIO_FORMAT)
+        )
 
+    async def synthesize_to(audio_save_path: Path):
         logger.info(f"Synthesizing TTS for task {task_id} to {audio_save_path}...")
-        # Generate audio file from text.
-        tts_model.tts_to_file(text=text, file_path=str(audio_save_path))
+        await asyncio.wait_for(synthesize(audio_save_path), timeout=settings.TTS_JOB_TIMEOUT_SECONDS)
         logger.info(f"TTS synthesis complete for task {task_id}.")
 
-        # Construct the absolute URL for the client to fetch
-        # Assumes static files served at /static/audio
-        audio_url = f"http://{settings.HOST_IP}:{settings.PORT}/{settings.STATIC_DIR}/audio/{audio_filename}"
-
-        tts_manager.update_tts_task_status(task_id, status="done", audio_url=audio_url)
+    try:
+        if settings.TTS_CACHE_ENABLED:
+            audio_save_path, hit = await audio_cache.get_or_synthesize(audio_cache.key(text), synthesize_to)
+            if hit:
+                logger.info(f"TTS cache hit for task {task_id}.")
+            tts_manager.update_tts_task_status(task_id, status="done", audio_url=_audio_url(audio_save_path))
+        else:
+            audio_save_path = settings.audio_path / f"audio_{task_id}.{file_extension(AUDIO_FORMAT)}" # Use task_id for uniqueness
+            await synthesize_to(audio_save_path)
+            tts_manager.update_tts_task_status(
+                task_id, status="done", audio_url=_audio_url(audio_save_path), audio_path=str(audio_save_path)
+            )
 
+    except asyncio.TimeoutError:
+        logger.error(f"TTS synthesis timed out for task {task_id}.")
+        tts_manager.update_tts_task_status(task_id, status="failed", error="TTS synthesis timed out.")
     except Exception as e:
         logger.error(f"TTS synthesis failed for task {task_id}: {e}", exc_info=True)
-        tts_manager.update_tts_task_status(task_id, status="failed", error=str(e))
\ No newline at end of file
+        tts_manager.update_tts_task_status(task_id, status="failed", error=str(e))
+
+
+class TTSQueueFullError(OverloadedError):
+    """Raised when the TTS job queue is at capacity."""
+    pass
+
+
+class TTSJobQueue:
+    """
+    Bounded queue of TTS jobs served by a fixed number of workers on dedicated threads.
+
+    Submitting to a full queue fails fast with TTSQueueFullError instead of piling up work,
+    and finished tasks are expired after TTS_TASK_TTL_SECONDS. Queued jobs and the sentences
+    of streaming sessions share the same `workers` synthesis slots.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._expiry_task: Optional[asyncio.Task] = None
+        self._busy = 0
+        self._avg_seconds = 0.0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tts")
+        self._worker_tasks = [asyncio.create_task(self._work(), name=f"tts-worker-{i}") for i in range(self.workers)]
+        self._expiry_task = asyncio.create_task(self._expire_periodically())
+        logger.info(f"TTS job queue started ({self.workers} workers, max {self.max_pending} pending)")
+
+    def submit(self, text: str) -> str:
+        """Queues a synthesis job and returns its task ID. Cached audio completes the task at once."""
+        self.start()
+        cached_path = audio_cache.lookup(audio_cache.key(text)) if settings.TTS_CACHE_ENABLED else None
+        if cached_path is not None:
+            task_id = tts_manager.create_tts_task()
+            logger.info(f"TTS cache hit for task {task_id}.")
+            # The file belongs to the cache, so the task does not record an audio_path to delete
+            tts_manager.update_tts_task_status(task_id, status="done", audio_url=_audio_url(cached_path))
+            return task_id
+        if self._queue.full():
+            self.rejected += 1
+            raise TTSQueueFullError("Speech synthesis is busy. Please try again shortly.", self.retry_after())
+        task_id = tts_manager.create_tts_task()
+        self._queue.put_nowait((text, task_id, time.perf_counter()))
+        return task_id
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Holds one of the synthesis slots for the duration of the block, waiting for one if needed."""
+        self.start()
+        async with self._slots:
+            self._busy += 1
+            try:
+                yield
+            finally:
+                self._busy -= 1
+
+    async def _work(self):
+        while True:
+            text, task_id, queued_at = await self._queue.get()
+            try:
+                async with self.slot():
+                    metrics.QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at, "tts")
+                    started = time.perf_counter()
+                    try:
+                        await synthesize_text(text, task_id, self._executor)
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        self._avg_seconds = elapsed if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * elapsed
+                        self.completed += 1
+            finally:
+                self._queue.task_done()
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained enough to accept a job."""
+        backlog = (self._queue.qsize() if self._queue else 0) + 1
+        estimate = (self._avg_seconds or 1.0) * backlog / self.workers
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(estimate))))
+
+    async def _expire_periodically(self):
+        while True:
+            # At least a second apart, so a TTL of zero (or below) cannot spin the loop
+            await asyncio.sleep(max(1.0, settings.TTS_TASK_TTL_SECONDS / 4))
+            tts_manager.expire_tts_tasks(settings.TTS_TASK_TTL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    async def shutdown(self):
+        for task in self._worker_tasks + ([self._expiry_task] if self._expiry_task else []):
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._expiry_task = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._queue = None
+        self._slots = None
+        logger.info("TTS job queue stopped.")
+
+
+# Create a single instance to be imported
+job_queue = TTSJobQueue(workers=settings.TTS_WORKERS, max_pending=settings.TTS_QUEUE_MAX)
+metrics.register_gauge(
+    "tts_queue_depth", "TTS jobs waiting for a worker.", lambda: {(): job_queue.stats()["queue_depth"]}
+)
+metrics.register_gauge(
+    "tts_busy_replicas", "TTS model replicas synthesizing right now.",
+    lambda: {(): engine.busy if (engine := registry.peek("tts")) else 0}
+)
+metrics.register_gauge(
+    "tts_pending_tasks", "TTS tasks still processing.", lambda: {(): tts_manager.pending_tts_task_count()}
+)
@@ -0,0 +1,155 @@
+import re
+import time
+import uuid
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.model_registry import registry
+from ..utils.audio_utils import to_pcm16, wav_stream_header
+from . import tts_service
+
+logger = logging.getLogger(__name__)
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) and whitespace
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+# Very short fragments ("e.g.", "1.") are merged into the next sentence
+MIN_SENTENCE_CHARS = 20
+
+
+class SentenceSplitter:
+    """Incrementally splits streamed text into complete sentences."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adds text and returns the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END_RE.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left once the text is complete."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str) -> List[str]:
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+class StreamingTTSSession:
+    """
+    Synthesizes sentences as they arrive and exposes the audio, in order, as a byte stream.
+
+    The producer (e.g. the LLM token stream) calls `add_text`/`finish`; every completed
+    sentence is submitted at once and synthesized as soon as one of the TTS job queue's
+    TTS_WORKERS slots is free, so with several replicas the stream's sentences are
+    synthesized in parallel without exceeding the workers. The consumer
+    iterates `audio_chunks()`, which yields the WAV header followed by one PCM chunk per
+    sentence as soon as that sentence and all before it are synthesized.
+    """
+
+    def __init__(self):
+        self.stream_id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self._splitter = SentenceSplitter()
+        self._sentences: asyncio.Queue = asyncio.Queue()
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._emit_in_order())
+
+    def add_text(self, text: str):
+        for sentence in self._splitter.feed(text):
+            self._submit(sentence)
+
+    def finish(self):
+        for sentence in self._splitter.flush():
+            self._submit(sentence)
+        self._sentences.put_nowait(None)
+
+    def _submit(self, sentence: str):
+        self._sentences.put_nowait(asyncio.create_task(self._synthesize(sentence)))
+
+    async def _synthesize(self, sentence: str) -> bytes:
+        engine = await registry.get("tts")
+        async with tts_service.job_queue.slot():
+            started = time.perf_counter()
+            samples = await engine.synthesize(sentence, mode="stream")
+        logger.debug(f"Stream {self.stream_id}: synthesized {len(sentence)} chars in {time.perf_counter() - started:.2f}s")
+        return to_pcm16(samples)
+
+    def cancel(self):
+        self._worker.cancel()
+        while not self._sentences.empty():
+            pending = self._sentences.get_nowait()
+            if pending is not None:
+                pending.cancel()
+        self._chunks.put_nowait(None)
+
+    async def _emit_in_order(self):
+        try:
+            engine = await registry.get("tts")
+            await self._chunks.put(wav_stream_header(await engine.get_sample_rate()))
+            while True:
+                pending = await self._sentences.get()
+                if pending is None:
+                    break
+                await self._chunks.put(await pending)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Streaming TTS failed for {self.stream_id}: {e}", exc_info=True)
+        finally:
+            self._chunks.put_nowait(None)
+            # Sentences still queued after a failure are not needed anymore
+            while not self._sentences.empty():
+                pending = self._sentences.get_nowait()
+                if pending is not None:
+                    pending.cancel()
+
+    async def audio_chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+# In-memory registry of streams waiting to be consumed
+_streams: Dict[str, StreamingTTSSession] = {}
+
+def create_stream() -> StreamingTTSSession:
+    """Starts a streaming synthesis session. Raises TTSQueueFullError when too many are waiting."""
+    _expire_streams()
+    if len(_streams) >= settings.TTS_QUEUE_MAX:
+        raise tts_service.TTSQueueFullError("Speech synthesis is busy. Please try again shortly.")
+    stream = StreamingTTSSession()
+    _streams[stream.stream_id] = stream
+    logger.info(f"Created streaming TTS session {stream.stream_id}")
+    return stream
+
+def take_stream(stream_id: str) -> Optional[StreamingTTSSession]:
+    """Hands a stream to its (single) consumer."""
+    return _streams.pop(stream_id, None)
+
+def _expire_streams():
+    cutoff = time.time() - settings.TTS_TASK_TTL_SECONDS
+    for stream_id in [sid for sid, stream in _streams.items() if stream.created_at < cutoff]:
+        _streams.pop(stream_id).cancel()
+        logger.info(f"Expired unconsumed streaming TTS session {stream_id}")
+
+def cleanup_streams():
+    for stream in _streams.values():
+        stream.cancel()
+    _streams.clear()
@@ -0,0 +1,257 @@
+import logging
+import re
+import struct
+import wave
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import anyio
+import numpy as np
+
+# Use try-except for optional dependency
+try:
+    import soundfile
+except ImportError:
+    soundfile = None # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# --- Output Formats ---
+# name -> (file extension, media type, libsndfile format, libsndfile subtype)
+AUDIO_FORMATS: Dict[str, Tuple[str, str, Optional[str], Optional[str]]] = {
+    "wav": ("wav", "audio/wav", None, None),
+    "mp3": ("mp3", "audio/mpeg", "MP3", "MPEG_LAYER_III"),
+    "ogg": ("ogg", "audio/ogg", "OGG", "VORBIS"),
+    "opus": ("opus", "audio/ogg; codecs=opus", "OGG", "OPUS"),
+}
+MEDIA_TYPES = {extension: media_type for extension, media_type, _, _ in AUDIO_FORMATS.values()}
+
+# Opus only encodes at these rates; speech is resampled to the nearest one above
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+@lru_cache(maxsize=None)
+def resolve_audio_format(name: str) -> str:
+    """Returns a usable output format, falling back to WAV if the encoder is unavailable."""
+    name = name.lower()
+    if name not in AUDIO_FORMATS:
+        logger.warning(f"Unknown TTS audio format '{name}', using wav.")
+        return "wav"
+    if name != "wav" and soundfile is None:
+        logger.warning(f"TTS audio format '{name}' needs the 'soundfile' package, using wav.")
+        return "wav"
+    return name
+
+
+def file_extension(audio_format: str) -> str:
+    return AUDIO_FORMATS[audio_format][0]
+
+
+def to_int16(samples) -> np.ndarray:
+    """Converts float samples in [-1, 1] to 16-bit PCM samples; int16 input is returned as is."""
+    audio = np.asarray(samples)
+    if audio.dtype == np.int16:
+        return audio
+    audio = np.clip(audio.astype(np.float32, copy=False), -1.0, 1.0)
+    return (audio * 32767).astype(np.int16)
+
+
+def to_pcm16(samples) -> bytes:
+    """Converts float (or int16) samples to little-endian 16-bit PCM."""
+    return to_int16(samples).astype("<i2", copy=False).tobytes()
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """WAV header for a stream of unknown length (sizes set to the maximum, as players expect)."""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    unknown_size = 0xFFFFFFFF
+    return (
+        b"RIFF" + struct.pack("<I", unknown_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", unknown_size - 36)
+    )
+
+
+def _resample(audio: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    if from_rate == to_rate or len(audio) == 0:
+        return audio
+    duration = len(audio) / from_rate
+    target = np.linspace(0.0, duration, int(duration * to_rate), endpoint=False, dtype=np.float64)
+    source = np.arange(len(audio), dtype=np.float64) / from_rate
+    return np.interp(target, source, audio).astype(np.float32)
+
+
+def encode_audio(samples, sample_rate: int, file_path: str, audio_format: str):
+    """Writes mono float (or int16) samples to `file_path` in the given format (blocking)."""
+    if audio_format == "wav":
+        with wave.open(file_path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(to_pcm16(samples))
+        return
+    audio = np.asarray(samples)
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    else:
+        audio = np.clip(audio.astype(np.float32, copy=False), -1.0, 1.0)
+    _, _, container, subtype = AUDIO_FORMATS[audio_format]
+    if subtype == "OPUS" and sample_rate not in OPUS_SAMPLE_RATES:
+        target_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+        audio = _resample(audio, sample_rate, target_rate)
+        sample_rate = target_rate
+    soundfile.write(file_path, audio, sample_rate, format=container, subtype=subtype)
+
+
+# --- Input Decoding ---
+class AudioFormatError(ValueError):
+    """Raised when incoming audio is not 16-bit PCM (raw or WAV) or cannot be decoded."""
+    pass
+
+
+class _StreamResampler:
+    """Linear resampling of a signal that arrives in chunks, continuous across chunk boundaries."""
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.step = from_rate / to_rate
+        self._position = 0.0 # Next output sample, in input samples relative to `_tail[0]`
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def __call__(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.concatenate([self._tail, audio]) if len(self._tail) else audio
+        if len(audio) < 2:
+            self._tail = audio
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self._position, len(audio) - 1, self.step)
+        resampled = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+        next_position = positions[-1] + self.step if len(positions) else self._position
+        keep_from = int(next_position)
+        self._tail = audio[keep_from:]
+        self._position = next_position - keep_from
+        return resampled
+
+
+class PCMStreamDecoder:
+    """
+    Decodes 16-bit PCM arriving in chunks of any size, raw or as a WAV stream, into mono
+    float32 samples at `target_rate`. A WAV header (detected by its RIFF magic) overrides
+    `sample_rate` and `channels`; multi-channel audio is downmixed and other rates are
+    resampled on the fly, so decoding keeps pace with the upload.
+    """
+
+    def __init__(self, target_rate: int, sample_rate: int = 16000, channels: int = 1):
+        self.target_rate = target_rate
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._pending = bytearray()
+        self._header_checked = False
+        self._resampler: Optional[_StreamResampler] = None
+
+    def _parse_wav_header(self) -> bool:
+        """Consumes the WAV header from `_pending`. Returns False until all of it has arrived."""
+        data = self._pending
+        offset = 12
+        while len(data) >= offset + 8:
+            chunk_id = bytes(data[offset:offset + 4])
+            chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+            if chunk_id == b"data":
+                # Streamed WAVs often carry a placeholder size; read until the body ends instead
+                del data[:offset + 8]
+                return True
+            if len(data) < offset + 8 + chunk_size:
+                return False
+            if chunk_id == b"fmt ":
+                audio_format, channels, sample_rate = struct.unpack("<HHI", data[offset + 8:offset + 16])
+                bits_per_sample = struct.unpack("<H", data[offset + 22:offset + 24])[0]
+                if audio_format not in (1, 0xFFFE) or bits_per_sample != 16:
+                    raise AudioFormatError("Only 16-bit PCM WAV audio can be streamed.")
+                self.channels, self.sample_rate = channels, sample_rate
+            offset += 8 + chunk_size + (chunk_size & 1) # Chunks are padded to an even size
+        return False
+
+    def _start(self) -> bool:
+        """Detects (and skips) a WAV header. Returns False while more bytes are needed."""
+        if len(self._pending) < 12:
+            return False
+        if self._pending[:4] == b"RIFF":
+            if self._pending[8:12] != b"WAVE":
+                raise AudioFormatError("Not a WAV file.")
+            if not self._parse_wav_header():
+                return False
+        if self.channels < 1 or self.sample_rate < 1:
+            raise AudioFormatError("Invalid sample rate or channel count.")
+        self._header_checked = True
+        if self.sample_rate != self.target_rate:
+            self._resampler = _StreamResampler(self.sample_rate, self.target_rate)
+        return True
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """Adds raw bytes and returns the samples they complete (possibly none)."""
+        self._pending += data
+        if not self._header_checked and not self._start():
+            return np.zeros(0, dtype=np.float32)
+        frame_bytes = 2 * self.channels
+        usable = len(self._pending) - len(self._pending) % frame_bytes
+        if not usable:
+            return np.zeros(0, dtype=np.float32)
+        audio = np.frombuffer(bytes(self._pending[:usable]), dtype="<i2").astype(np.float32) / 32768.0
+        del self._pending[:usable]
+        if self.channels > 1:
+            audio = audio.reshape(-1, self.channels).mean(axis=1)
+        return self._resampler(audio) if self._resampler else audio
+
+    def finish(self):
+        """Checks that the stream did not end inside a WAV header."""
+        if not self._header_checked and self._pending:
+            raise AudioFormatError("Audio ended before its header was complete.")
+
+
+# --- Byte-range Serving ---
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header does not overlap the file."""
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single `bytes=start-end` range into an inclusive (start, end) pair.
+    Returns None when the whole file should be sent (no header, or a multi-range request).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None # Multiple or malformed ranges: fall back to the full body
+    start_text, end_text = match.groups()
+    if not start_text and not end_text:
+        return None
+    if not start_text:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(start_text)
+    end = min(int(end_text), size - 1) if end_text else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+async def read_file_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Streams bytes start..end (inclusive) of a file without loading it into memory."""
+    remaining = end - start + 1
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -1,86 +1,390 @@
 import fitz  # PyMuPDF
-from PIL import Image, UnidentifiedImageError
+from PIL import Image, ImageOps, UnidentifiedImageError
+import anyio
+import asyncio
+import base64
+import io
 import logging
-import os
+import tempfile
+import time
 import uuid
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import Optional # <<--- ADDED IMPORT
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union # <<--- ADDED IMPORT
 
-# If implementing backend STT, ensure config import is correct
-# from app.core.config import settings
+from app.core import executors
+from app.core.config import settings
+from app.core.content_store import new_hasher
 
 logger = logging.getLogger(__name__)
 
-# --- Whisper Model (Optional - Load if doing backend STT) ---
-# ... (Whisper loading code remains the same) ...
+# --- PDF Extraction Engine ---
+# PDFs are opened straight from an in-memory or mmap'd buffer (no temp file).
+# Large documents are split into page ranges that worker processes extract from
+# a shared-memory copy of the buffer, so extraction never blocks the event loop.
+
+PdfSource = Union[bytes, memoryview]
+
+
+class PdfExtraction:
+    """Per-page text and timings of one extracted PDF."""
+
+    def __init__(self, pages: List[str], page_seconds: List[float], total_seconds: float):
+        self.pages = pages
+        self.page_seconds = page_seconds
+        self.total_seconds = total_seconds
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def text(self) -> str:
+        # Joined once here instead of growing a string page by page
+        return "".join(self.pages)
+
+
+def _extract_pages(doc: "fitz.Document", start: int, end: int) -> List[Tuple[str, float]]:
+    results = []
+    for page_num in range(start, end):
+        started = time.perf_counter()
+        text = doc.load_page(page_num).get_text()
+        results.append((text, time.perf_counter() - started))
+    return results
+
+
+def _extract_range_from_buffer(source: PdfSource, start: Optional[int] = None, end: Optional[int] = None) -> List[Tuple[str, float]]:
+    with fitz.open(stream=source, filetype="pdf") as doc:
+        return _extract_pages(doc, start or 0, doc.page_count if end is None else end)
+
+
+def _extract_range_from_shared_memory(shm_name: str, size: int, start: int, end: int) -> List[Tuple[str, float]]:
+    """Process pool worker: attaches to the parent's shared buffer and extracts one page range."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = shm.buf[:size]
+    try:
+        return _extract_range_from_buffer(buffer, start, end)
+    finally:
+        buffer.release()
+        shm.close()
+
+
+def _page_count(source: PdfSource) -> int:
+    with fitz.open(stream=source, filetype="pdf") as doc:
+        return doc.page_count
+
+
+async def extract_pdf(source: PdfSource) -> PdfExtraction:
+    """
+    Extracts per-page text from a PDF held in memory (bytes or a memoryview over an mmap).
+    Small documents are extracted on the CPU executor, large ones in the PDF process pool.
+
+    Raises:
+        OverloadedError: If the executor is at capacity.
+    """
+    started = time.perf_counter()
+    page_count = await executors.cpu.run(_page_count, source)
+
+    if page_count < settings.PDF_PARALLEL_MIN_PAGES:
+        results = await executors.cpu.run(_extract_range_from_buffer, source)
+    else:
+        # One slot per document; its page ranges are spread over all worker processes
+        async with executors.pdf.slot():
+            size = len(source)
+            # Copy the document once into shared memory; workers attach instead of receiving pickled bytes
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            try:
+                shm.buf[:size] = source
+                pages_per_range = max(settings.PDF_PAGES_PER_TASK, -(-page_count // executors.pdf.workers))
+                loop = asyncio.get_running_loop()
+                futures = [
+                    loop.run_in_executor(
+                        executors.pdf.pool, _extract_range_from_shared_memory, shm.name, size,
+                        start, min(start + pages_per_range, page_count)
+                    )
+                    for start in range(0, page_count, pages_per_range)
+                ]
+                results = [page for chunk in await asyncio.gather(*futures) for page in chunk]
+            finally:
+                shm.close()
+                shm.unlink()
+
+    extraction = PdfExtraction(
+        pages=[text for text, _ in results],
+        page_seconds=[seconds for _, seconds in results],
+        total_seconds=time.perf_counter() - started
+    )
+    slowest = max(range(page_count), key=extraction.page_seconds.__getitem__) if page_count else None
+    logger.info(
+        f"Extracted {page_count} pages in {extraction.total_seconds:.2f}s"
+        + (f" (slowest: page {slowest + 1}, {extraction.page_seconds[slowest]:.3f}s)" if slowest is not None else "")
+    )
+    return extraction
 # --- ---
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extracts and returns text from a PDF file using PyMuPDF."""
-    text = ""
+# --- Image Preparation ---
+# Images are checked from their header only, then downscaled and re-encoded once at upload
+# to the largest size the vision encoder uses. The result is sent to the engine inline as a
+# data URL, so questions never fetch the image over HTTP or decode the full-size original.
+
+SUPPORTED_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF"}
+
+
+class ImageValidationError(ValueError):
+    """Raised when an upload is not a usable image."""
+    pass
+
+
+class PreparedImage:
+    """An upload re-encoded at model resolution."""
+
+    def __init__(self, data: bytes, media_type: str, width: int, height: int, source_size: Tuple[int, int]):
+        self.data = data
+        self.media_type = media_type
+        self.width = width
+        self.height = height
+        self.source_size = source_size
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+ImageSource = Union[bytes, Path]
+
+
+def inspect_image(source: ImageSource) -> Image.Image:
+    """
+    Validates an image from its header alone (format and dimensions, no pixel decode).
+    Returns the lazily opened image. Raises ImageValidationError.
+    """
     try:
-        # Ensure the file exists before opening
-        if not Path(pdf_path).is_file():
-            logger.error(f"PDF file not found at path: {pdf_path}")
-            return ""
-
-        doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
-        doc.close() # Explicitly close the document
-        logger.info(f"Successfully extracted text from PDF: {pdf_path}")
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF {pdf_path}: {e}", exc_info=True)
-        return "" # Return empty string on error
-
-# Corrected Function Signature: Added import for Optional and Image.Image type hint
-def validate_and_load_image(image_path: str) -> Optional[Image.Image]:
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ImageValidationError("Uploaded file is not a valid image.") from e
+    if img.format not in SUPPORTED_IMAGE_FORMATS:
+        raise ImageValidationError(f"Unsupported image format: {img.format}.")
+    width, height = img.size
+    if width <= 0 or height <= 0 or width * height > settings.IMAGE_MAX_UPLOAD_PIXELS:
+        raise ImageValidationError(f"Image dimensions {width}x{height} are not supported.")
+    return img
+
+
+def prepare_image(source: ImageSource, max_side: int, jpeg_quality: int) -> PreparedImage:
     """
-    Attempts to open an image file.
-    Returns the PIL Image object or None if invalid.
+    Blocking: downscales an image (bytes or a file on disk) to fit `max_side` and re-encodes
+    it as JPEG. JPEGs that already fit are passed through untouched (no decode at all).
     """
+    img = inspect_image(source)
+    source_size = img.size
+    orientation = img.getexif().get(0x0112, 1) if img.format in ("JPEG", "WEBP", "TIFF") else 1
+    if img.format == "JPEG" and max(img.size) <= max_side and orientation == 1 and img.mode in ("RGB", "L"):
+        img.close()
+        data = source if isinstance(source, bytes) else Path(source).read_bytes()
+        return PreparedImage(data, "image/jpeg", img.width, img.height, source_size)
+
+    if img.format == "JPEG":
+        # Let the JPEG decoder skip straight to a reduced scale instead of decoding full size
+        img.draft("RGB", (max_side, max_side))
     try:
-         # Ensure the file exists before opening
-        if not Path(image_path).is_file():
-            logger.error(f"Image file not found at path: {image_path}")
-            return None
-
-        img = Image.open(image_path)
-        # Optionally force loading image data to catch truncated files etc.
-        img.load()
-        # Optionally convert to RGB if needed downstream, but validation is primary here
-        # img = img.convert("RGB")
-        logger.info(f"Successfully loaded image: {image_path}")
-        return img
-    except UnidentifiedImageError:
-        logger.warning(f"Cannot identify image file '{image_path}'. Not a valid image.")
-        return None
-    except Exception as e:
-        logger.error(f"Error loading image {image_path}: {e}", exc_info=True)
-        return None
-
-async def save_uploaded_file(file_bytes: bytes, upload_dir: Path, desired_filename: str) -> Path:
-    """Saves uploaded file bytes to a unique path in the upload directory."""
-    # Basic sanitization (consider a more robust library for production)
-    safe_base = "".join(c if c.isalnum() or c in ['-', '_', '.'] else '_' for c in Path(desired_filename).stem)
-    safe_ext = "".join(c if c.isalnum() or c == '.' else '' for c in Path(desired_filename).suffix)
-    # Limit length to prevent issues
-    safe_filename_base = f"{safe_base[:100]}{safe_ext[:10]}"
-
-    # Using UUID ensures uniqueness better than just relying on the original name
-    unique_filename = f"{uuid.uuid4().hex}_{safe_filename_base}"
-    file_path = upload_dir / unique_filename
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            # Flatten transparency onto white so the model sees what a viewer would
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.convert("RGB").save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+    except (OSError, SyntaxError, ValueError) as e:
+        # Truncated or corrupt pixel data only shows up while decoding
+        raise ImageValidationError("Uploaded image could not be decoded.") from e
+    return PreparedImage(buffer.getvalue(), "image/jpeg", img.width, img.height, source_size)
+# --- ---
+
+# --- Streaming Uploads ---
+# Multipart bodies are parsed as they arrive: file parts go straight to a temporary file
+# through async I/O and are hashed and size-checked chunk by chunk, so memory per upload
+# stays constant, the event loop never waits on the disk, and an oversized upload is
+# rejected as soon as it crosses the limit instead of after it has been read.
+
+try:
+    import multipart
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    multipart = None # type: ignore
+
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Raised for a malformed multipart upload."""
+    pass
+
+
+class UploadTooLargeError(UploadError):
+    """Raised as soon as an upload exceeds the size limit."""
+    pass
+
+
+class StreamedUpload:
+    """A file part of a multipart body, written to disk as it arrived."""
+
+    def __init__(self, path: Path, filename: str, content_type: str):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.digest = ""
+        self._hasher = new_hasher()
+
+    def update(self, data: bytes):
+        self._hasher.update(data)
+        self.size += len(data)
+
+    def finish(self):
+        self.digest = self._hasher.hexdigest()
+
+
+class StreamedForm:
+    """The text fields and files of a parsed multipart body. Call `cleanup` when done."""
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.files: Dict[str, StreamedUpload] = {}
 
+    async def cleanup(self):
+        for upload in self.files.values():
+            await anyio.Path(upload.path).unlink(missing_ok=True)
+
+
+def _upload_directory() -> Path:
+    directory = Path(settings.UPLOAD_TMP_DIR) if settings.UPLOAD_TMP_DIR else Path(tempfile.gettempdir())
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+async def receive_multipart(headers, stream: AsyncIterator[bytes], max_file_bytes: int, max_files: int = 1) -> StreamedForm:
+    """
+    Parses a multipart/form-data body from `stream`, writing file parts to temporary files.
+
+    Raises:
+        UploadTooLargeError: As soon as a file exceeds `max_file_bytes`.
+        UploadError: If the body is not valid multipart/form-data.
+    """
+    if multipart is None:
+        raise RuntimeError("The `python-multipart` library must be installed to receive uploads.")
+    content_type, params = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data body.")
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_file_bytes + MAX_FORM_FIELD_BYTES:
+        raise UploadTooLargeError(f"Upload exceeds the limit of {max_file_bytes // (1024 * 1024)} MB.")
+
+    # The parser's callbacks are synchronous, so they only record events; the async
+    # work (writing to disk) happens after each chunk has been fed in.
+    events: List[Tuple[str, Any]] = []
+    header_name = bytearray()
+    header_value = bytearray()
+    part_headers: Dict[bytes, bytes] = {}
+
+    def on_header_end():
+        part_headers[bytes(header_name).lower()] = bytes(header_value)
+        header_name.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+        events.append(("part", (options, part_headers.get(b"content-type", b""))))
+        part_headers.clear()
+
+    callbacks = {
+        "on_header_field": lambda data, start, end: header_name.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = multipart.MultipartParser(params[b"boundary"], callbacks)
+
+    form = StreamedForm()
+    directory = _upload_directory()
+    field_name = ""
+    field_data = bytearray()
+    upload: Optional[StreamedUpload] = None
+    output = None
     try:
-        # Ensure directory exists (though config should handle this)
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        with open(file_path, "wb") as f:
-            f.write(file_bytes)
-        logger.info(f"Saved uploaded file to: {file_path}")
-        return file_path
-    except OSError as e:
-        logger.error(f"Error saving file to {file_path}: {e}")
-        raise # Re-raise the exception to be caught by the service layer
+        async for chunk in stream:
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise UploadError(f"Malformed multipart body: {e}") from e
+            for kind, value in events:
+                if kind == "part":
+                    options, part_type = value
+                    if b"name" not in options:
+                        raise UploadError('A form part is missing its "name".')
+                    field_name = options[b"name"].decode("utf-8", "replace")
+                    if b"filename" in options:
+                        if len(form.files) >= max_files:
+                            raise UploadError(f"At most {max_files} file(s) per upload.")
+                        upload = StreamedUpload(
+                            directory / f"upload_{uuid.uuid4().hex}.part",
+                            options[b"filename"].decode("utf-8", "replace"),
+                            part_type.decode("latin-1")
+                        )
+                        form.files[field_name] = upload
+                        output = await anyio.open_file(upload.path, "wb")
+                elif kind == "data":
+                    if upload is None:
+                        field_data.extend(value)
+                        if len(field_data) > MAX_FORM_FIELD_BYTES:
+                            raise UploadError(f"Form field '{field_name}' is too large.")
+                    else:
+                        upload.update(value)
+                        if upload.size > max_file_bytes:
+                            raise UploadTooLargeError(f"Upload exceeds the limit of {max_file_bytes // (1024 * 1024)} MB.")
+                        await output.write(value)
+                elif kind == "end":
+                    if upload is None:
+                        form.fields[field_name] = field_data.decode("utf-8", "replace")
+                        field_data.clear()
+                    else:
+                        await output.aclose()
+                        output = None
+                        upload.finish()
+                        logger.info(f"Received upload '{upload.filename}' ({upload.size} bytes) at {upload.path}")
+                        upload = None
+            events.clear()
+        parser.finalize()
+        if upload is not None:
+            raise UploadError("Upload ended before the file was complete.")
+    except BaseException:
+        if output is not None:
+            await output.aclose()
+        await form.cleanup()
+        raise
+    return form
+
 
+async def receive_body(stream: AsyncIterator[bytes], max_bytes: int) -> Path:
+    """
+    Writes a raw (non-multipart) request body to a temporary file and returns its path;
+    the caller deletes it. Raises UploadTooLargeError as soon as it exceeds `max_bytes`.
+    """
+    path = _upload_directory() / f"upload_{uuid.uuid4().hex}.part"
+    size = 0
+    try:
+        async with await anyio.open_file(path, "wb") as output:
+            async for chunk in stream:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes // (1024 * 1024)} MB.")
+                await output.write(chunk)
+    except BaseException:
+        await anyio.Path(path).unlink(missing_ok=True)
+        raise
+    return path
+# --- ---
@@ -0,0 +1,313 @@
+"""
+Load benchmark for the backend API, driven in-process against `app.main:app`.
+
+The LLM and TTS models are replaced by the fake backends (LLM_BACKEND=fake, TTS_BACKEND=fake)
+with configurable latency, so the numbers measure the server itself: request handling,
+scheduling, caching and everything that can block the event loop.
+
+Usage (from the backend directory):
+    python benchmarks/bench.py                                 # all scenarios, default sweep
+    python benchmarks/bench.py --scenarios text,pdf --concurrency 1,8,32
+    python benchmarks/bench.py --save-baseline                 # store results as the new baseline
+    python benchmarks/bench.py --compare                       # fail if p95 regressed vs. the baseline
+"""
+import argparse
+import asyncio
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SCENARIOS = ("text", "pdf", "image", "tts")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated numbers of concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=5, help="Iterations per virtual user")
+    parser.add_argument("--questions", type=int, default=3, help="Questions per iteration in document sessions")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Fake LLM time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Fake LLM time per output token (s)")
+    parser.add_argument("--tts-seconds-per-char", type=float, default=0.0005, help="Fake TTS synthesis time per character (s)")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="Pages of the generated PDF")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the answer cache enabled (questions are unique either way)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to the baseline file")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative p95/throughput regression")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace):
+    """Settings are read at import time, so the fakes must be configured before the app is imported."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "TTS_BACKEND": "fake",
+        "MODEL_LOADING": "lazy",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.first_token_delay),
+        "FAKE_LLM_TOKEN_DELAY": str(args.token_delay),
+        "FAKE_TTS_SECONDS_PER_CHAR": str(args.tts_seconds_per_char),
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "TTS_CACHE_ENABLED": "false",
+        "SESSION_SWEEP_INTERVAL_SECONDS": "0",
+    })
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+# --- Fixtures ---
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = f"Page {number + 1}. " + "The innovation center opens at nine and closes at six. " * 20
+        page.insert_textbox(fitz.Rect(48, 48, 560, 800), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_image(seed: int) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (seed % 256, (seed * 7) % 256, 128)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+# --- Measurements ---
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falling back to the peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires: a direct view of event-loop blocking."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def timed(self, operation: str, call: Callable):
+        started = time.perf_counter()
+        response = await call()
+        self.latencies.setdefault(operation, []).append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+        return response
+
+
+# --- Scenarios ---
+# Each scenario runs one iteration of a virtual user; `primary` is the operation whose
+# latency and throughput represent the scenario.
+
+async def run_text(client, recorder: Recorder, user: int, iteration: int, args, fixtures):
+    await recorder.timed("ask", lambda: client.post("/api/v1/chat/ask", data={"question": f"Question {user}-{iteration}?"}))
+
+
+async def _document_session(client, recorder: Recorder, user: int, iteration: int, args, mode: str, filename: str, data: bytes, content_type: str):
+    response = await recorder.timed("upload", lambda: client.post(
+        "/api/v1/chat/upload", data={"mode": mode}, files={"file": (filename, data, content_type)}
+    ))
+    if response.status_code != 200:
+        return
+    session_id = response.json()["session_id"]
+    for number in range(args.questions):
+        await recorder.timed("ask", lambda: client.post(
+            "/api/v1/chat/ask", data={"question": f"Question {user}-{iteration}-{number}?", "session_id": session_id}
+        ))
+    await recorder.timed("forget", lambda: client.post("/api/v1/chat/forget", data={"session_id": session_id}))
+
+
+async def run_pdf(client, recorder: Recorder, user: int, iteration: int, args, fixtures):
+    await _document_session(client, recorder, user, iteration, args, "upload_pdf", "bench.pdf", fixtures["pdf"], "application/pdf")
+
+
+async def run_image(client, recorder: Recorder, user: int, iteration: int, args, fixtures):
+    # A distinct image per user keeps the content cache from turning every upload into a hit
+    image = fixtures["images"][user % len(fixtures["images"])]
+    await _document_session(client, recorder, user, iteration, args, "upload_image", "bench.jpg", image, "image/jpeg")
+
+
+async def run_tts(client, recorder: Recorder, user: int, iteration: int, args, fixtures):
+    started = time.perf_counter()
+    response = await recorder.timed("ask", lambda: client.post(
+        "/api/v1/chat/ask", data={"question": f"Please read this out {user}-{iteration}.", "tts": "true"}
+    ))
+    task_id = response.json().get("tts_task_id") if response.status_code == 200 else None
+    if not task_id:
+        recorder.errors["audio"] = recorder.errors.get("audio", 0) + 1
+        return
+    while True:
+        status = await recorder.timed("audio_status", lambda: client.get(f"/api/v1/tts/audio_status/{task_id}"))
+        if status.status_code != 200 or status.json()["status"] != "processing":
+            break
+        await asyncio.sleep(0.02)
+    recorder.latencies.setdefault("ask_to_audio", []).append(time.perf_counter() - started)
+
+
+RUNNERS = {"text": run_text, "pdf": run_pdf, "image": run_image, "tts": run_tts}
+PRIMARY = {"text": "ask", "pdf": "ask", "image": "ask", "tts": "ask_to_audio"}
+
+
+async def run_scenario(app, scenario: str, concurrency: int, args, fixtures) -> Dict[str, Any]:
+    import httpx
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    gc.collect()
+    rss_before = rss_bytes()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        async def user(number: int):
+            for iteration in range(args.iterations):
+                await RUNNERS[scenario](client, recorder, number, iteration, args, fixtures)
+
+        with LoopLagMonitor() as lag:
+            started = time.perf_counter()
+            await asyncio.gather(*(user(number) for number in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    gc.collect()
+    rss_after = rss_bytes()
+
+    primary = recorder.latencies.get(PRIMARY[scenario], [])
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(primary),
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": len(primary) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(primary, 50) * 1000,
+        "p95_ms": percentile(primary, 95) * 1000,
+        "p99_ms": percentile(primary, 99) * 1000,
+        "operations_p95_ms": {op: percentile(values, 95) * 1000 for op, values in recorder.latencies.items()},
+        "loop_lag_p99_ms": percentile(lag.lags, 99) * 1000,
+        "loop_lag_max_ms": max(lag.lags, default=0.0) * 1000,
+        "rss_growth_mb": (rss_after - rss_before) / (1024 * 1024),
+    }
+
+
+# --- Reporting ---
+def print_header():
+    header = f"{'scenario':<8} {'conc':>5} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'lag p99':>8} {'lag max':>8} {'rss +MB':>8}"
+    print(header)
+    print("-" * len(header))
+
+
+def print_row(r: Dict[str, Any]):
+    print(
+        f"{r['scenario']:<8} {r['concurrency']:>5} {r['requests']:>6} {r['errors']:>4} {r['throughput_rps']:>8.1f} "
+        f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['loop_lag_p99_ms']:>8.1f} "
+        f"{r['loop_lag_max_ms']:>8.1f} {r['rss_growth_mb']:>8.1f}",
+        flush=True
+    )
+
+
+def compare(results: List[Dict[str, Any]], config: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Prints the change against the baseline per run. Returns False if anything regressed."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    if baseline.get("config") != config:
+        print("\nNote: baseline was recorded with different settings; comparison is indicative only.")
+    ok = True
+    print(f"\n{'scenario':<8} {'conc':>5} {'rps':>16} {'p95 ms':>18}")
+    for r in results:
+        base = previous.get((r["scenario"], r["concurrency"]))
+        if base is None:
+            print(f"{r['scenario']:<8} {r['concurrency']:>5}  (no baseline)")
+            continue
+        rps_change = (r["throughput_rps"] / base["throughput_rps"] - 1) if base["throughput_rps"] else 0.0
+        p95_change = (r["p95_ms"] / base["p95_ms"] - 1) if base["p95_ms"] else 0.0
+        regressed = rps_change < -tolerance or p95_change > tolerance
+        ok &= not regressed
+        print(
+            f"{r['scenario']:<8} {r['concurrency']:>5} {r['throughput_rps']:>8.1f} ({rps_change:+6.1%}) "
+            f"{r['p95_ms']:>9.1f} ({p95_change:+6.1%}){'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+async def main(args: argparse.Namespace) -> int:
+    configure_environment(args)
+    import logging
+    logging.disable(logging.WARNING) # Request logging would dominate the measurement
+    from app.main import app
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        return 2
+    levels = [int(level) for level in args.concurrency.split(",")]
+    config = {
+        "iterations": args.iterations, "questions": args.questions, "pdf_pages": args.pdf_pages,
+        "first_token_delay": args.first_token_delay, "token_delay": args.token_delay,
+        "tts_seconds_per_char": args.tts_seconds_per_char, "answer_cache": args.answer_cache,
+    }
+    fixtures = {"pdf": make_pdf(args.pdf_pages), "images": [make_image(seed) for seed in range(max(levels))]}
+
+    results = []
+    print_header()
+    async with app.router.lifespan_context(app):
+        for scenario in scenarios:
+            for level in levels:
+                results.append(await run_scenario(app, scenario, level, args, fixtures))
+                print_row(results[-1])
+
+    report = {"config": config, "python": platform.python_version(), "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {args.baseline}")
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+            return 2
+        if not compare(results, config, json.loads(args.baseline.read_text()), args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
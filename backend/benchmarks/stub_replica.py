@@ -0,0 +1,92 @@
+"""
+Stub OpenAI-compatible LLM server for trying out replica routing without GPUs.
+
+Serves /v1/chat/completions (streaming and not), /tokenize and /health with the fake
+engine's canned answers and configurable latency. Start a few on different ports and
+point the backend at them:
+
+    python benchmarks/stub_replica.py --port 8101 &
+    python benchmarks/stub_replica.py --port 8102 &
+    LLM_BACKEND=openai LLM_REPLICA_URLS=http://127.0.0.1:8101,http://127.0.0.1:8102 \\
+        LLM_ROUTING=session_affinity python run.py
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.llm import FakeLLMEngine
+
+
+def create_app(engine: FakeLLMEngine, name: str) -> FastAPI:
+    app = FastAPI(title=f"Stub LLM replica {name}")
+    app.state.requests = 0
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "replica": name, "requests": app.state.requests}
+
+    @app.post("/tokenize")
+    async def tokenize(request: Request):
+        body = await request.json()
+        tokens = await engine.encode(body.get("prompt", ""))
+        return {"tokens": tokens, "count": len(tokens)}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        messages = body["messages"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        prompt_tokens = FakeLLMEngine._prompt_tokens(messages)
+
+        if not body.get("stream"):
+            answer = "".join([delta async for delta in engine.stream(messages, completion_id)])
+            completion_tokens = len(answer.split(" "))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+                "replica": name,
+            }
+
+        async def events():
+            completion_tokens = 0
+            async for delta in engine.stream(messages, completion_id):
+                completion_tokens += 1
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens}
+                yield f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"X-Replica": name})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between tokens")
+    args = parser.parse_args()
+    engine = FakeLLMEngine(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+    uvicorn.run(create_app(engine, f"{args.host}:{args.port}"), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+
+# Fake model backends and lazy loading, set before the app's settings are read
+os.environ.update({
+    "LLM_BACKEND": "fake",
+    "TTS_BACKEND": "fake",
+    "STT_BACKEND": "fake",
+    "MODEL_LOADING": "lazy",
+    "FAKE_LLM_FIRST_TOKEN_DELAY": "0",
+    "FAKE_LLM_TOKEN_DELAY": "0",
+    "FAKE_TTS_SECONDS_PER_CHAR": "0",
+})
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client(anyio_backend):
+    """An HTTP client for the app, with its lifespan (startup and shutdown) around the test."""
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
@@ -0,0 +1,106 @@
+"""Test doubles shared by the test modules."""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    """
+    Minimal in-process stand-in for a `redis.asyncio` client (the subset used by
+    RedisSessionStore), so tests exercise the Redis code path without a server.
+    Expiry follows `time.monotonic`; `round_trips` counts awaited commands and pipelines.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self.round_trips = 0
+        self.closed = False
+
+    def _alive(self, key: str) -> bool:
+        item = self._data.get(key)
+        if item is None:
+            return False
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return False
+        return True
+
+    # --- Commands (synchronous here, awaited through the wrappers below or a pipeline) ---
+    def _get(self, key: str) -> Optional[bytes]:
+        return self._data[key][0] if self._alive(key) else None
+
+    def _set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        self._data[key] = (value.encode("utf-8"), time.monotonic() + ex if ex else None)
+        return True
+
+    def _exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    def _expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._data[key] = (self._data[key][0], time.monotonic() + seconds)
+        return True
+
+    def _delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def _sadd(self, key: str, *members: str) -> int:
+        members_set = self._data.setdefault(key, (set(), None))[0]
+        before = len(members_set)
+        members_set.update(member.encode("utf-8") for member in members)
+        return len(members_set) - before
+
+    def _srem(self, key: str, *members: str) -> int:
+        members_set = self._data.get(key, (set(), None))[0]
+        before = len(members_set)
+        members_set.difference_update(member.encode("utf-8") for member in members)
+        return before - len(members_set)
+
+    def _smembers(self, key: str) -> set:
+        return set(self._data.get(key, (set(), None))[0])
+    # --- ---
+
+    def __getattr__(self, name: str):
+        command = getattr(type(self), f"_{name}", None)
+        if command is None:
+            raise AttributeError(name)
+
+        async def run(*args, **kwargs):
+            self.round_trips += 1
+            return command(self, *args, **kwargs)
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def keys(self) -> List[str]:
+        """Live keys (synchronous, for assertions)."""
+        return [key for key in list(self._data) if self._alive(key)]
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakePipeline:
+    """Buffers commands and runs them in one round trip on `execute`."""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if getattr(FakeRedis, f"_{name}", None) is None:
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        if commands:
+            self.client.round_trips += 1
+        return [getattr(FakeRedis, f"_{name}")(self.client, *args, **kwargs) for name, args, kwargs in commands]
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from app.core import answer_cache as answer_cache_module
+from app.core.answer_cache import AnswerCache
+from app.services import chat_service
+
+pytestmark = pytest.mark.anyio
+
+# Unit vectors standing in for question embeddings; the reworded question has cosine 0.95 to the first
+VECTORS = {
+    "what is the refund policy": np.array([1.0, 0.0], dtype=np.float32),
+    "whats the refund policy": np.array([0.95, np.sqrt(1 - 0.95 ** 2)], dtype=np.float32),
+    "who wrote this": np.array([0.0, 1.0], dtype=np.float32),
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache_module.time, "time", clock)
+    return clock
+
+
+def _semantic_cache(monkeypatch, threshold: float) -> AnswerCache:
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic=True, threshold=threshold)
+
+    async def embed(normalized):
+        return VECTORS[normalized]
+
+    monkeypatch.setattr(cache, "_embed", embed)
+    return cache
+
+
+async def test_exact_match_ignores_case_spacing_and_trailing_punctuation():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic=False, threshold=0.9)
+    await cache.store("What is the refund policy?", "doc-a", "30 days.")
+
+    assert await cache.lookup("  what IS the refund   policy", "doc-a") == "30 days."
+    assert await cache.lookup("What is the refund policy?", "doc-b") is None # Other documents
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic=False, threshold=0.9)
+    await cache.store("Who wrote this?", "", "Sarah.")
+
+    clock.now += 59
+    assert await cache.lookup("Who wrote this?", "") == "Sarah."
+    clock.now += 2
+    assert await cache.lookup("Who wrote this?", "") is None
+    assert cache.stats()["entries"] == 0
+
+
+async def test_least_recently_used_entries_are_evicted_beyond_max_entries():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60, semantic=False, threshold=0.9)
+    await cache.store("one", "", "1")
+    await cache.store("two", "", "2")
+    assert await cache.lookup("one", "") == "1" # "two" is now the least recently used
+
+    await cache.store("three", "", "3")
+
+    assert await cache.lookup("two", "") is None
+    assert await cache.lookup("one", "") == "1"
+    assert await cache.lookup("three", "") == "3"
+    assert cache.stats()["entries"] == 2
+
+
+async def test_semantic_match_above_the_threshold(monkeypatch):
+    cache = _semantic_cache(monkeypatch, threshold=0.92)
+    await cache.store("What is the refund policy?", "doc", "30 days.")
+
+    assert await cache.lookup("Whats the refund policy?", "doc") == "30 days."
+    assert await cache.lookup("Who wrote this?", "doc") is None
+    assert await cache.lookup("Whats the refund policy?", "other-doc") is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+async def test_semantic_match_below_the_threshold_is_a_miss(monkeypatch):
+    cache = _semantic_cache(monkeypatch, threshold=0.97)
+    await cache.store("What is the refund policy?", "doc", "30 days.")
+
+    assert await cache.lookup("Whats the refund policy?", "doc") is None
+    assert cache.stats()["semantic_hits"] == 0
+
+
+async def test_use_cache_false_bypasses_the_cache(monkeypatch):
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, semantic=False, threshold=0.9)
+    monkeypatch.setattr(chat_service, "answer_cache", cache)
+    await cache.store("Hello?", "", "Cached hello.")
+
+    assert await chat_service.get_answer("Hello?") == "Cached hello."
+    assert await chat_service.get_answer("Hello?", use_cache=False) == "This is a fake answer to: Hello?"
+    assert cache.stats()["hits"] == 1 and cache.stats()["bypassed"] == 1
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.core import executors
+from app.core.llm import FakeLLMEngine
+from app.core.model_registry import registry
+from app.services import chat_service
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def slow_engine():
+    """A fake engine that takes 50 ms per token, installed for the duration of the test."""
+    engine = FakeLLMEngine(first_token_delay=0.01, token_delay=0.05, reply="one two three four five")
+    previous = registry.peek("llm")
+    registry.set_instance("llm", engine)
+    yield engine
+    registry.set_instance("llm", previous)
+
+
+async def test_stream_answer_yields_the_first_token_before_decoding_finishes(slow_engine):
+    started = time.perf_counter()
+    arrivals = []
+    async for delta in chat_service.stream_answer("When?", use_cache=False):
+        arrivals.append((time.perf_counter() - started, delta))
+
+    assert "".join(delta for _, delta in arrivals) == "one two three four five"
+    first_token_seconds, total_seconds = arrivals[0][0], arrivals[-1][0]
+    assert first_token_seconds < 0.1
+    assert total_seconds >= 0.2 # Four more tokens, 50 ms apart
+
+
+async def test_ask_stream_emits_tokens_then_the_full_answer(client):
+    response = await client.post("/api/v1/chat/ask_stream", data={"question": "Hello?", "no_cache": "true"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    *tokens, done = [json.loads(line) for line in response.text.splitlines()]
+    assert tokens and all(event["type"] == "token" for event in tokens)
+    assert done["type"] == "done"
+    assert done["answer"] == "".join(event["text"] for event in tokens) == "This is a fake answer to: Hello?"
+
+
+async def test_ask_returns_the_same_answer_in_one_piece(client):
+    response = await client.post("/api/v1/chat/ask", data={"question": "Hello?", "no_cache": "true"})
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == "This is a fake answer to: Hello?"
+
+
+class RecordingEngine(FakeLLMEngine):
+    """Records when each question starts and gets its first token; "Overloaded?" is rejected."""
+
+    def __init__(self, **delays):
+        super().__init__(**delays)
+        self.events = []
+        self.active = 0
+        self.finished = 0
+
+    async def stream(self, messages, request_id, route_key=None):
+        question = messages[-1]["content"][-1]["text"]
+        self.events.append(("start", question))
+        self.active += 1
+        try:
+            if question == "Overloaded?":
+                raise executors.OverloadedError("The LLM is busy.", retry_after=3)
+            first = True
+            async for delta in super().stream(messages, request_id, route_key):
+                if first:
+                    self.events.append(("first token", question))
+                    first = False
+                yield delta
+            self.finished += 1
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def recording_engine():
+    engine = RecordingEngine(first_token_delay=0.02, token_delay=0.01)
+    previous = registry.peek("llm")
+    registry.set_instance("llm", engine)
+    yield engine
+    registry.set_instance("llm", previous)
+
+
+async def _batch(questions):
+    return [result async for result in chat_service.answer_batch(questions, use_cache=False)]
+
+
+async def test_batch_prefills_the_leader_before_the_rest(recording_engine):
+    await _batch(["First?", "Second?", "Third?"])
+
+    # Only the leader starts until its first token, i.e. until the shared prefix is cached
+    (kind, leader), second = recording_engine.events[:2]
+    assert kind == "start"
+    assert second == ("first token", leader)
+    assert sorted(question for kind, question in recording_engine.events if kind == "start") == [
+        "First?", "Second?", "Third?"
+    ]
+
+
+async def test_batch_results_carry_the_index_of_their_question(recording_engine):
+    # Longer questions get longer fake answers, so results finish out of order
+    questions = ["A much longer question that takes a while to answer?", "Short?", "Medium length question?"]
+
+    results = await _batch(questions)
+
+    assert [result.question for result in results] != questions
+    for result in results:
+        assert result.question == questions[result.index]
+        assert result.answer == f"This is a fake answer to: {questions[result.index]}"
+        assert result.error is None
+
+
+async def test_overloaded_batch_question_reports_retry_after(recording_engine):
+    results = {result.index: result for result in await _batch(["Overloaded?", "Fine?"])}
+
+    assert results[0].answer is None
+    assert (results[0].error, results[0].retry_after) == ("The LLM is busy.", 3)
+    assert results[1].answer == "This is a fake answer to: Fine?"
+    assert results[1].retry_after is None
+
+
+async def test_batch_stops_generating_when_the_consumer_goes_away(recording_engine):
+    batch = chat_service.answer_batch(["Short?"] + ["A question with a long answer, word by word?" * 5] * 3, use_cache=False)
+
+    first = await batch.__anext__()
+    assert first.question == "Short?"
+    assert recording_engine.active == 3
+    await batch.aclose()
+    await asyncio.sleep(0.01)
+
+    assert recording_engine.active == 0
+    assert recording_engine.finished == 1
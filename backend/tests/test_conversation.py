@@ -0,0 +1,85 @@
+import pytest
+
+from app.core import llm # Registers the (fake) engine that counts tokens
+from app.core.config import settings
+from app.core.conversation import MESSAGE_OVERHEAD_TOKENS, ConversationHistory, ConversationStore, Turn
+
+pytestmark = pytest.mark.anyio
+
+
+def _history(turns: int, tokens_per_turn: int = 10) -> ConversationHistory:
+    history = ConversationHistory()
+    for i in range(turns):
+        history.append(Turn(f"question {i}", f"answer {i}", tokens_per_turn))
+    return history
+
+
+def _questions(messages):
+    return [message["content"][0]["text"] for message in messages if message["role"] == "user"]
+
+
+async def test_history_within_the_budget_is_sent_whole():
+    history = _history(5)
+
+    messages, dropped = history.fit(budget_tokens=50)
+
+    assert dropped == 0
+    assert [message["role"] for message in messages] == ["user", "assistant"] * 5
+    assert _questions(messages) == [f"question {i}" for i in range(5)]
+
+
+async def test_overflow_compacts_to_the_ratio_of_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_COMPACT_RATIO", 0.5)
+    history = _history(10) # 100 tokens
+
+    messages, dropped = history.fit(budget_tokens=80)
+
+    # Oldest turns go until at most 40 tokens are left, not just until it fits
+    assert dropped == 6
+    assert _questions(messages) == [f"question {i}" for i in range(6, 10)]
+    assert history.window_tokens == 40
+
+
+async def test_the_window_stays_put_until_the_next_overflow(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_COMPACT_RATIO", 0.5)
+    history = _history(10)
+    first, _ = history.fit(budget_tokens=80)
+
+    # Four more turns fit into the room compaction left, each prompt extending the last one
+    for i in range(10, 14):
+        history.append(Turn(f"question {i}", f"answer {i}", 10))
+        messages, dropped = history.fit(budget_tokens=80)
+        assert dropped == 6
+        assert messages[:len(first)] == first
+
+    history.append(Turn("question 14", "answer 14", 10))
+    messages, dropped = history.fit(budget_tokens=80)
+    assert dropped == 11
+    assert _questions(messages) == [f"question {i}" for i in range(11, 15)]
+
+
+async def test_history_is_limited_to_max_turns(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 3)
+    history = _history(5)
+
+    messages, dropped = history.fit(budget_tokens=1000)
+
+    assert dropped == 2
+    assert _questions(messages) == ["question 2", "question 3", "question 4"]
+
+
+async def test_store_counts_each_turn_once_and_forgets_discarded_sessions():
+    store = ConversationStore()
+
+    await store.append("s1", "one two three", "four five")
+
+    # The fake engine counts words as tokens
+    turn_tokens = 5 + 2 * MESSAGE_OVERHEAD_TOKENS
+    assert store.has_history("s1") and not store.has_history("s2")
+    assert _questions(store.fit("s1", budget_tokens=turn_tokens)[0]) == ["one two three"]
+    assert store.fit("s1", budget_tokens=turn_tokens - 1) == ([], 1)
+    assert store.fit("s1", budget_tokens=-5) == ([], 1) # A negative budget fits nothing
+    assert store.fit("s2", budget_tokens=100) == ([], 0)
+
+    store.discard("s1")
+    assert not store.has_history("s1")
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import executors
+from app.core.executors import MAX_RETRY_AFTER_SECONDS, BoundedExecutor, OverloadedError
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_jobs_beyond_workers_and_queue_are_rejected():
+    executor = BoundedExecutor("test", workers=1, max_queued=1)
+    release = asyncio.Event()
+
+    async def job():
+        async with executor.slot():
+            await release.wait()
+
+    running = asyncio.create_task(job())
+    queued = asyncio.create_task(job())
+    await asyncio.sleep(0)
+    assert (executor.active, executor.waiting) == (1, 1)
+
+    with pytest.raises(OverloadedError) as rejected:
+        async with executor.slot():
+            pass
+    assert rejected.value.retry_after >= 1
+    assert executor.rejected == 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert executor.completed == 2
+    async with executor.slot(): # Capacity is back
+        pass
+
+
+async def test_retry_after_grows_with_the_backlog_and_is_capped():
+    executor = BoundedExecutor("test", workers=2, max_queued=100)
+    executor._avg_seconds = 3.0
+    executor.waiting = 3
+    assert executor.retry_after() == 6 # (3 waiting + 1) * 3 s / 2 workers
+
+    executor.waiting = 1000
+    assert executor.retry_after() == MAX_RETRY_AFTER_SECONDS
+
+
+async def test_run_uses_the_dedicated_pool():
+    executor = BoundedExecutor("test", workers=2, max_queued=0, pool_factory=executors._thread_pool("test"))
+    try:
+        assert await executor.run(time.sleep, 0) is None
+        assert executor.stats()["completed"] == 1
+    finally:
+        executor.shutdown()
+
+
+async def test_saturated_llm_answers_503_with_retry_after(client, monkeypatch):
+    llm = executors.llm
+    monkeypatch.setattr(llm, "active", llm.workers)
+    monkeypatch.setattr(llm, "waiting", llm.max_queued)
+
+    response = await client.post("/api/v1/chat/ask", data={"question": "Hello?"})
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "busy" in response.json()["detail"]
+
+
+async def test_saturated_llm_rejects_stream_before_it_starts(client, monkeypatch):
+    llm = executors.llm
+    monkeypatch.setattr(llm, "active", llm.workers + llm.max_queued)
+
+    response = await client.post("/api/v1/chat/ask_stream", data={"question": "Hello?"})
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
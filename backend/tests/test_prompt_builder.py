@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from app.core import llm, prompt_builder # llm registers the (fake) engine that counts tokens
+from app.core.prompt_builder import FORMAT_OVERHEAD_TOKENS, _fair_shares, select_document_context
+from app.core.retrieval import VectorIndex
+
+pytestmark = pytest.mark.anyio
+
+
+def _pdf(document_id: str, pages, index=None):
+    # The fake engine counts whitespace-separated words as tokens
+    return {
+        "document_id": document_id, "kind": "pdf", "filename": f"{document_id}.pdf",
+        "pages": pages, "text": "".join(pages), "index": index,
+    }
+
+
+@pytest.fixture
+def session_id(request):
+    yield request.node.name
+    prompt_builder.token_counts.discard(request.node.name)
+
+
+async def test_fair_shares_give_small_demands_in_full_and_split_the_rest():
+    assert _fair_shares({0: 10, 1: 100, 2: 100}, 110) == {0: 10, 1: 50, 2: 50}
+    assert _fair_shares({0: 10, 1: 20}, 100) == {0: 10, 1: 20}
+    assert _fair_shares({0: 10, 1: 20}, 0) == {0: 0, 1: 0}
+
+
+async def test_a_document_that_fits_is_sent_whole(session_id):
+    document = _pdf("a", ["one two three ", "four five "])
+
+    selection = await select_document_context(session_id, [document], "question?", budget_tokens=100)
+
+    assert selection.text == document["text"]
+    assert selection.num_tokens == 5 + FORMAT_OVERHEAD_TOKENS
+    assert selection.dropped == []
+
+
+async def test_a_long_document_is_cut_after_the_last_page_that_fits(session_id):
+    document = _pdf("a", ["one two three ", "four five ", "six seven eight nine "])
+
+    selection = await select_document_context(session_id, [document], "question?", budget_tokens=FORMAT_OVERHEAD_TOKENS + 6)
+
+    assert selection.text == "one two three four five "
+    assert selection.num_tokens <= selection.budget_tokens
+    assert selection.dropped == ["a.pdf: page 3 of 3"]
+    assert selection.dropped_tokens == 4
+
+
+async def test_documents_share_the_budget_fairly_under_their_headings(session_id):
+    small = _pdf("small", ["tiny "])
+    large = _pdf("large", [f"page {i} words " for i in range(20)])
+    budget = FORMAT_OVERHEAD_TOKENS + 2 * FORMAT_OVERHEAD_TOKENS + 1 + 9
+
+    selection = await select_document_context(session_id, [small, large], "question?", budget)
+
+    assert selection.text.startswith("=== Document: small.pdf ===\ntiny")
+    assert "=== Document: large.pdf ===\npage 0 words page 1 words page 2 words" in selection.text
+    assert selection.dropped == ["large.pdf: pages 4-20 of 20"]
+    assert selection.num_tokens <= budget
+
+
+async def test_indexed_documents_keep_their_most_relevant_chunks(session_id, monkeypatch):
+    chunks = ["alpha beta", "gamma delta", "epsilon zeta", "eta theta"]
+    # Chunk i scores vectors[i] @ query: chunks 2, 0, 3, 1 from best to worst
+    index = VectorIndex(chunks, np.array([[0.8], [0.1], [0.9], [0.5]], dtype=np.float32))
+
+    async def embed_query(question):
+        return np.array([1.0], dtype=np.float32)
+
+    monkeypatch.setattr(prompt_builder.retrieval, "embed_query", embed_query)
+    budget = FORMAT_OVERHEAD_TOKENS + 2 + FORMAT_OVERHEAD_TOKENS + 2
+
+    selection = await select_document_context(session_id, [_pdf("a", ["..."], index=index)], "question?", budget)
+
+    # The two best chunks, in document order
+    assert selection.text == f"alpha beta{prompt_builder.CHUNK_SEPARATOR}epsilon zeta"
+    assert selection.dropped == ["a.pdf: 2 relevant chunks"]
+    assert selection.dropped_tokens == 4
+
+
+async def test_token_counts_are_memoized_per_session(session_id, monkeypatch):
+    counted = []
+    count_tokens = prompt_builder.count_tokens
+
+    async def counting(texts):
+        counted.extend(texts)
+        return await count_tokens(texts)
+
+    monkeypatch.setattr(prompt_builder, "count_tokens", counting)
+    document = _pdf("a", ["one two ", "three "])
+
+    await select_document_context(session_id, [document], "first?", budget_tokens=100)
+    await select_document_context(session_id, [document], "second?", budget_tokens=100)
+
+    assert counted == document["pages"]
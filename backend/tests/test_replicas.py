@@ -0,0 +1,148 @@
+import pytest
+
+from app.core import llm
+from app.core.config import settings
+from app.core.model_registry import ModelUnavailableError
+from app.core.replicas import ReplicaRouter, ReplicaUnavailableError
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "Hello?"}]
+
+
+class StubReplica:
+    def __init__(self, name: str, down: bool = False, fail_after: int = -1):
+        self.name = name
+        self.down = down
+        self.fail_after = fail_after # Deltas emitted before failing mid-stream (-1: never)
+        self.requests = 0
+
+    async def encode(self, text: str):
+        if self.down:
+            raise ReplicaUnavailableError(f"{self.name} is down")
+        return [len(text)]
+
+    async def stream(self, messages, request_id):
+        self.requests += 1
+        if self.down:
+            raise ReplicaUnavailableError(f"{self.name} is down")
+        for emitted, delta in enumerate((self.name, "!")):
+            if emitted == self.fail_after:
+                raise ReplicaUnavailableError(f"{self.name} dropped the stream")
+            yield delta
+
+    async def generate_batch(self, messages_list):
+        self.requests += len(messages_list)
+        if self.down:
+            return [ReplicaUnavailableError(f"{self.name} is down")] * len(messages_list)
+        return [self.name] * len(messages_list)
+
+    def shutdown(self):
+        pass
+
+
+async def _answer(router, route_key=None):
+    return "".join([delta async for delta in router.stream(MESSAGES, "request", route_key)])
+
+
+async def test_least_loaded_sends_requests_to_the_idle_replica():
+    router = ReplicaRouter([StubReplica("busy"), StubReplica("idle")])
+    router.inflight[0] = 1 # "busy" already serves a request
+
+    assert router.pick() == 1
+    router.inflight[0] = 0
+    assert sorted(router.pick() for _ in range(4)) == [0, 0, 1, 1] # Ties take turns
+
+
+async def test_session_affinity_keeps_a_session_on_one_replica():
+    router = ReplicaRouter([StubReplica(str(i)) for i in range(4)], policy="session_affinity")
+
+    for session_id in ("s1", "s2", "s3"):
+        picks = {router.pick(session_id) for _ in range(5)}
+        assert len(picks) == 1
+    # A different set of sessions spreads over the replicas
+    assert len({router.pick(f"session-{i}") for i in range(40)}) > 1
+
+
+async def test_session_affinity_moves_only_sessions_of_a_failed_replica():
+    router = ReplicaRouter([StubReplica(str(i)) for i in range(3)], policy="session_affinity")
+    before = {f"s{i}": router.pick(f"s{i}") for i in range(30)}
+
+    router._mark_failed(0, ReplicaUnavailableError("down"))
+    after = {session_id: router.pick(session_id) for session_id in before}
+
+    assert all(after[s] != 0 for s in before)
+    assert all(after[s] == before[s] for s in before if before[s] != 0)
+
+
+async def test_failed_request_is_retried_on_another_replica_and_the_failure_cools_down():
+    down, up = StubReplica("down", down=True), StubReplica("up")
+    router = ReplicaRouter([down, up], cooldown_seconds=60)
+    router.inflight[1] = 1 # Make least loaded try "down" first
+
+    assert await _answer(router) == "up!"
+    assert router.failures == [1, 0]
+    assert router.inflight == [0, 1]
+
+    router.inflight[1] = 0
+    assert await _answer(router) == "up!"
+    assert down.requests == 1 # Skipped during its cooldown
+    assert [replica["available"] for replica in router.stats()] == [False, True]
+
+
+async def test_stream_is_not_retried_after_output_was_sent():
+    flaky, spare = StubReplica("flaky", fail_after=1), StubReplica("spare")
+    router = ReplicaRouter([flaky, spare])
+    router.inflight[1] = 1
+
+    deltas = []
+    with pytest.raises(ReplicaUnavailableError):
+        async for delta in router.stream(MESSAGES, "request"):
+            deltas.append(delta)
+
+    assert deltas == ["flaky"]
+    assert spare.requests == 0
+
+
+async def test_all_replicas_down_raises():
+    router = ReplicaRouter([StubReplica("a", down=True), StubReplica("b", down=True)])
+
+    with pytest.raises(ReplicaUnavailableError):
+        await _answer(router)
+    with pytest.raises(ReplicaUnavailableError):
+        await router.encode("text")
+    assert router.failures == [2, 2]
+
+
+async def test_batch_is_split_over_replicas_and_failed_items_retried():
+    down, up = StubReplica("down", down=True), StubReplica("up")
+    router = ReplicaRouter([down, up])
+
+    results = await router.generate_batch([MESSAGES] * 4)
+
+    # Half the batch went to "down" and was retried one by one as streams on "up"
+    assert sorted(results) == ["up", "up", "up!", "up!"]
+    assert down.requests == 2 and router.failures == [1, 0]
+    assert router.inflight == [0, 0]
+
+
+async def test_encode_falls_back_to_a_healthy_replica():
+    router = ReplicaRouter([StubReplica("down", down=True), StubReplica("up")])
+
+    assert await router.encode("four") == [4]
+    assert router.failures == [1, 0]
+
+
+async def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ReplicaRouter([StubReplica("a")], policy="random")
+
+
+async def test_in_process_replicas_are_built_only_for_the_fake_backend(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_REPLICAS", 2)
+    engine = llm._load_engine()
+    assert isinstance(engine, ReplicaRouter) and len(engine.replicas) == 2
+
+    monkeypatch.setattr(settings, "LLM_BACKEND", "vllm")
+    with pytest.raises(ModelUnavailableError, match="LLM_BACKEND=openai"):
+        llm._load_engine()
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.core.scheduler import BatchScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, payloads):
+        self.batches.append(list(payloads))
+        return [ValueError(payload) if payload == "bad" else payload * 2 for payload in payloads]
+
+
+async def test_requests_within_the_window_share_a_batch():
+    dispatcher = RecordingDispatcher()
+    scheduler = BatchScheduler(dispatcher, max_batch_size=16, max_wait_ms=50)
+    try:
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(5)))
+        assert results == [0, 2, 4, 6, 8]
+        assert dispatcher.batches == [[0, 1, 2, 3, 4]]
+
+        # A request after the window closed starts a new batch
+        assert await scheduler.submit(10) == 20
+        assert dispatcher.batches[-1] == [10]
+        assert scheduler.stats()["batches_total"] == 2
+    finally:
+        await scheduler.shutdown()
+
+
+async def test_batches_are_capped_at_max_batch_size():
+    dispatcher = RecordingDispatcher()
+    scheduler = BatchScheduler(dispatcher, max_batch_size=3, max_wait_ms=50)
+    try:
+        await asyncio.gather(*(scheduler.submit(i) for i in range(7)))
+        assert [len(batch) for batch in dispatcher.batches] == [3, 3, 1]
+        assert scheduler.stats()["max_batch_size_seen"] == 3
+    finally:
+        await scheduler.shutdown()
+
+
+async def test_window_closes_after_max_wait():
+    dispatcher = RecordingDispatcher()
+    scheduler = BatchScheduler(dispatcher, max_batch_size=16, max_wait_ms=30)
+    try:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await scheduler.submit(1) == 2
+        assert 0.02 <= loop.time() - started < 0.5
+    finally:
+        await scheduler.shutdown()
+
+
+async def test_each_caller_gets_its_own_error():
+    scheduler = BatchScheduler(RecordingDispatcher(), max_wait_ms=20)
+    try:
+        good, bad = await asyncio.gather(scheduler.submit(1), scheduler.submit("bad"), return_exceptions=True)
+        assert good == 2
+        assert isinstance(bad, ValueError)
+    finally:
+        await scheduler.shutdown()
+
+
+async def test_dispatcher_failure_fails_the_whole_batch():
+    async def failing(payloads):
+        raise RuntimeError("engine down")
+
+    scheduler = BatchScheduler(failing, max_wait_ms=10)
+    try:
+        with pytest.raises(RuntimeError, match="engine down"):
+            await scheduler.submit(1)
+    finally:
+        await scheduler.shutdown()
+
+
+async def test_restarting_a_dead_worker_fails_requests_it_left_queued():
+    dispatcher = RecordingDispatcher()
+    scheduler = BatchScheduler(dispatcher, max_wait_ms=10)
+    collect = scheduler._collect_batch
+
+    async def crash():
+        raise RuntimeError("collector crashed")
+
+    scheduler._collect_batch = crash
+    stranded = asyncio.create_task(scheduler.submit(1))
+    await asyncio.sleep(0.01)
+    assert scheduler._worker.done() and not stranded.done()
+
+    scheduler._collect_batch = collect
+    try:
+        assert await scheduler.submit(2) == 4
+        with pytest.raises(RuntimeError, match="stopped before dispatching"):
+            await asyncio.wait_for(stranded, timeout=1)
+    finally:
+        await scheduler.shutdown()
+
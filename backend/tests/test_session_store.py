@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+
+from app.core import session_store
+from app.core.content_store import ContentStore
+from app.core.session_store import InMemorySessionStore, RedisSessionStore
+from tests import fakes
+from tests.fakes import FakeRedis
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock)
+    monkeypatch.setattr(fakes.time, "monotonic", clock)
+    return clock
+
+
+async def test_memory_store_evicts_least_recently_used_beyond_max_sessions(clock):
+    store = InMemorySessionStore(ttl_seconds=0, max_sessions=2, max_bytes=0)
+    assert await store.set("a", {"mode": "chat"}) == []
+    await store.set("b", {"mode": "chat"})
+    await store.get("a") # "b" is now the least recently used
+
+    evicted = await store.set("c", {"mode": "chat"})
+
+    assert [session_id for session_id, _ in evicted] == ["b"]
+    assert sorted(await store.session_ids()) == ["a", "c"]
+
+
+async def test_memory_store_evicts_beyond_max_bytes_but_keeps_the_new_session(clock):
+    store = InMemorySessionStore(ttl_seconds=0, max_sessions=0, max_bytes=100)
+    await store.set("a", {"text": "x" * 60})
+
+    evicted = await store.set("b", {"text": "y" * 60})
+
+    assert [session_id for session_id, _ in evicted] == ["a"]
+    assert store.stats() == {"sessions": 1, "bytes": 60}
+    # A single session over the budget is still stored
+    assert await store.set("c", {"text": "z" * 500}) == [("b", {"text": "y" * 60})]
+    assert await store.get("c") is not None
+
+
+async def test_memory_store_ttl_slides_on_access_and_sweep_removes_expired(clock):
+    store = InMemorySessionStore(ttl_seconds=60, max_sessions=0, max_bytes=0)
+    await store.set("a", {"mode": "chat"})
+    await store.set("b", {"mode": "chat"})
+    clock.now += 50
+    assert await store.get("a") is not None # Refreshes "a"
+    clock.now += 20
+
+    assert await store.get("b") is None
+    assert await store.sweep() == [("b", {"mode": "chat"})]
+    assert await store.session_ids() == ["a"]
+
+
+async def test_redis_store_round_trips_json_and_expires(clock):
+    store = RedisSessionStore(FakeRedis(), ttl_seconds=60)
+    data = {"mode": "pdf", "documents": [{"document_id": "d1", "kind": "pdf", "content_hash": "abc"}]}
+    await store.set("s1", data)
+
+    assert await store.get("s1") == data
+    clock.now += 61
+    assert await store.get("s1") is None
+    assert await store.sweep() == [("s1", {})]
+    assert await store.session_ids() == []
+
+
+async def test_redis_store_reports_sessions_deleted_by_another_worker():
+    client = FakeRedis()
+    worker_a = RedisSessionStore(client, ttl_seconds=60)
+    worker_b = RedisSessionStore(client, ttl_seconds=60)
+    await worker_a.set("s1", {"mode": "chat"})
+    assert await worker_b.get("s1") == {"mode": "chat"}
+
+    await worker_b.delete("s1")
+
+    assert await worker_b.sweep() == []
+    assert await worker_a.sweep() == [("s1", {})]
+    assert await worker_a.sweep() == []
+
+
+
+async def test_redis_sweep_checks_all_sessions_in_one_pipelined_round_trip(clock):
+    client = FakeRedis()
+    store = RedisSessionStore(client, ttl_seconds=60)
+    for i in range(10):
+        await store.set(f"s{i}", {"mode": "chat"})
+    clock.now += 30
+    await store.get("s0") # Refreshes "s0" only
+    clock.now += 31
+
+    client.round_trips = 0
+    evicted = await store.sweep()
+
+    # SMEMBERS, one pipeline of EXISTS checks, one SREM for the expired ones
+    assert client.round_trips == 3
+    assert sorted(session_id for session_id, _ in evicted) == [f"s{i}" for i in range(1, 10)]
+    assert await store.session_ids() == ["s0"]
+    assert store.stats() == {"sessions": 1}
+
+    await store.close()
+    assert client.closed
+
+async def test_content_store_evicts_only_unreferenced_entries():
+    store = ContentStore(max_bytes=100)
+
+    async def compute():
+        return {"text": "..."}, 60, []
+
+    await store.get_or_compute("one", "pdf", compute)
+    store.acquire("one", "s1")
+    await store.get_or_compute("two", "pdf", compute)
+    assert store.get("one") is not None # Referenced, so kept over the budget
+    assert store.get("two") is not None # Just computed
+
+    await store.get_or_compute("three", "pdf", compute)
+    assert store.get("two") is None
+
+    store.release_session("s1")
+    await store.get_or_compute("four", "pdf", compute)
+    assert store.get("one") is None
+    assert store.stats()["entries"] == 1
+
+
+
+class SlowCompute:
+    """A compute function that takes a while and counts how often it starts and finishes."""
+
+    def __init__(self):
+        self.started = 0
+        self.finished = 0
+
+    async def __call__(self):
+        self.started += 1
+        await asyncio.sleep(0.02)
+        self.finished += 1
+        return {"text": "..."}, 10, []
+
+
+async def test_identical_uploads_share_one_computation_when_a_waiter_is_cancelled():
+    store = ContentStore(max_bytes=100)
+    compute = SlowCompute()
+    tasks = [asyncio.create_task(store.get_or_compute("same", "pdf", compute)) for _ in range(3)]
+    await asyncio.sleep(0.005)
+    tasks[1].cancel()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert results[0][0] is results[2][0] and [results[0][1], results[2][1]] == [False, True]
+    assert compute.started == 1
+
+
+async def test_waiters_recompute_when_the_computing_upload_is_cancelled():
+    store = ContentStore(max_bytes=100)
+    compute = SlowCompute()
+    tasks = [asyncio.create_task(store.get_or_compute("same", "pdf", compute)) for _ in range(3)]
+    await asyncio.sleep(0.005)
+    tasks[0].cancel() # The upload whose computation the others are waiting for
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1][0] is results[2][0] is store.get("same")
+    # The cancelled computation is replaced by exactly one more, shared by both waiters
+    assert (compute.started, compute.finished) == (2, 1)
+
+async def test_clearing_a_session_releases_its_content_references(monkeypatch):
+    from app.core import session_manager
+    from app.core.content_store import content_store
+
+    monkeypatch.setattr(session_manager, "_store", RedisSessionStore(FakeRedis(), ttl_seconds=60))
+
+    async def compute():
+        return {"text": "..."}, 10, []
+
+    entry, cached = await content_store.get_or_compute("digest-refcount", "pdf", compute)
+    session_id = await session_manager.create_session("pdf", {"documents": []})
+    content_store.acquire(entry.digest, session_id)
+    assert entry.refcount == 1
+
+    assert await session_manager.clear_session(session_id)
+    assert entry.refcount == 0
@@ -0,0 +1,161 @@
+import io
+import json
+import wave
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.stt_service import FRAME_MS, SAMPLE_RATE, SpeechSegmenter
+from app.utils.audio_utils import AudioFormatError, PCMStreamDecoder, _StreamResampler
+
+pytestmark = pytest.mark.anyio
+
+FRAME = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def _audio(*frames: int) -> np.ndarray:
+    """Alternating quiet/loud stretches, given in 30 ms frames: _audio(quiet, loud, quiet, ...)."""
+    parts = []
+    for i, count in enumerate(frames):
+        level = 0.5 if i % 2 else 0.0
+        parts.append(np.full(count * FRAME, level, dtype=np.float32))
+    return np.concatenate(parts)
+
+
+def _feed(segmenter: SpeechSegmenter, audio: np.ndarray, chunk: int = 1000):
+    segments = []
+    for start in range(0, len(audio), chunk):
+        segments.extend(segmenter.feed(audio[start:start + chunk]))
+    return segments
+
+
+def _wav(samples: np.ndarray, rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+# --- Voice Activity Detection ---
+def test_segmenter_cuts_at_silence_with_padding():
+    segmenter = SpeechSegmenter(threshold=0.01, min_silence_ms=300, max_segment_seconds=20)
+    # 10 quiet frames end a segment; 6 frames (200 ms) of padding are kept on each side
+    segments = _feed(segmenter, _audio(20, 30, 40, 30, 20))
+
+    assert [round(start, 2) for start, _ in segments] == [0.42, 2.52]
+    assert [len(samples) // FRAME for _, samples in segments] == [42, 42]
+    assert segmenter.flush() is None
+
+
+def test_segmenter_cuts_speech_longer_than_the_maximum():
+    segmenter = SpeechSegmenter(threshold=0.01, min_silence_ms=300, max_segment_seconds=0.9)
+    segments = _feed(segmenter, _audio(0, 100))
+
+    assert [round(start, 2) for start, _ in segments] == [0.0, 0.9, 1.8]
+    assert all(len(samples) == 30 * FRAME for _, samples in segments)
+    start, rest = segmenter.flush()
+    assert round(start, 2) == 2.7 and len(rest) == 10 * FRAME
+
+
+# --- Streamed PCM Decoding ---
+def test_wav_header_split_across_chunks():
+    samples = np.linspace(-0.5, 0.5, 1000, dtype=np.float32)
+    data = _wav(samples)
+    decoder = PCMStreamDecoder(target_rate=SAMPLE_RATE, sample_rate=8000, channels=2)
+
+    # One byte at a time through the header and into the first sample, then odd-sized chunks
+    decoded = [decoder.feed(data[i:i + 1]) for i in range(47)]
+    decoded += [decoder.feed(data[i:i + 333]) for i in range(47, len(data), 333)]
+    decoder.finish()
+
+    audio = np.concatenate(decoded)
+    assert decoder.sample_rate == SAMPLE_RATE and decoder.channels == 1
+    np.testing.assert_allclose(audio, samples, atol=2 / 32768)
+
+
+def test_stream_ending_inside_the_wav_header_is_rejected():
+    decoder = PCMStreamDecoder(target_rate=SAMPLE_RATE)
+    decoder.feed(_wav(np.zeros(10, dtype=np.float32))[:30])
+
+    with pytest.raises(AudioFormatError):
+        decoder.finish()
+
+
+def test_resampling_is_continuous_across_chunk_boundaries():
+    t = np.arange(8000) / 8000
+    signal = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+
+    whole = _StreamResampler(8000, SAMPLE_RATE)(signal)
+    resampler = _StreamResampler(8000, SAMPLE_RATE)
+    chunked = np.concatenate([resampler(signal[i:i + 333]) for i in range(0, len(signal), 333)])
+
+    np.testing.assert_allclose(chunked, whole, atol=1e-6)
+    # Every output sample lies on the input timeline, 1/16000 s apart, with no gap or repeat at the seams
+    expected = np.sin(2 * np.pi * 440 * np.arange(len(chunked)) / SAMPLE_RATE)
+    # The last input sample is held back until the next one arrives to interpolate towards it
+    assert len(chunked) == 2 * (len(signal) - 1)
+    np.testing.assert_allclose(chunked, expected, atol=0.02)
+
+
+def test_wav_at_another_rate_is_resampled_while_streaming():
+    samples = np.full(8000, 0.25, dtype=np.float32) # 1 s at 8 kHz
+    data = _wav(samples, rate=8000)
+    decoder = PCMStreamDecoder(target_rate=SAMPLE_RATE)
+
+    audio = np.concatenate([decoder.feed(data[i:i + 1001]) for i in range(0, len(data), 1001)])
+
+    assert decoder.sample_rate == 8000
+    assert len(audio) == 2 * (len(samples) - 1)
+    np.testing.assert_allclose(audio, 0.25, atol=2 / 32768)
+
+
+# --- Endpoint ---
+async def _chunks(data: bytes, size: int = 4096):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_transcribe_streams_a_partial_per_utterance(client, monkeypatch):
+    monkeypatch.setattr(settings, "STT_VAD_MIN_SILENCE_MS", 300)
+    body = _wav(_audio(20, 30, 40, 30, 20))
+
+    response = await client.post(
+        "/api/v1/stt/transcribe", content=_chunks(body), headers={"Content-Type": "audio/wav"}
+    )
+
+    assert response.status_code == 200
+    *partials, transcript = _lines(response)
+    assert [event["type"] for event in partials] == ["partial", "partial"]
+    assert [event["index"] for event in partials] == [0, 1]
+    assert partials[0]["start"] == 0.42 and partials[1]["start"] == 2.52
+    assert all(event["text"] == settings.FAKE_STT_TEXT for event in partials)
+    assert transcript == {"type": "transcript", "text": f"{settings.FAKE_STT_TEXT} {settings.FAKE_STT_TEXT}"}
+
+
+async def test_transcribe_and_ask_answers_the_transcript(client):
+    body = _wav(_audio(10, 30, 10))
+
+    response = await client.post(
+        "/api/v1/stt/transcribe?ask=true&no_cache=true", content=body, headers={"Content-Type": "audio/wav"}
+    )
+
+    events = _lines(response)
+    assert [event["type"] for event in events[:2]] == ["partial", "transcript"]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["answer"] == f"This is a fake answer to: {settings.FAKE_STT_TEXT}"
+
+
+async def test_transcribe_reports_malformed_audio(client):
+    response = await client.post(
+        "/api/v1/stt/transcribe", content=b"RIFF\x00\x00\x00\x00AVI LIST", headers={"Content-Type": "audio/wav"}
+    )
+
+    assert _lines(response) == [{"type": "error", "detail": "Not a WAV file."}]
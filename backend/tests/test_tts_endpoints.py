@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api.endpoints import tts
+from app.core import tts_manager
+from app.core.config import settings
+from app.utils import audio_utils
+from app.utils.audio_utils import RangeNotSatisfiable, parse_range
+
+pytestmark = pytest.mark.anyio
+
+AUDIO = bytes(range(256)) * 4 # 1 KiB
+
+
+@pytest.fixture
+def audio_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIO_DIR", str(tmp_path))
+    (tmp_path / "tts_test.wav").write_bytes(AUDIO)
+    return "/api/v1/tts/audio/tts_test.wav"
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)), # End is clamped to the file
+    ("bytes=-24", (1000, 1023)), # Suffix range
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=0-1,5-9", None), # Multiple ranges: send the whole file
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(AUDIO)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=10-5", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, len(AUDIO))
+
+
+async def test_audio_is_served_whole_with_caching_headers(client, audio_file):
+    response = await client.get(audio_file)
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["content-type"] == audio_utils.MEDIA_TYPES["wav"]
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+    revalidated = await client.get(audio_file, headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+async def test_audio_range_request_returns_partial_content(client, audio_file):
+    response = await client.get(audio_file, headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert response.headers["content-length"] == "100"
+
+
+async def test_audio_range_past_the_end_is_not_satisfiable(client, audio_file):
+    response = await client.get(audio_file, headers={"Range": f"bytes={len(AUDIO)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+
+async def test_stale_if_range_sends_the_whole_file(client, audio_file):
+    response = await client.get(audio_file, headers={"Range": "bytes=0-9", "If-Range": '"outdated"'})
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+
+async def test_unknown_or_unsafe_audio_names_are_not_found(client, audio_file):
+    assert (await client.get("/api/v1/tts/audio/missing.wav")).status_code == 404
+    assert (await client.get("/api/v1/tts/audio/tts_test.exe")).status_code == 404
+
+
+def _events(body: str):
+    return [block for block in body.split("\n\n") if block]
+
+
+async def test_event_stream_pushes_the_status_once_synthesis_finishes(client, monkeypatch):
+    monkeypatch.setattr(tts, "SSE_KEEPALIVE_SECONDS", 0.01)
+    task_id = tts_manager.create_tts_task()
+    asyncio.get_running_loop().call_later(
+        0.05, tts_manager.update_tts_task_status, task_id, "done", "/api/v1/tts/audio/tts_x.wav"
+    )
+
+    response = await client.get(f"/api/v1/tts/events/{task_id}")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    *keep_alives, status = _events(response.text)
+    assert keep_alives and set(keep_alives) == {": keep-alive"}
+    assert status.startswith("event: status\ndata: ")
+    assert json.loads(status.split("data: ", 1)[1]) == {
+        "status": "done", "audio_url": "/api/v1/tts/audio/tts_x.wav", "error": None
+    }
+
+
+async def test_event_stream_of_a_finished_task_answers_at_once(client):
+    task_id = tts_manager.create_tts_task()
+    tts_manager.update_tts_task_status(task_id, "failed", error="Synthesis failed.")
+
+    response = await client.get(f"/api/v1/tts/events/{task_id}")
+
+    (status,) = _events(response.text)
+    assert json.loads(status.split("data: ", 1)[1])["error"] == "Synthesis failed."
+
+
+async def test_event_stream_reports_a_task_that_expires_while_waiting(client):
+    task_id = tts_manager.create_tts_task()
+    asyncio.get_running_loop().call_later(0.02, tts_manager._remove_tts_task, task_id)
+
+    response = await client.get(f"/api/v1/tts/events/{task_id}")
+
+    (status,) = _events(response.text)
+    assert json.loads(status.split("data: ", 1)[1])["error"] == "Task expired."
+
+
+async def test_event_stream_of_an_unknown_task_is_not_found(client):
+    assert (await client.get("/api/v1/tts/events/unknown")).status_code == 404
@@ -0,0 +1,62 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core import metrics
+from app.services.tts_engine import FakeTTSModel, TTSEngine, synthesize_text
+
+pytestmark = pytest.mark.anyio
+
+TEXT = "Thirty characters of speech..." # 2 s of fake audio at 15 characters per second
+
+
+def _rtf_observations(mode: str):
+    child = metrics.TTS_REAL_TIME_FACTOR._children.get((mode,))
+    return (child.count, child.sum) if child else (0, 0.0)
+
+
+async def test_synthesize_text_reports_samples_and_seconds():
+    sample_rate, samples, seconds = synthesize_text(FakeTTSModel(seconds_per_char=0.001), TEXT)
+
+    assert sample_rate == FakeTTSModel.sample_rate
+    assert samples.dtype == np.int16 and len(samples) == sample_rate * len(TEXT) // 15
+    assert seconds >= 0.001 * len(TEXT)
+
+
+async def test_engine_records_the_real_time_factor_of_each_text():
+    engine = TTSEngine(model=FakeTTSModel(seconds_per_char=0.001))
+    count, total = _rtf_observations("file")
+    try:
+        samples = await engine.synthesize(TEXT)
+    finally:
+        await engine.shutdown()
+
+    audio_seconds = len(samples) / FakeTTSModel.sample_rate
+    new_count, new_total = _rtf_observations("file")
+    assert new_count == count + 1
+    rtf = new_total - total
+    # About 30 ms of work for 2 s of audio
+    assert 0.001 * len(TEXT) / audio_seconds <= rtf < 0.5
+    assert engine.stats()["texts_total"] == 1
+
+
+async def test_concurrent_texts_alternate_between_replica_processes():
+    engine = TTSEngine(replicas=2, threads_per_replica=1)
+    picked = []
+    run_on = engine._run_on
+
+    async def recording(index, text):
+        picked.append(index)
+        return await run_on(index, text)
+
+    engine._run_on = recording
+    try:
+        results = await asyncio.gather(*(engine.synthesize(TEXT) for _ in range(4)))
+    finally:
+        await engine.shutdown()
+
+    assert picked == [0, 1, 0, 1]
+    assert all(len(samples) == len(results[0]) > 0 for samples in results)
+    assert engine.sample_rate == FakeTTSModel.sample_rate
+    assert engine.stats()["queued_texts"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.model_registry import registry
+from app.services import tts_service, tts_stream
+from app.services.tts_service import TTSJobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingEngine:
+    """Records how many sentences are synthesized at the same time."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def get_sample_rate(self) -> int:
+        return 16000
+
+    async def synthesize(self, text: str, mode: str = "stream") -> np.ndarray:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return np.zeros(160, dtype=np.float32)
+
+
+@pytest.fixture
+async def engine(monkeypatch):
+    engine = CountingEngine()
+    previous = registry.peek("tts")
+    registry.set_instance("tts", engine)
+    queue = TTSJobQueue(workers=2, max_pending=4)
+    monkeypatch.setattr(tts_service, "job_queue", queue)
+    yield engine
+    await queue.shutdown()
+    registry.set_instance("tts", previous)
+
+
+async def test_streamed_sentences_share_the_tts_workers(engine):
+    streams = [tts_stream.StreamingTTSSession() for _ in range(3)]
+    for stream in streams:
+        stream.add_text("This is the first sentence. This is the second sentence. ")
+        stream.finish()
+
+    async def collect(stream):
+        return [chunk async for chunk in stream.audio_chunks()]
+
+    chunks = await asyncio.gather(*(collect(stream) for stream in streams))
+
+    assert [len(stream_chunks) for stream_chunks in chunks] == [3, 3, 3] # Header and two sentences each
+    assert engine.max_active == 2
+    assert tts_service.job_queue.stats()["busy_workers"] == 0
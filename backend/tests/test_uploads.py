@@ -0,0 +1,142 @@
+import hashlib
+
+import pytest
+
+from app.core.config import settings
+from app.utils import file_utils
+from app.utils.file_utils import UploadError, UploadTooLargeError, receive_multipart
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "test-boundary"
+HEADERS = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_TMP_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _field(name: str, value: str) -> bytes:
+    return f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+
+
+def _file_header(name: str, filename: str) -> bytes:
+    return (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+
+
+def _file(name: str, filename: str, content: bytes) -> bytes:
+    return _file_header(name, filename) + content + b"\r\n"
+
+
+def _end() -> bytes:
+    return f"--{BOUNDARY}--\r\n".encode()
+
+
+class ChunkedBody:
+    """Yields `body` in `size`-byte chunks and records how much of it was read."""
+
+    def __init__(self, body: bytes, size: int = 64 * 1024):
+        self.body = body
+        self.size = size
+        self.sent = 0
+
+    async def __aiter__(self):
+        while self.sent < len(self.body):
+            chunk = self.body[self.sent:self.sent + self.size]
+            self.sent += len(chunk)
+            yield chunk
+
+
+async def test_file_parts_are_written_to_disk_with_their_digest(upload_dir):
+    content = bytes(range(256)) * 4096 # 1 MiB, so the file spans several chunks
+    body = ChunkedBody(_field("mode", "pdf") + _file("file", "doc.pdf", content) + _end(), size=1000)
+
+    form = await receive_multipart(HEADERS, body, max_file_bytes=2 * MB)
+    try:
+        upload = form.files["file"]
+        assert form.fields == {"mode": "pdf"}
+        assert upload.filename == "doc.pdf"
+        assert upload.size == len(content)
+        assert upload.digest == hashlib.sha256(content).hexdigest()
+        assert upload.path.parent == upload_dir and upload.path.read_bytes() == content
+    finally:
+        await form.cleanup()
+    assert list(upload_dir.iterdir()) == []
+
+
+async def test_oversized_file_is_rejected_before_the_body_is_read(upload_dir):
+    body = ChunkedBody(_file_header("file", "big.bin") + bytes(4 * MB))
+
+    with pytest.raises(UploadTooLargeError):
+        await receive_multipart(HEADERS, body, max_file_bytes=1 * MB)
+
+    assert body.sent < 2 * MB
+    assert list(upload_dir.iterdir()) == []
+
+
+async def test_content_length_over_the_limit_is_rejected_without_reading(upload_dir):
+    body = ChunkedBody(_file("file", "big.bin", bytes(2 * MB)) + _end())
+    headers = {**HEADERS, "content-length": str(len(body.body))}
+
+    with pytest.raises(UploadTooLargeError):
+        await receive_multipart(headers, body, max_file_bytes=1 * MB)
+
+    assert body.sent == 0
+
+
+async def test_truncated_body_is_rejected_and_cleaned_up(upload_dir):
+    body = ChunkedBody(_file_header("file", "doc.pdf") + bytes(1000))
+
+    with pytest.raises(UploadError, match="ended before the file was complete"):
+        await receive_multipart(HEADERS, body, max_file_bytes=1 * MB)
+
+    assert list(upload_dir.iterdir()) == []
+
+
+async def test_more_files_than_allowed_are_rejected(upload_dir):
+    body = ChunkedBody(_file("first", "a.pdf", b"a") + _file("second", "b.pdf", b"b") + _end())
+
+    with pytest.raises(UploadError, match="At most 1 file"):
+        await receive_multipart(HEADERS, body, max_file_bytes=1 * MB)
+
+    assert list(upload_dir.iterdir()) == []
+
+
+async def test_oversized_form_field_is_rejected(upload_dir):
+    body = ChunkedBody(_field("mode", "x" * (file_utils.MAX_FORM_FIELD_BYTES + 1)) + _end())
+
+    with pytest.raises(UploadError, match="Form field 'mode' is too large"):
+        await receive_multipart(HEADERS, body, max_file_bytes=1 * MB)
+
+
+async def test_body_that_is_not_multipart_is_rejected():
+    with pytest.raises(UploadError, match="Expected a multipart/form-data body"):
+        await receive_multipart({"content-type": "application/json"}, ChunkedBody(b"{}"), max_file_bytes=MB)
+
+
+async def test_upload_endpoint_answers_413_mid_stream(client, upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_MB", 1)
+    # No Content-Length (chunked), so the limit is enforced while the body streams in
+    body = ChunkedBody(_field("mode", "pdf") + _file("file", "big.pdf", bytes(2 * MB)) + _end())
+
+    response = await client.post("/api/v1/chat/upload", content=body, headers=HEADERS)
+
+    assert response.status_code == 413
+    assert "1 MB" in response.json()["detail"]
+    assert list(upload_dir.iterdir()) == []
+
+
+async def test_upload_endpoint_answers_400_to_a_truncated_body(client, upload_dir):
+    body = _field("mode", "pdf") + _file_header("file", "doc.pdf") + b"%PDF-1.4"
+
+    response = await client.post("/api/v1/chat/upload", content=body, headers=HEADERS)
+
+    assert response.status_code == 400
+    assert "ended before the file was complete" in response.json()["detail"]
+    assert list(upload_dir.iterdir()) == []
@@ -191,57 +191,58 @@ const Chatbox = () => {
   };
 
 
-  // pollAudioStatus
-  const pollAudioStatus = async (taskId) => {
+  // playAudio
+  const playAudio = (audioUrl) => {
+    const audio = new Audio(audioUrl);
+    audio.playbackRate = 1.10; // Optional: adjust playback speed
+    audio.play().catch(e => {
+       console.error("Error playing audio:", e);
+       setErrorMsg("Could not play audio response. Check browser permissions.");
+    });
+  };
+
+
+  // waitForAudio: the backend pushes the TTS status over Server-Sent Events as soon as synthesis finishes
+  const waitForAudio = (taskId) => {
     if (!apiUrl) {
-      setErrorMsg("API URL not configured for polling.");
+      setErrorMsg("API URL not configured for TTS events.");
       return;
     }
-    let statusData = { status: "processing" };
-    const statusUrl = `${apiUrl}/api/v1/tts/audio_status/${taskId}`; // Use full API path
+    const eventsUrl = `${apiUrl}/api/v1/tts/events/${taskId}`; // Use full API path
 
-    console.log(`Polling TTS status at: ${statusUrl}`);
-    setAudioLoading(true); // Indicate polling started
+    console.log(`Waiting for TTS status at: ${eventsUrl}`);
+    setAudioLoading(true); // Indicate we are waiting for audio
     setErrorMsg(""); // Clear previous errors
 
-    try {
-      let attempts = 0;
-      const maxAttempts = 30; // Poll for max 60 seconds (30 * 2s)
-
-      while (statusData.status === "processing" && attempts < maxAttempts) {
-        await new Promise(resolve => setTimeout(resolve, 2000)); // Wait 2 seconds
-        attempts++;
-        const res = await fetch(statusUrl);
-        const data = await res.json(); // Try to parse JSON
-
-        if (!res.ok) {
-          throw new Error(data?.detail || `Polling failed: ${res.status} ${res.statusText}`);
-        }
-        statusData = data;
-        console.log(`Poll attempt ${attempts}:`, statusData);
-      }
-
-      if (statusData.status === "processing") {
-         throw new Error("TTS task timed out.");
-      }
-
+    const source = new EventSource(eventsUrl);
+    const timeout = setTimeout(() => {
+      source.close();
+      setAudioLoading(false);
+      setErrorMsg("TTS Error: TTS task timed out.");
+    }, 60000); // Give up after 60 seconds
+
+    source.addEventListener("status", (event) => {
+      clearTimeout(timeout);
+      source.close();
+      setAudioLoading(false);
+      const statusData = JSON.parse(event.data);
       if (statusData.status === "done" && statusData.audio_url) {
-        const audio = new Audio(statusData.audio_url);
-        audio.playbackRate = 1.10; // Optional: adjust playback speed
-        audio.play().catch(e => {
-           console.error("Error playing audio:", e);
-           setErrorMsg("Could not play audio response. Check browser permissions.");
-        });
-      } else if (statusData.status === "failed") {
+        playAudio(statusData.audio_url);
+      } else {
         console.error("TTS synthesis failed:", statusData.error);
         setErrorMsg(`TTS Error: ${statusData.error || 'Synthesis failed.'}`);
       }
-    } catch (err) {
-      console.error("Error polling TTS status:", err);
-       setErrorMsg(`Polling Error: ${err.message}`);
-    } finally {
-       setAudioLoading(false); // Ensure loading indicator stops
-    }
+    });
+
+    source.onerror = (err) => {
+      // EventSource reconnects on its own; only give up if the server closed the stream for good
+      if (source.readyState === EventSource.CLOSED) {
+        console.error("Error receiving TTS status:", err);
+        clearTimeout(timeout);
+        setAudioLoading(false);
+        setErrorMsg("TTS Error: Lost connection while waiting for audio.");
+      }
+    };
   };
 
 
@@ -297,7 +298,9 @@ const Chatbox = () => {
 
       // Handle TTS if requested and task ID received
       if (talkMode && data.tts_task_id) {
-        pollAudioStatus(data.tts_task_id); // Start polling in background
+        waitForAudio(data.tts_task_id); // Audio plays as soon as the backend pushes the result
+      } else if (talkMode && data.tts_error) {
+        setChatLog(prev => [...prev, { sender: "System", text: data.tts_error }]);
       } else if (talkMode && !data.tts_task_id){
          console.warn("TTS requested, but no task ID received from backend.");
          // Optionally add a system message about TTS not being available